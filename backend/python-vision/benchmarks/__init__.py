@@ -0,0 +1,3 @@
+"""
+视觉处理性能基准
+"""
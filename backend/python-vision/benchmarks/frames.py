@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成测试帧 - 固定随机种子生成，可在不同机器上复现
+"""
+
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from services.barcode import BBox, TRACE_CODE_LENGTH
+
+# 帧类型
+VARIANT_BARCODE = "barcode"  # 标签上带溯源码
+VARIANT_BLANK = "blank"  # 只有药瓶与文字，无条码
+
+
+@dataclass
+class SyntheticFrame:
+    """合成帧及其标注"""
+    image: np.ndarray
+    vial_bbox: BBox  # 药瓶标签区域
+    trace_code: Optional[str] = None
+    code_bbox: Optional[BBox] = None
+
+
+def _seed(width: int, height: int, variant: str) -> int:
+    return zlib.crc32(f"{width}x{height}/{variant}".encode())
+
+
+def _trace_code(rng: np.random.Generator) -> str:
+    return "".join(str(d) for d in rng.integers(0, 10, TRACE_CODE_LENGTH))
+
+
+def render_code(data: str, side_px: int) -> np.ndarray:
+    """渲染二维码（含静区），按整数模块宽度放大到不超过 side_px，返回灰度图"""
+    modules = cv2.QRCodeEncoder.create().encode(data)
+    if modules.ndim == 3:
+        modules = cv2.cvtColor(modules, cv2.COLOR_BGR2GRAY)
+    module_px = max(3, side_px // modules.shape[0])
+    return cv2.resize(modules, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+
+
+def make_frame(width: int, height: int, variant: str = VARIANT_BARCODE) -> SyntheticFrame:
+    """
+    生成一帧模拟分拣线图像：带噪声的背景、药瓶标签、标签文字，可选溯源码
+
+    相同参数总是生成逐像素相同的图像。
+    """
+    rng = np.random.default_rng(_seed(width, height, variant))
+
+    # 背景：灰色传送带 + 传感器噪声
+    image = np.full((height, width, 3), 90, dtype=np.uint8)
+    noise = rng.normal(0, 6, (height, width, 1)).astype(np.int16)
+    image = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    # 药瓶标签占画面中部
+    x1, y1 = width // 4, height // 4
+    x2, y2 = width * 3 // 4, height * 3 // 4
+    cv2.rectangle(image, (x1, y1), (x2, y2), (235, 235, 235), -1)
+    cv2.rectangle(image, (x1, y1), (x2, y2), (60, 60, 60), 2)
+
+    scale = height / 1080
+    for i, text in enumerate(("HepB 10ug/0.5ml", "LOT 202410A", "EXP 2026-10-31")):
+        cv2.putText(image, text, (x1 + int(20 * scale), y1 + int((60 + 50 * i) * scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2 * scale, (30, 30, 30), max(1, int(2 * scale)))
+
+    frame = SyntheticFrame(image=image, vial_bbox=(x1, y1, x2, y2))
+    if variant != VARIANT_BARCODE:
+        return frame
+
+    frame.trace_code = _trace_code(rng)
+    # 二维码边长约为标签高度的40%，放在标签右下角
+    code = render_code(frame.trace_code, side_px=(y2 - y1) * 2 // 5)
+    ch, cw = code.shape[:2]
+    cx2, cy2 = x2 - int(10 * scale) - 2, y2 - int(10 * scale) - 2
+    cx1, cy1 = cx2 - cw, cy2 - ch
+    image[cy1:cy2, cx1:cx2] = code[:, :, None]
+    frame.code_bbox = (cx1, cy1, cx2, cy2)
+    return frame
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    """编码为客户端上传的JPEG字节"""
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG编码失败")
+    return encoded.tobytes()
+
+
+def parse_resolution(text: str) -> Tuple[int, int]:
+    """解析 WIDTHxHEIGHT"""
+    width, height = text.lower().split("x")
+    return int(width), int(height)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视觉处理分阶段性能基准
+
+在固定种子的合成帧上测量各阶段延迟与吞吐，结果输出为JSON；
+指定基线文件时，任一用例超出允许的退化比例即以非零状态退出。
+
+对比基线时过滤测量噪声：
+- 基线或本次计时次数少于 --min-iterations 的用例不做耗时对比（只报告样本不足）
+- 增量须同时超过比例阈值和噪声容差才判为退化；噪声容差取 --min-delta-ms 与
+  --noise-iqr 倍四分位距（基线与本次中较大者）二者的较大值
+
+用法（在 backend/python-vision 目录下）:
+    python -m benchmarks.run_benchmarks --output benchmarks/results.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --threshold 0.25
+    python -m benchmarks.run_benchmarks --update-baseline benchmarks/baseline.json
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from benchmarks.frames import (
+    VARIANT_BARCODE, VARIANT_BLANK, SyntheticFrame, encode_jpeg, make_frame, parse_resolution
+)
+from config import settings
+from services import stages
+from protos import vision_pb2
+from services.image_codec import DECODE_COLOR, DECODE_GRAY, decode_image, wrap_raw
+from services.image_store import ImageWriter
+
+SCHEMA_VERSION = 1
+DEFAULT_RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+METRICS = ("p50_ms", "p95_ms", "mean_ms")
+
+
+@dataclass
+class BenchCase:
+    """基准用例"""
+    name: str
+    fn: Callable[[], Any]
+    check: Optional[Callable[[Any], bool]] = None  # 结果正确性校验
+    skip_reason: str = ""
+
+
+def measure(case: BenchCase, iterations: int, warmup: int) -> Dict[str, Any]:
+    """执行用例并统计延迟分布"""
+    if case.skip_reason:
+        return {"skipped": case.skip_reason}
+
+    result = None
+    for _ in range(warmup):
+        result = case.fn()
+
+    samples = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        result = case.fn()
+        samples[i] = (time.perf_counter() - start) * 1000
+
+    stats = {
+        "iterations": iterations,
+        "mean_ms": float(samples.mean()),
+        "min_ms": float(samples.min()),
+        "p25_ms": float(np.percentile(samples, 25)),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p75_ms": float(np.percentile(samples, 75)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "throughput_per_s": float(1000.0 / samples.mean()) if samples.mean() > 0 else 0.0,
+    }
+    if case.check is not None:
+        stats["correct"] = bool(case.check(result))
+    return stats
+
+
+def build_cases(resolutions: List[str], workdir: Path) -> List[BenchCase]:
+    """为每个分辨率与帧类型构造用例"""
+    detector = stages.get_detector()
+    writer = ImageWriter(root=workdir, workers=1)
+
+    try:
+        ocr = stages.get_ocr_service()
+        ocr.load()
+        ocr_skip = "未加载OCR模型" if ocr.simulated else ""
+    except Exception as e:
+        ocr_skip = f"OCR服务不可用: {e}"
+
+    model_skip = "" if detector.backend is not None else "未加载检测模型"
+
+    cases = []
+    for resolution in resolutions:
+        width, height = parse_resolution(resolution)
+        for variant in (VARIANT_BARCODE, VARIANT_BLANK):
+            frame = make_frame(width, height, variant)
+            cases.extend(_frame_cases(f"{variant}/{resolution}", frame, detector, writer,
+                                      model_skip, ocr_skip))
+    return cases
+
+
+def _frame_cases(suffix: str, frame: SyntheticFrame, detector, writer: ImageWriter,
+                 model_skip: str, ocr_skip: str) -> List[BenchCase]:
+    image = frame.image
+    jpeg = encode_jpeg(image, settings.IMAGE_JPEG_QUALITY)
+    save_path = writer.root / f"bench_{suffix.replace('/', '_')}.jpg"
+    raw = vision_pb2.RawImage(
+        data=image.tobytes(), width=image.shape[1], height=image.shape[0], format=vision_pb2.BGR8
+    )
+    raw_data = raw.data
+
+    def expect_code(code) -> bool:
+        return code == frame.trace_code
+
+    return [
+        BenchCase(f"decode/{suffix}", lambda: decode_image(jpeg, DECODE_COLOR),
+                  check=lambda decoded: decoded is not None and decoded.shape == image.shape),
+        BenchCase(f"decode_gray/{suffix}", lambda: decode_image(jpeg, DECODE_GRAY),
+                  check=lambda decoded: decoded is not None and decoded.shape == image.shape[:2]),
+        BenchCase(f"decode_gray_reduced2/{suffix}", lambda: decode_image(jpeg, DECODE_GRAY, 2)),
+        BenchCase(f"raw_wrap/{suffix}", lambda: wrap_raw(raw, DECODE_COLOR, data=raw_data),
+                  check=lambda wrapped: wrapped is not None and np.array_equal(wrapped, image)),
+        BenchCase(f"raw_wrap_gray/{suffix}", lambda: wrap_raw(raw, DECODE_GRAY, data=raw_data)),
+        BenchCase(f"barcode_roi/{suffix}", lambda: stages.scan_barcode(image, [frame.vial_bbox]),
+                  check=expect_code),
+        BenchCase(f"barcode_full/{suffix}", lambda: stages.scan_barcode(image), check=expect_code),
+        BenchCase(f"detect_simulated/{suffix}", lambda: detector._simulate_detection(image)),
+        BenchCase(f"detect_model/{suffix}", lambda: detector.detect(image), skip_reason=model_skip),
+        BenchCase(f"detect_all_model/{suffix}", lambda: detector.detect_all(image), skip_reason=model_skip),
+        BenchCase(f"ocr/{suffix}", lambda: stages.recognize_text(image), skip_reason=ocr_skip),
+        BenchCase(f"ocr_roi/{suffix}", lambda: stages.recognize_text(image, [frame.vial_bbox]),
+                  skip_reason=ocr_skip),
+        BenchCase(f"save/{suffix}", lambda: writer.write(image, save_path)),
+    ]
+
+
+def environment() -> Dict[str, Any]:
+    """记录运行环境，便于判断基线是否可比"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+    }
+
+
+def _iqr(stats: Dict[str, Any]) -> float:
+    """四分位距，旧版本基线没有 p25/p75 时为0"""
+    if "p25_ms" not in stats or "p75_ms" not in stats:
+        return 0.0
+    return stats["p75_ms"] - stats["p25_ms"]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], metric: str,
+            threshold: float, min_delta_ms: float, min_iterations: int = 20,
+            noise_iqr: float = 1.0) -> Tuple[List[str], List[str]]:
+    """
+    与基线对比
+
+    基线文件可包含 "thresholds": {"用例通配符": 比例}，覆盖默认阈值。
+    计时次数少于 min_iterations 的用例只校验正确性；耗时增量须超过比例阈值，
+    且超过 max(min_delta_ms, noise_iqr * 四分位距) 才判为退化。
+
+    Returns:
+        (退化描述列表, 样本不足未对比的用例列表)
+    """
+    overrides = baseline.get("thresholds", {})
+    regressions = []
+    insufficient = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None or "skipped" in current or "skipped" in base:
+            continue
+
+        if base.get("correct") and current.get("correct") is False:
+            regressions.append(f"{name}: 结果不再正确")
+
+        if min(base.get("iterations", 0), current.get("iterations", 0)) < min_iterations:
+            insufficient.append(name)
+            continue
+
+        limit = threshold
+        for pattern, value in overrides.items():
+            if fnmatch.fnmatch(name, pattern):
+                limit = value
+        old, new = base[metric], current[metric]
+        noise = max(min_delta_ms, noise_iqr * max(_iqr(base), _iqr(current)))
+        if new > old * (1 + limit) and new - old > noise:
+            regressions.append(
+                f"{name}: {metric} {old:.3f}ms -> {new:.3f}ms (+{(new / old - 1) * 100:.0f}%, "
+                f"允许{limit * 100:.0f}%, 噪声容差{noise:.3f}ms)"
+            )
+    return regressions, insufficient
+
+
+def print_table(results: Dict[str, Any]):
+    print(f"{'用例':<44} {'p50(ms)':>10} {'p95(ms)':>10} {'吞吐(/s)':>10}  正确")
+    for name, stats in results.items():
+        if "skipped" in stats:
+            print(f"{name:<44} {'skipped':>10}  {stats['skipped']}")
+            continue
+        correct = {True: "是", False: "否"}.get(stats.get("correct"), "-")
+        print(f"{name:<44} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+              f"{stats['throughput_per_s']:>10.1f}  {correct}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="视觉处理分阶段性能基准")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS,
+                        help="帧分辨率，格式 WIDTHxHEIGHT")
+    parser.add_argument("--iterations", type=int, default=30, help="每个用例的计时次数")
+    parser.add_argument("--warmup", type=int, default=3, help="每个用例的预热次数")
+    parser.add_argument("--filter", default="*", help="只运行名称匹配该通配符的用例")
+    parser.add_argument("--output", type=Path, help="结果JSON输出路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", type=Path, help="基线JSON，超出阈值时退出码为1")
+    parser.add_argument("--update-baseline", type=Path, help="将本次结果写为基线")
+    parser.add_argument("--metric", choices=METRICS, default="p50_ms", help="对比基线所用指标")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的退化比例")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="绝对差值低于该值时不视为退化（过滤亚毫秒级抖动）")
+    parser.add_argument("--min-iterations", type=int, default=20,
+                        help="基线与本次计时次数均不少于该值的用例才做耗时对比")
+    parser.add_argument("--noise-iqr", type=float, default=1.0,
+                        help="绝对差值还须超过该倍数的四分位距（基线与本次中较大者）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory(prefix="vision-bench-") as workdir:
+        cases = [
+            case for case in build_cases(args.resolutions, Path(workdir))
+            if fnmatch.fnmatch(case.name, args.filter)
+        ]
+        results = {case.name: measure(case, args.iterations, args.warmup) for case in cases}
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "settings": {
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "barcode_pyramid_scales": settings.BARCODE_PYRAMID_SCALES,
+            "barcode_roi_padding": settings.BARCODE_ROI_PADDING,
+            "image_jpeg_quality": settings.IMAGE_JPEG_QUALITY,
+        },
+        "results": results,
+    }
+
+    print_table(results)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text, encoding="utf-8")
+    elif not args.update_baseline:
+        print(text)
+
+    if args.update_baseline:
+        # 保留已有基线中手工配置的阈值
+        if args.update_baseline.exists():
+            previous = json.loads(args.update_baseline.read_text(encoding="utf-8"))
+            if "thresholds" in previous:
+                report["thresholds"] = previous["thresholds"]
+        args.update_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.update_baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已更新: {args.update_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("environment", {}).get("cpu_count") != report["environment"]["cpu_count"]:
+            print("警告: 基线与本机CPU核数不同，对比结果仅供参考", file=sys.stderr)
+        regressions, insufficient = compare(
+            results, baseline, args.metric, args.threshold, args.min_delta_ms,
+            args.min_iterations, args.noise_iqr
+        )
+        if insufficient:
+            print(f"警告: {len(insufficient)} 项计时次数少于 {args.min_iterations}，未做耗时对比: "
+                  f"{', '.join(insufficient)}", file=sys.stderr)
+        if regressions:
+            print(f"性能退化 {len(regressions)} 项:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("未发现性能退化")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,45 +6,63 @@
 """
 
 import asyncio
+import os
 import signal
 import sys
 from concurrent import futures
+from typing import Optional
 
 import grpc
+from grpc_health.v1 import health, health_pb2_grpc
 from loguru import logger
 
 from config import settings
 from services.vision_service import VisionServicer
 from services.camera_service import CameraManager
+from services.compute import ComputeExecutor
+from services.image_store import ImageWriter
+from services.logs import configure_logging
+from services.metrics import MetricsServer
+from services.startup import StartupManager
+from services.supervisor import WorkerInfo, WorkerSupervisor, reuseport_supported
+from services.trace_index import TraceCodeIndex
 from protos import vision_pb2_grpc
 
 
-def configure_logging():
-    """配置日志"""
-    logger.remove()
-    logger.add(
-        sys.stderr,
-        level=settings.LOG_LEVEL,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-               "<level>{level: <8}</level> | "
-               "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
-               "<level>{message}</level>"
-    )
-    logger.add(
-        settings.LOG_PATH / "vision_{time:YYYY-MM-DD}.log",
-        level=settings.LOG_LEVEL,
-        rotation="00:00",
-        retention="30 days",
-        compression="zip"
-    )
-
-
-async def serve():
-    """启动gRPC服务"""
-    # 初始化相机管理器
-    camera_manager = CameraManager()
-    if settings.CAMERA_ENABLED:
-        await camera_manager.initialize()
+async def serve(worker: Optional[WorkerInfo] = None):
+    """
+    启动gRPC服务
+    
+    Args:
+        worker: 多进程模式下本工作进程的信息，None 表示单进程
+    """
+    # 相机管理器（在后台启动流程中初始化）：多进程时只打开分配给本进程的相机
+    if worker is None:
+        camera_manager = CameraManager()
+    else:
+        camera_manager = CameraManager(worker.cameras, default_id=worker.default_camera)
+    
+    # 初始化计算执行器
+    compute = ComputeExecutor()
+    
+    # 初始化图像写入器（未启用存图时不启动写入线程与保留期清理）
+    image_writer = ImageWriter() if settings.IMAGE_SAVE_ENABLED else None
+    if image_writer is not None:
+        image_writer.start()
+    
+    # 在库溯源码索引（在后台启动流程中加载）
+    trace_index = TraceCodeIndex() if settings.TRACE_INDEX_ENABLED else None
+    
+    # 本地指标端点
+    metrics_server = None
+    if settings.METRICS_ENABLED:
+        port = settings.METRICS_PORT + (worker.index if worker else 0)
+        metrics_server = MetricsServer(settings.METRICS_HOST, port)
+        try:
+            metrics_server.start()
+        except OSError as e:
+            logger.warning(f"指标端点启动失败: {e}")
+            metrics_server = None
     
     # 创建gRPC服务器
     server = grpc.aio.server(
@@ -52,36 +70,78 @@ async def serve():
         options=[
             ('grpc.max_receive_message_length', 50 * 1024 * 1024),  # 50MB
             ('grpc.max_send_message_length', 50 * 1024 * 1024),
+            # 多个工作进程共同监听同一端口，由内核分发连接
+            ('grpc.so_reuseport', 1 if worker is not None else 0),
         ]
     )
     
+    # 健康检查：模型预热完成前报告 NOT_SERVING
+    health_servicer = health.aio.HealthServicer()
+    startup = StartupManager(compute, camera_manager, health_servicer, trace_index)
+    await startup.initialize()
+    
     # 注册服务
-    vision_servicer = VisionServicer(camera_manager)
+    vision_servicer = VisionServicer(
+        camera_manager, compute, image_writer, startup,
+        camera_routes=worker.camera_routes if worker else None,
+        trace_index=trace_index
+    )
     vision_pb2_grpc.add_VisionServiceServicer_to_server(vision_servicer, server)
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
     
     # 绑定端口
     listen_addr = f"[::]:{settings.GRPC_PORT}"
     server.add_insecure_port(listen_addr)
+    if worker is not None:
+        server.add_insecure_port(worker.internal_address)
     
-    logger.info(f"视觉识别服务启动于 {listen_addr}")
+    name = "" if worker is None else f"(工作进程{worker.index}, pid={os.getpid()})"
+    logger.info(f"视觉识别服务{name}启动于 {listen_addr}")
     
     await server.start()
     
+    # 先监听再在后台导入依赖、加载并预热模型
+    startup_task = asyncio.create_task(startup.run())
+    
     # 优雅关闭
     async def shutdown():
         logger.info("正在关闭服务...")
-        await camera_manager.cleanup()
+        startup_task.cancel()
+        await startup.shutdown()
         await server.stop(5)
+        await vision_servicer.close()
+        await camera_manager.cleanup()
+        if trace_index is not None:
+            await trace_index.stop()
+        compute.shutdown()
+        if image_writer is not None:
+            image_writer.close()
+        if metrics_server is not None:
+            metrics_server.stop()
         logger.info("服务已关闭")
     
-    # 注册信号处理
+    # 注册信号处理（工作进程只响应监督进程发出的SIGTERM）
     loop = asyncio.get_event_loop()
-    for sig in (signal.SIGINT, signal.SIGTERM):
+    signals = (signal.SIGINT, signal.SIGTERM) if worker is None else (signal.SIGTERM,)
+    for sig in signals:
         loop.add_signal_handler(sig, lambda: asyncio.create_task(shutdown()))
     
     await server.wait_for_termination()
 
 
+def run_worker(worker: WorkerInfo):
+    """工作进程入口"""
+    configure_logging(worker.index)
+    try:
+        asyncio.run(serve(worker))
+    except Exception as e:
+        logger.exception(f"工作进程{worker.index}异常退出: {e}")
+        sys.exit(1)
+    finally:
+        # 工作进程退出时不执行atexit，显式写出日志队列
+        logger.remove()
+
+
 def main():
     """主入口"""
     configure_logging()
@@ -91,6 +151,12 @@ def main():
     logger.info(f"版本: {settings.VERSION}")
     logger.info("=" * 50)
     
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    if workers > 1:
+        if reuseport_supported():
+            sys.exit(WorkerSupervisor(workers, run_worker).run())
+        logger.warning("当前平台不支持SO_REUSEPORT，以单进程运行")
+    
     try:
         asyncio.run(serve())
     except KeyboardInterrupt:
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+条码识别 - 基于检测框ROI的多尺度解码
+
+每个尺度上按预处理变体级联解码（灰度、Otsu、自适应二值化、CLAHE、反色、旋转），
+找到合法溯源码即停止。各来源（相机）分别统计每个变体的成功次数与耗时，
+按"每毫秒成功数"重新排序，常见情况一次解码即可命中。
+"""
+
+import re
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import cv2
+import numpy as np
+from loguru import logger
+from pyzbar import pyzbar
+
+from config import settings
+from services.buffer_pool import buffer_pool
+
+# 溯源码长度 (20位数字)
+TRACE_CODE_LENGTH = 20
+
+BBox = Tuple[int, int, int, int]  # x1, y1, x2, y2
+
+
+@dataclass
+class BarcodeHit:
+    """识别到的溯源码及其在原图中的位置"""
+    code: str
+    bbox: BBox
+
+
+def is_trace_code(data: str) -> bool:
+    """验证溯源码格式"""
+    return len(data) == TRACE_CODE_LENGTH and data.isdigit()
+
+
+def decode_trace_code(image: np.ndarray) -> Optional[str]:
+    """对单张图像执行一次pyzbar解码，返回第一个合法溯源码"""
+    for barcode in pyzbar.decode(image):
+        data = barcode.data.decode('utf-8')
+        logger.debug("检测到条码", type=barcode.type, data=data)
+        if is_trace_code(data):
+            return data
+    return None
+
+
+def decode_all_trace_codes(image: np.ndarray, scale: float = 1.0,
+                           offset: Tuple[int, int] = (0, 0)) -> List[BarcodeHit]:
+    """
+    解码图像中所有合法溯源码
+
+    Args:
+        image: 待解码图像（可为缩放后的ROI）
+        scale: image相对原图的缩放比例
+        offset: ROI左上角在原图中的坐标
+    """
+    hits = []
+    for barcode in pyzbar.decode(image):
+        data = barcode.data.decode('utf-8')
+        if not is_trace_code(data):
+            continue
+        left, top, width, height = barcode.rect
+        x1 = int(left / scale) + offset[0]
+        y1 = int(top / scale) + offset[1]
+        hits.append(BarcodeHit(
+            code=data,
+            bbox=(x1, y1, x1 + int(width / scale), y1 + int(height / scale)),
+        ))
+    return hits
+
+
+def to_gray(image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """转为灰度图（已是灰度则直接返回），out 为可选的输出缓冲区"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
+
+
+def enhance(gray: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """图像增强：高斯模糊 + 自适应二值化，out 为可选的输出缓冲区"""
+    with buffer_pool.borrow(gray.shape) as blurred:
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=blurred)
+        return cv2.adaptiveThreshold(
+            blurred, 255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, 11, 2,
+            dst=out
+        )
+
+
+def _otsu(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    out = stack.enter_context(buffer_pool.borrow(gray.shape))
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU, dst=out)
+    return out
+
+
+def _adaptive(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    return _pooled_enhance(gray, stack)
+
+
+_clahe_local = threading.local()
+
+
+def _clahe(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    # CLAHE对象有内部状态，每个线程各用一个
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = _clahe_local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    out = stack.enter_context(buffer_pool.borrow(gray.shape))
+    return clahe.apply(gray, dst=out)
+
+
+def _inverted(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    # 深色底浅色码（激光打标等）
+    out = stack.enter_context(buffer_pool.borrow(gray.shape))
+    return cv2.bitwise_not(gray, dst=out)
+
+
+def _rotate45(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    # zbar只沿水平/竖直扫描线解码一维码，倾斜约45度的条码旋转后可读
+    h, w = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), 45, 1.0)
+    out = stack.enter_context(buffer_pool.borrow(gray.shape))
+    return cv2.warpAffine(gray, matrix, (w, h), dst=out, borderMode=cv2.BORDER_REPLICATE)
+
+
+@dataclass(frozen=True)
+class Variant:
+    """预处理变体"""
+    name: str
+    apply: Callable[[np.ndarray, ExitStack], np.ndarray]  # (灰度图, 缓冲区栈) -> 待解码图像
+    keeps_geometry: bool = True  # 输出坐标与输入一致（托盘定位需要）
+
+
+VARIANTS: Dict[str, Variant] = {
+    variant.name: variant for variant in (
+        Variant("gray", lambda gray, stack: gray),
+        Variant("otsu", _otsu),
+        Variant("adaptive", _adaptive),
+        Variant("clahe", _clahe),
+        Variant("inverted", _inverted),
+        Variant("rotate45", _rotate45, keeps_geometry=False),
+    )
+}
+
+
+@dataclass
+class VariantStats:
+    """变体统计：累计值用于导出，衰减值用于排序"""
+    attempts: int = 0
+    successes: int = 0
+    total_ms: float = 0.0
+    weighted_successes: float = 0.0
+    weighted_ms: float = 0.0
+
+    def score(self, prior_ms: float) -> float:
+        """每毫秒成功数；先验（1次成功、prior_ms毫秒）使未尝试的变体按配置顺序排列"""
+        return (self.weighted_successes + 1.0) / (self.weighted_ms + prior_ms)
+
+
+T = TypeVar("T")
+
+# 预热扫描的来源：按默认顺序执行，不计入统计、不影响排序
+WARMUP_SOURCE = "warmup"
+
+
+class BarcodeCascade:
+    """
+    自适应预处理级联（线程安全）
+
+    统计按来源分组，来源为相机ID或"request"（客户端上传图像）；预热（WARMUP_SOURCE）不记录。
+    进程池模式下每个工作进程各自学习与统计。
+    """
+
+    def __init__(self, variants: Optional[Sequence[str]] = None):
+        names = list(variants if variants is not None else settings.BARCODE_CASCADE)
+        unknown = [name for name in names if name not in VARIANTS]
+        if unknown:
+            raise ValueError(f"未知的条码预处理变体: {unknown}，可选: {list(VARIANTS)}")
+        self.variants = names
+        self._stats: Dict[str, Dict[str, VariantStats]] = {}
+        self._orders: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.decodes = 0
+        self.first_hits = 0  # 第一个变体即命中的次数
+
+    def order(self, source: str = "") -> List[str]:
+        """该来源当前的变体顺序"""
+        if not settings.BARCODE_CASCADE_ADAPTIVE:
+            return self.variants
+        return self._orders.get(source, self.variants)
+
+    def run(self, gray: np.ndarray, decode: Callable[[np.ndarray], T], source: str = "",
+            keep_geometry: bool = False) -> Optional[T]:
+        """
+        按当前顺序逐个变体解码，返回第一个非空结果
+
+        Args:
+            decode: 解码函数，结果为空（None/空列表）表示失败
+            keep_geometry: 只使用不改变坐标的变体
+        """
+        record = source != WARMUP_SOURCE
+        attempts = 0
+        result = None
+        for name in self.order(source):
+            variant = VARIANTS[name]
+            if keep_geometry and not variant.keeps_geometry:
+                continue
+            start = time.perf_counter()
+            with ExitStack() as stack:
+                result = decode(variant.apply(gray, stack))
+            attempts += 1
+            if record:
+                self._record(source, name, (time.perf_counter() - start) * 1000, bool(result))
+            if result:
+                break
+
+        if record:
+            with self._lock:
+                self.runs += 1
+                self.decodes += attempts
+                if result and attempts == 1:
+                    self.first_hits += 1
+        return result or None
+
+    def _record(self, source: str, name: str, elapsed_ms: float, success: bool):
+        decay = settings.BARCODE_CASCADE_DECAY
+        with self._lock:
+            stats = self._stats.get(source)
+            if stats is None:
+                stats = self._stats[source] = {variant: VariantStats() for variant in self.variants}
+            # 旧样本按次衰减，光照或物料变化后能重新排序
+            for other in stats.values():
+                other.weighted_successes *= decay
+                other.weighted_ms *= decay
+            entry = stats[name]
+            entry.attempts += 1
+            entry.total_ms += elapsed_ms
+            entry.weighted_ms += elapsed_ms
+            if success:
+                entry.successes += 1
+                entry.weighted_successes += 1.0
+
+            # 配置靠前的变体先验耗时更小，同等条件下排在前面
+            position = {variant: i for i, variant in enumerate(self.variants)}
+            self._orders[source] = sorted(
+                self.variants,
+                key=lambda variant: (-stats[variant].score(position[variant] + 1.0), position[variant])
+            )
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._orders.clear()
+            self.runs = self.decodes = self.first_hits = 0
+
+    def stats(self) -> Dict[str, float]:
+        """各来源各变体的尝试/成功次数与耗时，以及平均每次扫描的解码次数"""
+        with self._lock:
+            values: Dict[str, float] = {
+                "runs": self.runs,
+                "decodes_per_run": self.decodes / self.runs if self.runs else 0.0,
+                "first_hit_rate": self.first_hits / self.runs if self.runs else 0.0,
+            }
+            for source, stats in self._stats.items():
+                prefix = re.sub(r"\W", "_", source or "unknown")
+                for name, entry in stats.items():
+                    values[f"{prefix}_{name}_attempts"] = entry.attempts
+                    values[f"{prefix}_{name}_successes"] = entry.successes
+                    values[f"{prefix}_{name}_ms"] = entry.total_ms
+                for rank, name in enumerate(self._orders.get(source, self.variants)):
+                    values[f"{prefix}_{name}_rank"] = rank
+            return values
+
+
+# 本进程共享的级联统计
+cascade = BarcodeCascade()
+
+
+def _pooled_gray(image: np.ndarray, stack: ExitStack) -> np.ndarray:
+    """灰度图写入借出的缓冲区，随 stack 归还"""
+    if image.ndim == 2:
+        return image
+    return to_gray(image, stack.enter_context(buffer_pool.borrow(image.shape[:2])))
+
+
+def _pooled_enhance(gray: np.ndarray, stack: ExitStack) -> np.ndarray:
+    """增强图写入借出的缓冲区，随 stack 归还"""
+    return enhance(gray, stack.enter_context(buffer_pool.borrow(gray.shape)))
+
+
+def pad_bbox(shape: Tuple[int, ...], bbox: BBox, padding: float) -> Optional[BBox]:
+    """按比例外扩检测框并裁剪到图像范围内"""
+    h, w = shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in bbox)
+    pad_x = int((x2 - x1) * padding)
+    pad_y = int((y2 - y1) * padding)
+    x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+    x2, y2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def crop_roi(image: np.ndarray, bbox: BBox, padding: float) -> Optional[np.ndarray]:
+    """按比例外扩检测框并裁剪（返回视图，不复制）"""
+    bounds = pad_bbox(image.shape, bbox, padding)
+    if bounds is None:
+        return None
+    x1, y1, x2, y2 = bounds
+    return image[y1:y2, x1:x2]
+
+
+def _pyramid(gray: np.ndarray, stack: ExitStack) -> Iterator[Tuple[float, np.ndarray]]:
+    """按金字塔由小到大生成 (缩放比例, 图像)，缩小层使用借出的缓冲区"""
+    h, w = gray.shape[:2]
+    for scale in sorted(settings.BARCODE_PYRAMID_SCALES):
+        if scale < 1.0:
+            # 缩小后过窄则条码线条无法分辨，跳过该层
+            if w * scale < settings.BARCODE_MIN_DECODE_WIDTH:
+                continue
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            level = stack.enter_context(buffer_pool.borrow((size[1], size[0])))
+            yield scale, cv2.resize(gray, size, dst=level, interpolation=cv2.INTER_AREA)
+        else:
+            yield 1.0, gray
+
+
+def scan_region(region: np.ndarray, source: str = "") -> Optional[str]:
+    """在ROI上按金字塔由小到大尝试解码，每层按级联顺序尝试预处理变体"""
+    with ExitStack() as stack:
+        for _, level in _pyramid(_pooled_gray(region, stack), stack):
+            code = cascade.run(level, decode_trace_code, source)
+            if code:
+                return code
+    return None
+
+
+def scan_region_all(region: np.ndarray, offset: Tuple[int, int], source: str = "") -> List[BarcodeHit]:
+    """在ROI上按金字塔解码所有溯源码，返回第一个有结果的层级"""
+    with ExitStack() as stack:
+        for scale, level in _pyramid(_pooled_gray(region, stack), stack):
+            hits = cascade.run(
+                level, lambda image: decode_all_trace_codes(image, scale, offset), source, keep_geometry=True
+            )
+            if hits:
+                return hits
+    return []
+
+
+def scan_full_frame(image: np.ndarray, source: str = "") -> Optional[str]:
+    """全图扫描：按级联顺序尝试预处理变体"""
+    with ExitStack() as stack:
+        return cascade.run(_pooled_gray(image, stack), decode_trace_code, source)
+
+
+def scan_barcode(image: np.ndarray, rois: Optional[Sequence[BBox]] = None,
+                 source: str = "") -> Optional[str]:
+    """
+    扫描条码/二维码
+
+    Args:
+        image: BGR或灰度图像
+        rois: 可选的检测框列表，优先只在外扩后的框内解码
+        source: 图像来源（相机ID），预处理级联按来源分别学习
+
+    Returns:
+        20位溯源码，未识别返回None
+    """
+    try:
+        for bbox in rois or ():
+            region = crop_roi(image, bbox, settings.BARCODE_ROI_PADDING)
+            if region is None:
+                continue
+            code = scan_region(region, source)
+            if code:
+                return code
+
+        # 所有ROI均失败才回退全图扫描
+        return scan_full_frame(image, source)
+
+    except Exception as e:
+        logger.error(f"条码扫描失败: {e}")
+        return None
+
+
+def scan_all_barcodes(image: np.ndarray, rois: Optional[Sequence[BBox]] = None,
+                      source: str = "") -> List[BarcodeHit]:
+    """
+    识别图像中的所有溯源码（托盘多瓶验证）
+
+    逐个ROI解码；没有ROI或任一ROI未识别时补充全图解码
+    （全图合并不改变坐标的各变体结果，避免漏掉只在某一变体下可读的条码）。
+    同一溯源码只保留一次。
+
+    Returns:
+        List[BarcodeHit]: 识别结果
+    """
+    found: Dict[str, BarcodeHit] = {}
+    try:
+        need_full_frame = not rois
+        for bbox in rois or ():
+            bounds = pad_bbox(image.shape, bbox, settings.BARCODE_ROI_PADDING)
+            if bounds is None:
+                continue
+            x1, y1, x2, y2 = bounds
+            hits = scan_region_all(image[y1:y2, x1:x2], (x1, y1), source)
+            if not hits:
+                need_full_frame = True
+            for hit in hits:
+                found.setdefault(hit.code, hit)
+
+        if need_full_frame:
+            with ExitStack() as stack:
+                gray = _pooled_gray(image, stack)
+                for name in cascade.order(source):
+                    variant = VARIANTS[name]
+                    if not variant.keeps_geometry:
+                        continue
+                    with ExitStack() as variant_stack:
+                        hits = decode_all_trace_codes(variant.apply(gray, variant_stack))
+                    for hit in hits:
+                        found.setdefault(hit.code, hit)
+
+    except Exception as e:
+        logger.error(f"条码扫描失败: {e}")
+
+    return list(found.values())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+动态微批处理调度器
+
+并发调用方提交的单个请求在队列中汇聚，达到最大批大小或最长等待时间后
+作为一批执行，结果按顺序回传给各调用方。
+"""
+
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence
+
+from loguru import logger
+
+
+@dataclass
+class _Pending:
+    item: Any
+    future: Future
+    enqueued_at: float
+
+
+class MicroBatcher:
+    """
+    微批处理器
+
+    Args:
+        batch_fn: 批处理函数，输入列表，返回等长结果列表
+        max_batch_size: 最大批大小
+        max_wait_ms: 首个请求入队后最长等待时间(毫秒)
+        name: 名称（用于线程名与日志）
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._queue_delay_total = 0.0
+        self._queue_delay_max = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+        # 预加载模型后派生的子进程中没有批处理线程，派生后重建
+        if hasattr(os, "register_at_fork"):
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: after_fork() and after_fork()())
+
+    def _after_fork(self):
+        if self._closed:
+            return
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """提交单个请求，返回Future"""
+        if self._closed:
+            raise RuntimeError(f"{self.name} 已关闭")
+        future: Future = Future()
+        self._queue.put(_Pending(item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """同步提交并等待结果"""
+        return self.submit(item).result()
+
+    def stats(self) -> Dict[str, float]:
+        """批处理统计：批填充率与排队延迟"""
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "fill_ratio": items / (batches * self.max_batch_size) if batches else 0.0,
+                "avg_queue_delay_ms": self._queue_delay_total / items * 1000 if items else 0.0,
+                "max_queue_delay_ms": self._queue_delay_max * 1000,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    def close(self, timeout: float = 2.0):
+        """停止批处理线程，未处理的请求以异常结束"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # 关闭信号放回队列，处理完本批后退出
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            self._execute(batch)
+
+        # 清理关闭后残留的请求
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                pending.future.set_exception(RuntimeError(f"{self.name} 已关闭"))
+
+    def _execute(self, batch: List[_Pending]):
+        started = time.perf_counter()
+        delays = [started - p.enqueued_at for p in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._queue_delay_total += sum(delays)
+            self._queue_delay_max = max(self._queue_delay_max, max(delays))
+
+        try:
+            results = self.batch_fn([p.item for p in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"批处理结果数量不匹配: {len(results)} != {len(batch)}")
+        except Exception as e:
+            logger.error(f"{self.name} 批处理失败: {e}")
+            for p in batch:
+                p.future.set_exception(e)
+            return
+
+        for p, result in zip(batch, results):
+            p.future.set_result(result)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像缓冲池 - 按形状与数据类型复用预处理中间数组
+
+预处理函数借出缓冲区后通过OpenCV的 dst 参数直接写入，用完归还；
+稳态下每个请求几乎不再分配新的整帧数组。
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+PoolKey = Tuple[Tuple[int, ...], str]
+
+
+class BufferPool:
+    """
+    按 (形状, dtype) 分组的数组池（线程安全）
+
+    - 每组最多缓存 max_per_key 个空闲数组
+    - 所有空闲数组总字节数不超过 max_bytes，超出时先淘汰最久未用分组的空闲数组
+      （ROI尺寸各异，一次性形状不应长期占用池容量）
+    """
+
+    def __init__(self, max_per_key: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_per_key = max_per_key or settings.BUFFER_POOL_MAX_PER_SHAPE
+        self.max_bytes = max_bytes or settings.BUFFER_POOL_MAX_BYTES
+        self._free: "OrderedDict[PoolKey, List[np.ndarray]]" = OrderedDict()
+        self._outstanding: Dict[int, PoolKey] = {}
+        self._lock = threading.Lock()
+        self._pooled_bytes = 0
+
+        self.hits = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.discarded = 0
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """借出数组（内容未初始化）"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self._free.move_to_end(key)
+                buffer = free.pop()
+                self._pooled_bytes -= buffer.nbytes
+                self.hits += 1
+                self._outstanding[id(buffer)] = key
+                return buffer
+
+        buffer = np.empty(shape, dtype=dtype)
+        with self._lock:
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+            self._outstanding[id(buffer)] = key
+        return buffer
+
+    def release(self, buffer: np.ndarray):
+        """归还数组；非本池借出或重复归还的数组被忽略"""
+        with self._lock:
+            key = self._outstanding.pop(id(buffer), None)
+            if key is None:
+                return
+            free = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(free) >= self.max_per_key or buffer.nbytes > self.max_bytes:
+                self.discarded += 1
+                return
+            self._evict(self.max_bytes - buffer.nbytes)
+            free.append(buffer)
+            self._pooled_bytes += buffer.nbytes
+
+    def _evict(self, limit: int):
+        """淘汰最久未用分组的空闲数组，直到总字节数不超过 limit（需持有锁）"""
+        while self._pooled_bytes > limit and self._free:
+            key, free = next(iter(self._free.items()))
+            if not free:
+                del self._free[key]
+                continue
+            self._pooled_bytes -= free.pop().nbytes
+            self.discarded += 1
+
+    @contextmanager
+    def borrow(self, shape: Tuple[int, ...], dtype=np.uint8) -> Iterator[np.ndarray]:
+        """借出数组，退出上下文时归还"""
+        buffer = self.acquire(shape, dtype)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._pooled_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """复用统计"""
+        with self._lock:
+            acquires = self.hits + self.allocations
+            return {
+                "hits": self.hits,
+                "allocations": self.allocations,
+                "allocated_bytes": self.allocated_bytes,
+                "discarded": self.discarded,
+                "outstanding": len(self._outstanding),
+                "pooled_bytes": self._pooled_bytes,
+                "hit_rate": self.hits / acquires if acquires else 0.0,
+            }
+
+
+# 本进程共享的缓冲池（进程池的每个工作进程各有一份）
+buffer_pool = BufferPool()
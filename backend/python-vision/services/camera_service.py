@@ -1,22 +1,188 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-相机服务 - 支持海康威视工业相机
+相机服务 - 支持海康威视工业相机，多路相机并发采集
 """
 
 import asyncio
+import random
+import re
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 from loguru import logger
 
 from config import settings
+from services.metrics import metrics
+
+
+@dataclass
+class Frame:
+    """环形缓冲区中的一帧（零拷贝视图）"""
+    seq: int
+    timestamp: float  # time.monotonic()
+    image: np.ndarray
+    _ring: Optional["FrameRing"] = field(default=None, repr=False)
+    _slot: int = field(default=-1, repr=False)
+
+    def release(self):
+        """释放帧，允许采集线程复用其缓冲区"""
+        if self._ring is not None:
+            self._ring.release(self._slot)
+            self._ring = None
+
+    def __enter__(self) -> "Frame":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FrameRing:
+    """
+    预分配的帧环形缓冲区
+
+    采集线程写入空闲槽位，读取方通过引用计数锁定槽位，
+    被锁定的槽位和最新帧不会被覆盖。
+    """
+
+    def __init__(self, size: int, shape: Tuple[int, ...], dtype=np.uint8):
+        # 至少保留一个最新帧槽位和一个写入槽位
+        size = max(size, 2)
+        self._buffers: List[np.ndarray] = [np.empty(shape, dtype=dtype) for _ in range(size)]
+        self._seq = [0] * size
+        self._timestamps = [0.0] * size
+        self._pins = [0] * size
+        self._latest = -1
+        self._next_seq = 1
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._buffers)
+
+    @property
+    def frames(self) -> int:
+        """已写入的帧数"""
+        return self._next_seq - 1
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._buffers[0].shape
+
+    def begin_write(self) -> Optional[int]:
+        """选取最旧的空闲槽位用于写入，所有槽位被占用时返回None"""
+        with self._cond:
+            candidate = -1
+            for slot in range(self.size):
+                if slot == self._latest or self._pins[slot] > 0:
+                    continue
+                if candidate < 0 or self._seq[slot] < self._seq[candidate]:
+                    candidate = slot
+            if candidate < 0:
+                self.dropped += 1
+                return None
+            # 写入期间槽位不可读
+            self._seq[candidate] = 0
+            return candidate
+
+    def buffer(self, slot: int) -> np.ndarray:
+        return self._buffers[slot]
+
+    def commit(self, slot: int, timestamp: float):
+        """提交写入完成的槽位并唤醒等待者"""
+        with self._cond:
+            self._seq[slot] = self._next_seq
+            self._timestamps[slot] = timestamp
+            self._next_seq += 1
+            self._latest = slot
+            self._cond.notify_all()
+
+    def commit_failed(self, slot: int):
+        """写入失败，槽位保持空闲"""
+        with self._cond:
+            self._timestamps[slot] = 0.0
+
+    def release(self, slot: int):
+        with self._cond:
+            if self._pins[slot] > 0:
+                self._pins[slot] -= 1
+
+    def _pin(self, slot: int) -> Frame:
+        self._pins[slot] += 1
+        return Frame(
+            seq=self._seq[slot],
+            timestamp=self._timestamps[slot],
+            image=self._buffers[slot],
+            _ring=self,
+            _slot=slot,
+        )
+
+    def latest(self) -> Optional[Frame]:
+        """获取最新帧（需调用release释放）"""
+        with self._cond:
+            if self._latest < 0:
+                return None
+            return self._pin(self._latest)
+
+    def reset(self):
+        """丢弃已写入的帧（相机重连后旧帧不再返回），被锁定的槽位在释放后复用"""
+        with self._cond:
+            self._seq = [0] * self.size
+            self._timestamps = [0.0] * self.size
+            self._latest = -1
+
+    def wait_newer(self, after: float, timeout: float) -> Optional[Frame]:
+        """等待时间戳晚于after的第一帧"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                # 优先返回最早满足条件的帧
+                best = -1
+                for slot in range(self.size):
+                    if self._seq[slot] == 0 or self._timestamps[slot] <= after:
+                        continue
+                    if best < 0 or self._seq[slot] < self._seq[best]:
+                        best = slot
+                if best >= 0:
+                    return self._pin(best)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+def create_test_image(width: int, height: int) -> np.ndarray:
+    """创建模拟疫苗瓶测试图像（用于模拟相机与模型预热）"""
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:] = (50, 50, 50)  # 灰色背景
+    
+    # 绘制一个模拟的疫苗瓶
+    cv2.rectangle(image, (800, 400), (1120, 700), (200, 200, 200), -1)
+    cv2.rectangle(image, (900, 300), (1020, 400), (180, 180, 180), -1)
+    
+    # 绘制标签区域
+    cv2.rectangle(image, (820, 450), (1100, 650), (255, 255, 255), -1)
+    cv2.putText(image, "VACCINE", (850, 520), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    cv2.putText(image, "20241229001234567890", (830, 580), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    
+    return image
 
 
 class Camera(ABC):
     """相机抽象基类"""
+
+    # 是否支持后台连续采集 (grab_into)
+    supports_streaming: bool = False
     
     @abstractmethod
     async def open(self) -> bool:
@@ -39,14 +205,37 @@ class Camera(ABC):
         """相机是否已打开"""
         pass
 
+    def grab_into(self, out: np.ndarray) -> bool:
+        """
+        同步采集一帧到预分配缓冲区（在采集线程中调用，阻塞至新帧到达）
+
+        默认实现在采集线程中执行一次 capture 再复制到缓冲区，每帧分配新数组；
+        supports_streaming 为 True 的相机应直接写入缓冲区。
+
+        Returns:
+            是否采集成功
+        """
+        image = asyncio.run(self.capture())
+        if image is None:
+            return False
+        if image.shape != out.shape:
+            cv2.resize(image, (out.shape[1], out.shape[0]), dst=out)
+        else:
+            np.copyto(out, image)
+        return True
+
 
 class HikvisionCamera(Camera):
     """海康威视工业相机"""
+
+    supports_streaming = True
     
     def __init__(self, ip: str):
         self.ip = ip
         self._device = None
         self._is_opened = False
+        self._test_image: Optional[np.ndarray] = None
+        self._next_frame_time = 0.0
     
     async def open(self) -> bool:
         """打开相机"""
@@ -86,35 +275,44 @@ class HikvisionCamera(Camera):
             # ret = self._device.MV_CC_GetOneFrameTimeout(...)
             
             # 模拟返回测试图像
-            return self._create_test_image()
+            return self._create_test_image().copy()
             
         except Exception as e:
             logger.error(f"图像采集失败: {e}")
             return None
+
+    def grab_into(self, out: np.ndarray) -> bool:
+        """连续采集一帧到缓冲区"""
+        if not self._is_opened:
+            return False
+
+        # 实际采集代码
+        # ret = self._device.MV_CC_GetImageBuffer(...) 后将数据转换写入out
+
+        # 模拟按帧率出图
+        now = time.monotonic()
+        if self._next_frame_time > now:
+            time.sleep(self._next_frame_time - now)
+        self._next_frame_time = max(now, self._next_frame_time) + 1.0 / max(settings.CAMERA_FPS, 1)
+
+        np.copyto(out, self._create_test_image())
+        return True
     
     @property
     def is_opened(self) -> bool:
         return self._is_opened
     
     def _create_test_image(self) -> np.ndarray:
-        """创建测试图像"""
-        image = np.zeros((settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3), dtype=np.uint8)
-        image[:] = (50, 50, 50)  # 灰色背景
-        
-        # 绘制一个模拟的疫苗瓶
-        cv2.rectangle(image, (800, 400), (1120, 700), (200, 200, 200), -1)
-        cv2.rectangle(image, (900, 300), (1020, 400), (180, 180, 180), -1)
-        
-        # 绘制标签区域
-        cv2.rectangle(image, (820, 450), (1100, 650), (255, 255, 255), -1)
-        cv2.putText(image, "VACCINE", (850, 520), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-        cv2.putText(image, "20241229001234567890", (830, 580), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
-        
-        return image
+        """创建测试图像（只绘制一次，调用方不得修改）"""
+        if self._test_image is None:
+            self._test_image = create_test_image(settings.CAMERA_WIDTH, settings.CAMERA_HEIGHT)
+        return self._test_image
 
 
 class USBCamera(Camera):
     """USB相机"""
+
+    supports_streaming = True
     
     def __init__(self, device_id: int = 0):
         self.device_id = device_id
@@ -151,73 +349,639 @@ class USBCamera(Camera):
         if not self.is_opened:
             return None
         
-        ret, frame = self._cap.read()
+        # 读取阻塞至新帧到达，放到线程中执行，不阻塞其他相机
+        ret, frame = await asyncio.to_thread(self._cap.read)
         if ret:
             return frame
         return None
+
+    def grab_into(self, out: np.ndarray) -> bool:
+        """连续采集一帧到缓冲区"""
+        if not self.is_opened:
+            return False
+
+        ret, frame = self._cap.read(out)
+        if not ret or frame is None:
+            return False
+        # 相机实际分辨率与配置不一致时OpenCV会重新分配
+        if frame is not out:
+            if frame.shape == out.shape:
+                np.copyto(out, frame)
+            else:
+                cv2.resize(frame, (out.shape[1], out.shape[0]), dst=out)
+        return True
     
     @property
     def is_opened(self) -> bool:
         return self._cap is not None and self._cap.isOpened()
 
 
-class CameraManager:
-    """相机管理器"""
-    
-    def __init__(self):
-        self.camera: Optional[Camera] = None
-    
-    async def initialize(self) -> bool:
-        """初始化相机"""
-        if not settings.CAMERA_ENABLED:
-            logger.info("相机功能已禁用")
-            return True
-        
+# 回放相机支持的图像文件
+REPLAY_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+
+class ReplayCamera(Camera):
+    """
+    回放相机：按设定帧率循环回放录制的帧，用于无硬件时的压测
+
+    - 来源: 图像目录（按文件名排序）、视频文件，或 .npy 帧数组 (N, H, W, 3)
+    - 图像目录与视频在打开时解码并缩放到配置分辨率后整体预加载，
+      超过 CAMERA_REPLAY_PRELOAD_MAX_BYTES 时写入临时文件并内存映射；.npy 直接内存映射
+    - jitter_ms: 每帧到达时间在 ±jitter_ms 内随机抖动（不累积漂移）
+    - drop_rate: 按该概率丢弃帧（相机端丢帧，下一帧在下一周期到达）
+    """
+
+    supports_streaming = True
+
+    def __init__(self, path: str, fps: float = 0, loop: bool = True,
+                 jitter_ms: float = 0.0, drop_rate: float = 0.0, seed: int = 0):
+        self.path = Path(path)
+        self.fps = fps or settings.CAMERA_FPS
+        self.loop = loop
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self._rng = random.Random(seed)
+        self._frames: Optional[np.ndarray] = None
+        self._spill: Optional[tempfile.NamedTemporaryFile] = None
+        self._index = 0
+        self._next_base = 0.0
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+
+    async def open(self) -> bool:
+        """加载回放帧"""
         try:
-            # 根据配置选择相机类型
-            if settings.CAMERA_TYPE == "hikvision":
-                self.camera = HikvisionCamera(settings.CAMERA_IP)
-            elif settings.CAMERA_TYPE == "usb":
-                self.camera = USBCamera(0)
+            self._frames = await asyncio.to_thread(self._load)
+        except Exception as e:
+            logger.error(f"回放相机加载失败: {self.path}, {e}")
+            return False
+        if self._frames is None or len(self._frames) == 0:
+            logger.error(f"回放相机没有可用帧: {self.path}")
+            self._frames = None
+            return False
+
+        self._index = 0
+        self._next_base = time.monotonic()
+        logger.info(
+            f"回放相机已打开: {self.path}, {len(self._frames)}帧, {self.fps:g}fps, "
+            f"抖动={self.jitter_ms:g}ms, 丢帧率={self.drop_rate:g}"
+        )
+        return True
+
+    async def close(self):
+        """释放帧数据"""
+        self._frames = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        logger.info(f"回放相机已关闭: 已出帧={self.delivered}, 丢帧={self.dropped}")
+
+    async def capture(self) -> Optional[np.ndarray]:
+        """采集图像（按帧率等待下一帧）"""
+        if not self.is_opened:
+            return None
+        out = np.empty(self._frames.shape[1:], dtype=np.uint8)
+        if not await asyncio.to_thread(self.grab_into, out):
+            return None
+        return out
+
+    def grab_into(self, out: np.ndarray) -> bool:
+        """等待下一帧到达时刻并复制到缓冲区；不循环时回放结束后返回False"""
+        with self._lock:
+            while True:
+                frames = self._frames
+                if frames is None:
+                    return False
+                if self._index >= len(frames):
+                    if not self.loop:
+                        return False
+                    self._index = 0
+                index = self._index
+                self._index += 1
+                self._wait_arrival()
+                if self.drop_rate > 0 and self._rng.random() < self.drop_rate:
+                    self.dropped += 1
+                    continue
+                np.copyto(out, frames[index])
+                self.delivered += 1
+                return True
+
+    @property
+    def is_opened(self) -> bool:
+        return self._frames is not None
+
+    def _wait_arrival(self):
+        """按帧周期（加抖动）等待下一帧到达"""
+        period = 1.0 / max(self.fps, 1e-3)
+        now = time.monotonic()
+        # 读取方跟不上时不补发积压的帧，从当前时刻重新计时
+        self._next_base = max(self._next_base + period, now - period)
+        target = self._next_base
+        if self.jitter_ms > 0:
+            target += self._rng.uniform(-self.jitter_ms, self.jitter_ms) / 1000.0
+        if target > now:
+            time.sleep(target - now)
+
+    def _load(self) -> np.ndarray:
+        if self.path.suffix == ".npy":
+            frames = np.load(self.path, mmap_mode="r")
+            expected = (settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3)
+            if frames.ndim != 4 or frames.shape[1:] != expected or frames.dtype != np.uint8:
+                raise ValueError(f"帧数组应为 uint8 (N, {expected[0]}, {expected[1]}, 3)，实际 {frames.dtype} {frames.shape}")
+            return frames
+
+        if self.path.is_dir():
+            files = sorted(p for p in self.path.iterdir() if p.suffix.lower() in REPLAY_IMAGE_SUFFIXES)
+            images = (cv2.imread(str(p), cv2.IMREAD_COLOR) for p in files)
+            count = len(files)
+        else:
+            images, count = self._read_video()
+        return self._preload(images, min(count, settings.CAMERA_REPLAY_MAX_FRAMES))
+
+    def _read_video(self):
+        cap = cv2.VideoCapture(str(self.path))
+        if not cap.isOpened():
+            raise ValueError("无法打开视频文件")
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            count = settings.CAMERA_REPLAY_MAX_FRAMES
+
+        def frames():
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        return
+                    yield frame
+            finally:
+                cap.release()
+
+        return frames(), count
+
+    def _preload(self, images, count: int) -> np.ndarray:
+        """解码并缩放到配置分辨率，写入连续数组（过大时写入内存映射的临时文件）"""
+        shape = (count, settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3)
+        nbytes = int(np.prod(shape))
+        if nbytes > settings.CAMERA_REPLAY_PRELOAD_MAX_BYTES:
+            self._spill = tempfile.NamedTemporaryFile(prefix="replay-", suffix=".bin")
+            frames = np.memmap(self._spill, dtype=np.uint8, mode="w+", shape=shape)
+        else:
+            frames = np.empty(shape, dtype=np.uint8)
+
+        loaded = 0
+        for image in images:
+            if loaded >= count:
+                break
+            if image is None:
+                continue
+            if image.shape == shape[1:]:
+                np.copyto(frames[loaded], image)
             else:
-                logger.warning(f"未知的相机类型: {settings.CAMERA_TYPE}")
-                self.camera = HikvisionCamera(settings.CAMERA_IP)
-            
-            success = await self.camera.open()
-            if not success:
-                logger.error("相机初始化失败")
-                return False
-            
-            logger.info("相机初始化成功")
-            return True
-            
+                cv2.resize(image, (shape[2], shape[1]), dst=frames[loaded], interpolation=cv2.INTER_AREA)
+            loaded += 1
+        return frames[:loaded]
+
+
+class FrameGrabber:
+    """后台采集线程：持续将相机帧写入环形缓冲区"""
+
+    def __init__(self, camera: Camera, ring: FrameRing, name: str = "frame-grabber"):
+        self.camera = camera
+        self.ring = ring
+        self.name = name
+        self.errors = 0
+        self.consecutive_failures = 0  # 连续采集失败次数，成功后清零
+        self.last_success = 0.0  # 最近一次采集成功的时间 (time.monotonic)
+        self._scratch: Optional[np.ndarray] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop_event.clear()
+        self.last_success = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"后台采集已启动: {self.name}, 缓冲区={self.ring.size}帧")
+
+    def stop(self, timeout: float = 2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        logger.info(f"后台采集已停止: {self.name}, 丢帧={self.ring.dropped}, 错误={self.errors}")
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            slot = self.ring.begin_write()
+            if slot is None:
+                # 所有槽位被占用：仍读出一帧以免相机端积压
+                if self._scratch is None:
+                    self._scratch = np.empty(self.ring.shape, dtype=np.uint8)
+                if not self._grab(self._scratch):
+                    self._stop_event.wait(0.05)
+                continue
+
+            if self._grab(self.ring.buffer(slot)):
+                self.ring.commit(slot, time.monotonic())
+            else:
+                self.ring.commit_failed(slot)
+                self._stop_event.wait(0.05)
+
+    def _grab(self, out: np.ndarray) -> bool:
+        try:
+            success = self.camera.grab_into(out)
         except Exception as e:
-            logger.exception(f"相机初始化异常: {e}")
+            self.errors += 1
+            logger.error(f"后台采集失败: {self.name}, {e}")
+            success = False
+        if success:
+            self.consecutive_failures = 0
+            self.last_success = time.monotonic()
+        else:
+            self.consecutive_failures += 1
+        return success
+
+
+# 相机通道状态
+STATE_OFFLINE = "offline"  # 未打开（相机功能禁用或尚未初始化）
+STATE_ONLINE = "online"
+STATE_RECONNECTING = "reconnecting"
+
+
+class UnknownCameraError(Exception):
+    """请求的相机ID未配置"""
+    pass
+
+
+@dataclass
+class CameraConfig:
+    """单路相机配置"""
+    id: str
+    type: str = "hikvision"  # hikvision / usb / replay
+    ip: str = ""
+    device: int = 0  # USB设备号
+    # 回放相机 (type=replay)
+    path: str = ""  # 图像目录、视频文件或 .npy 帧数组
+    fps: float = 0  # 0 表示 CAMERA_FPS
+    loop: bool = True
+    jitter_ms: float = 0.0
+    drop_rate: float = 0.0
+    seed: int = 0
+
+
+def camera_configs() -> List[CameraConfig]:
+    """读取相机列表；未配置 CAMERAS 时使用单相机配置 CAMERA_TYPE / CAMERA_IP"""
+    if not settings.CAMERAS:
+        return [CameraConfig(
+            id=settings.CAMERA_DEFAULT_ID, type=settings.CAMERA_TYPE, ip=settings.CAMERA_IP,
+            path=settings.CAMERA_REPLAY_PATH
+        )]
+
+    configs = [CameraConfig(**entry) for entry in settings.CAMERAS]
+    ids = [config.id for config in configs]
+    if len(set(ids)) != len(ids) or not all(ids):
+        raise ValueError(f"相机ID必须非空且唯一: {ids}")
+    return configs
+
+
+def create_camera(config: CameraConfig) -> Camera:
+    """根据配置创建相机"""
+    if config.type == "hikvision":
+        return HikvisionCamera(config.ip)
+    if config.type == "usb":
+        return USBCamera(config.device)
+    if config.type == "replay":
+        return ReplayCamera(config.path, config.fps, config.loop, config.jitter_ms,
+                            config.drop_rate, config.seed)
+    logger.warning(f"未知的相机类型: {config.type}")
+    return HikvisionCamera(config.ip)
+
+
+class CameraChannel:
+    """
+    单路相机：采集、健康检查与断线重连
+
+    后台监控任务周期检查相机状态（未打开、连续采集失败、长时间无新帧），
+    异常时关闭相机并按指数退避重连；重连期间采集返回后备图像。
+    """
+
+    def __init__(self, config: CameraConfig):
+        self.id = config.id
+        self.config = config
+        self.camera: Optional[Camera] = None
+        self.grabber: Optional[FrameGrabber] = None
+        self.state = STATE_OFFLINE
+        self.failures = 0  # 单次采集模式的连续失败次数
+        self.reconnects = 0
+        self.last_error = ""
+        self._ring: Optional[FrameRing] = None
+        self._fallback: Optional[np.ndarray] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        # 同一相机的连拍依次进行：并发连拍各自锁定多帧会占满环形缓冲区
+        self._burst_lock = asyncio.Lock()
+
+    async def open(self) -> bool:
+        """打开相机并启动后台采集"""
+        camera = create_camera(self.config)
+        try:
+            success = await camera.open()
+        except Exception as e:
+            logger.exception(f"相机[{self.id}]打开异常: {e}")
+            success = False
+        if not success:
+            self.last_error = "打开失败"
+            await camera.close()
             return False
+
+        self.camera = camera
+        if settings.CAMERA_GRABBER_ENABLED and camera.supports_streaming:
+            # 重连时复用环形缓冲区，断线前的帧作废
+            if self._ring is None:
+                self._ring = FrameRing(
+                    settings.CAMERA_RING_SIZE,
+                    (settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3)
+                )
+            else:
+                self._ring.reset()
+            self.grabber = FrameGrabber(camera, self._ring, name=f"frame-grabber-{self.id}")
+            self.grabber.start()
+
+        self.failures = 0
+        self.state = STATE_ONLINE
+        return True
+
+    async def close(self):
+        """停止后台采集并关闭相机"""
+        if self.grabber:
+            await asyncio.to_thread(self.grabber.stop)
+            self.grabber = None
+        if self.camera:
+            await self.camera.close()
+            self.camera = None
+
+    def start_supervisor(self):
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        """停止监控并关闭相机"""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        await self.close()
+        self.state = STATE_OFFLINE
+
+    def check(self) -> str:
+        """健康检查，返回异常原因，正常时返回空字符串"""
+        if self.camera is None or not self.camera.is_opened:
+            return "相机未打开"
+        if self.grabber is not None:
+            if not self.grabber.is_running:
+                return "采集线程已退出"
+            if self.grabber.consecutive_failures >= settings.CAMERA_FAILURE_THRESHOLD:
+                return f"连续采集失败{self.grabber.consecutive_failures}次"
+            if time.monotonic() - self.grabber.last_success > settings.CAMERA_STALL_TIMEOUT:
+                return f"超过{settings.CAMERA_STALL_TIMEOUT:.0f}秒无新帧"
+        elif self.failures >= settings.CAMERA_FAILURE_THRESHOLD:
+            return f"连续采集失败{self.failures}次"
+        return ""
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(settings.CAMERA_HEALTH_INTERVAL)
+            problem = self.check()
+            if problem:
+                self.last_error = problem
+                await self._reconnect()
+
+    async def _reconnect(self):
+        """关闭相机后按指数退避重连，直至成功"""
+        self.state = STATE_RECONNECTING
+        logger.warning(f"相机[{self.id}]异常，开始重连: {self.last_error}")
+        await self.close()
+
+        delay = settings.CAMERA_RECONNECT_INITIAL
+        while not await self.open():
+            logger.warning(f"相机[{self.id}]重连失败，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.CAMERA_RECONNECT_MAX)
+
+        self.reconnects += 1
+        logger.info(f"相机[{self.id}]已重连: 累计{self.reconnects}次")
+
+    async def acquire_frame(self, newer_than: Optional[float] = None,
+                            timeout: Optional[float] = None) -> Optional[Frame]:
+        """
+        从后台采集缓冲区获取帧（零拷贝，使用后需release）
+
+        Args:
+            newer_than: 只接受时间戳晚于该值的帧 (time.monotonic)，None表示最新帧；
+                最新帧早于 CAMERA_FRAME_TIMEOUT 时视为过期（采集停滞），等待下一帧
+            timeout: 等待超时(秒)
+        """
+        if self.grabber is None:
+            return None
+        
+        ring = self.grabber.ring
+        if newer_than is None:
+            frame = ring.latest()
+            if frame is None:
+                newer_than = 0.0
+            elif time.monotonic() - frame.timestamp <= settings.CAMERA_FRAME_TIMEOUT:
+                return frame
+            else:
+                frame.release()
+                newer_than = frame.timestamp
+        
+        timeout = settings.CAMERA_FRAME_TIMEOUT if timeout is None else timeout
+        return await asyncio.to_thread(ring.wait_newer, newer_than, timeout)
+    
+    @asynccontextmanager
+    async def frame(self, newer_than: Optional[float] = None) -> AsyncIterator[Frame]:
+        """获取一帧，退出上下文时释放缓冲区"""
+        frame = None
+        with metrics.track("stage", stage="capture"):
+            if self.grabber is not None:
+                frame = await self.acquire_frame(newer_than)
+                if frame is None:
+                    logger.warning(f"相机[{self.id}]等待采集帧超时，使用后备图像")
+                    metrics.counter("camera_fallback_frames_total", "后备图像帧数").inc()
+                    frame = Frame(seq=0, timestamp=time.monotonic(), image=self._fallback_image())
+            if frame is None:
+                # 未启用后台采集，单次采集
+                frame = Frame(seq=0, timestamp=time.monotonic(), image=await self.capture())
+        try:
+            yield frame
+        finally:
+            frame.release()
+    
+    @asynccontextmanager
+    async def burst(self, count: int, newer_than: Optional[float] = None) -> AsyncIterator[List[Frame]]:
+        """
+        连拍：获取连续到达的多帧，退出上下文时统一释放
+
+        同一相机的连拍依次进行，前一次连拍的帧释放后才开始取帧
+
+        Args:
+            count: 帧数（后台采集模式下受环形缓冲区大小限制）
+            newer_than: 只接受晚于该时间戳的帧，默认从当前时刻起
+        """
+        frames: List[Frame] = []
+        async with self._burst_lock:
+            try:
+                if self.grabber is None:
+                    for _ in range(count):
+                        image = await self.capture()
+                        frames.append(Frame(seq=0, timestamp=time.monotonic(), image=image))
+                else:
+                    # 至少留出最新帧和一个写入槽位给采集线程
+                    count = min(count, max(1, self.grabber.ring.size - 2))
+                    after = time.monotonic() if newer_than is None else newer_than
+                    for _ in range(count):
+                        frame = await self.acquire_frame(after)
+                        if frame is None:
+                            break
+                        frames.append(frame)
+                        after = frame.timestamp
+                yield frames
+            finally:
+                for frame in frames:
+                    frame.release()
     
     async def capture(self) -> Optional[np.ndarray]:
         """采集图像"""
         if self.camera is None:
-            # 返回测试图像
+            # 未打开或重连中，返回测试图像
             return self._create_fallback_image()
         
+        if self.grabber is not None:
+            # 采集线程独占相机，这里只从缓冲区复制
+            frame = await self.acquire_frame()
+            if frame is None:
+                logger.warning(f"相机[{self.id}]等待采集帧超时，使用后备图像")
+                return self._create_fallback_image()
+            with frame:
+                return frame.image.copy()
+        
         image = await self.camera.capture()
         if image is None:
-            logger.warning("图像采集失败，使用后备图像")
+            self.failures += 1
+            logger.warning(f"相机[{self.id}]图像采集失败，使用后备图像")
             return self._create_fallback_image()
         
+        self.failures = 0
         return image
     
-    async def cleanup(self):
-        """清理资源"""
-        if self.camera:
-            await self.camera.close()
-            self.camera = None
+    def stats(self) -> Dict[str, float]:
+        """采集与健康统计"""
+        values = {
+            "online": float(self.state == STATE_ONLINE),
+            "reconnects": self.reconnects,
+        }
+        if self.grabber is not None:
+            values.update({
+                "frames": self.grabber.ring.frames,
+                "dropped": self.grabber.ring.dropped,
+                "errors": self.grabber.errors,
+                "running": float(self.grabber.is_running),
+            })
+        return values
     
+    def _fallback_image(self) -> np.ndarray:
+        """共享的只读后备图像（只绘制一次）"""
+        if self._fallback is None:
+            image = np.zeros((settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3), dtype=np.uint8)
+            cv2.putText(image, "Camera Offline", (700, 540), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
+            image.setflags(write=False)
+            self._fallback = image
+        return self._fallback
+
     def _create_fallback_image(self) -> np.ndarray:
-        """创建后备图像"""
-        image = np.zeros((settings.CAMERA_HEIGHT, settings.CAMERA_WIDTH, 3), dtype=np.uint8)
-        cv2.putText(image, "Camera Offline", (700, 540), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
-        return image
+        """创建后备图像（调用方可修改的副本）"""
+        return self._fallback_image().copy()
+
+
+class CameraManager:
+    """
+    相机管理器：按ID管理多路相机
 
+    各路相机有独立的采集线程与重连任务，互不阻塞；
+    请求未指定相机ID时使用配置中的第一路相机。
+    """
+    
+    def __init__(self, configs: Optional[List[CameraConfig]] = None, default_id: Optional[str] = None):
+        """
+        Args:
+            configs: 本进程持有的相机，None 表示全部配置的相机
+            default_id: 默认相机ID，None 表示 configs 中的第一路
+        """
+        if configs is None:
+            configs = camera_configs()
+        self.channels: Dict[str, CameraChannel] = {config.id: CameraChannel(config) for config in configs}
+        self.default_id = default_id or next(iter(self.channels), "")
+    
+    async def initialize(self) -> bool:
+        """并发打开全部相机，打开失败的相机在后台继续重连"""
+        if not settings.CAMERA_ENABLED:
+            logger.info("相机功能已禁用")
+            return True
+        
+        results = await asyncio.gather(*(channel.open() for channel in self.channels.values()))
+        for channel, success in zip(self.channels.values(), results):
+            if not success:
+                logger.error(f"相机[{channel.id}]初始化失败，后台重连")
+                channel.state = STATE_RECONNECTING
+            channel.start_supervisor()
+        
+        online = sum(results)
+        logger.info(f"相机初始化完成: {online}/{len(self.channels)}路在线")
+        return online > 0 or not self.channels
+    
+    def channel(self, camera_id: str = "") -> CameraChannel:
+        """按ID获取相机通道，空ID为默认相机"""
+        channel = self.channels.get(camera_id or self.default_id)
+        if channel is None:
+            raise UnknownCameraError(f"未知相机: {camera_id}")
+        return channel
+    
+    def frame(self, newer_than: Optional[float] = None, camera_id: str = ""):
+        """获取指定相机的一帧（异步上下文管理器，退出时释放缓冲区）"""
+        return self.channel(camera_id).frame(newer_than)
+    
+    def burst(self, count: int, newer_than: Optional[float] = None, camera_id: str = ""):
+        """指定相机连拍（异步上下文管理器，退出时统一释放）"""
+        return self.channel(camera_id).burst(count, newer_than)
+    
+    async def capture(self, camera_id: str = "") -> Optional[np.ndarray]:
+        """采集图像"""
+        return await self.channel(camera_id).capture()
+    
+    def health(self) -> Dict[str, str]:
+        """各路相机状态"""
+        return {camera_id: channel.state for camera_id, channel in self.channels.items()}
+    
+    def stats(self) -> Dict[str, float]:
+        """各路相机统计，键为 <相机ID>_<指标>"""
+        values: Dict[str, float] = {
+            "channels": len(self.channels),
+            "online": sum(channel.state == STATE_ONLINE for channel in self.channels.values()),
+        }
+        for camera_id, channel in self.channels.items():
+            prefix = re.sub(r"\W", "_", camera_id)
+            for key, value in channel.stats().items():
+                values[f"{prefix}_{key}"] = value
+        return values
+    
+    async def cleanup(self):
+        """清理资源"""
+        await asyncio.gather(*(channel.stop() for channel in self.channels.values()))
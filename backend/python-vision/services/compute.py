@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+计算执行器 - 将CPU密集的视觉处理移出asyncio事件循环
+
+支持线程池和进程池两种模式。进程池模式下图像通过共享内存传递给工作进程，
+不经过pickle序列化。
+"""
+
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class SharedFrameSpec:
+    """共享内存中图像的描述（可pickle）"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class SharedMemoryPool:
+    """按容量复用的共享内存段池，避免每次请求创建/销毁段"""
+
+    def __init__(self, max_free_per_size: int = 4):
+        self.max_free_per_size = max_free_per_size
+        self._free: Dict[int, List[shared_memory.SharedMemory]] = {}
+        self._all: Dict[str, shared_memory.SharedMemory] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, image: np.ndarray) -> SharedFrameSpec:
+        """复制图像到共享内存段"""
+        size = max(image.nbytes, 1)
+        with self._lock:
+            free = self._free.get(size)
+            shm = free.pop() if free else None
+        if shm is None:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            with self._lock:
+                self._all[shm.name] = shm
+
+        target = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+        np.copyto(target, image)
+        del target
+        return SharedFrameSpec(name=shm.name, shape=image.shape, dtype=image.dtype.str)
+
+    def release(self, spec: SharedFrameSpec):
+        """归还共享内存段"""
+        with self._lock:
+            shm = self._all.get(spec.name)
+            if shm is None:
+                return
+            free = self._free.setdefault(shm.size, [])
+            if len(free) < self.max_free_per_size:
+                free.append(shm)
+                return
+            del self._all[spec.name]
+        shm.close()
+        shm.unlink()
+
+    def close(self):
+        """销毁所有共享内存段"""
+        with self._lock:
+            segments = list(self._all.values())
+            self._all.clear()
+            self._free.clear()
+        for shm in segments:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _call_with_shared_frame(fn: Callable, spec: SharedFrameSpec, args: tuple, kwargs: dict) -> Any:
+    """工作进程入口：映射共享内存为图像后调用处理函数"""
+    shm = shared_memory.SharedMemory(name=spec.name)
+    image = np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=shm.buf)
+    try:
+        return fn(image, *args, **kwargs)
+    finally:
+        del image
+        shm.close()
+
+
+def _in_context(fn: Callable, *args, **kwargs) -> Callable[[], Any]:
+    """在调用方上下文中执行（run_in_executor 不像 asyncio.to_thread 那样复制上下文）"""
+    return partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class ComputeExecutor:
+    """
+    计算执行器
+
+    - run: 在计算池中执行任意函数
+    - run_image: 在计算池中执行以图像为第一个参数的函数，进程池模式下经共享内存传图
+    - run_local: 在本进程线程池中执行（解码等结果需留在本进程、或开销很小的处理）
+
+    线程池中执行时带上调用方的上下文变量（日志关联ID等）。
+    """
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None):
+        self.mode = (mode or settings.COMPUTE_EXECUTOR).lower()
+        self.workers = workers or settings.COMPUTE_WORKERS or os.cpu_count() or 1
+
+        self._shm_pool: Optional[SharedMemoryPool] = None
+        if self.mode == "process":
+            # spawn避免fork继承采集线程与gRPC内部状态
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._shm_pool = SharedMemoryPool()
+        else:
+            if self.mode != "thread":
+                logger.warning(f"未知的计算执行器模式: {self.mode}, 使用线程池")
+                self.mode = "thread"
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="compute"
+            )
+        self._local_executor = ThreadPoolExecutor(
+            max_workers=settings.LOCAL_WORKERS, thread_name_prefix="local"
+        )
+        logger.info(f"计算执行器已创建: 模式={self.mode}, 工作者={self.workers}")
+
+    @property
+    def is_process_pool(self) -> bool:
+        return self.mode == "process"
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在计算池中执行函数（进程池模式下fn及参数须可pickle）"""
+        loop = asyncio.get_running_loop()
+        if self._shm_pool is None:
+            return await loop.run_in_executor(self._executor, _in_context(fn, *args, **kwargs))
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def run_image(self, fn: Callable, image: np.ndarray, *args, **kwargs) -> Any:
+        """在计算池中执行 fn(image, *args, **kwargs)"""
+        loop = asyncio.get_running_loop()
+        if self._shm_pool is None:
+            return await loop.run_in_executor(self._executor, _in_context(fn, image, *args, **kwargs))
+
+        spec = self._shm_pool.acquire(image)
+        future = loop.run_in_executor(
+            self._executor, _call_with_shared_frame, fn, spec, args, kwargs
+        )
+        # 工作进程结束后才归还共享内存，调用方被取消时也不提前释放
+        future.add_done_callback(lambda _: self._shm_pool.release(spec))
+        return await asyncio.shield(future)
+
+    async def run_local(self, fn: Callable, *args, **kwargs) -> Any:
+        """在本进程线程池中执行（不经进程池，结果不跨进程传递）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._local_executor, _in_context(fn, *args, **kwargs))
+
+    def shutdown(self):
+        """关闭执行器"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._local_executor.shutdown(wait=True)
+        if self._shm_pool is not None:
+            self._shm_pool.close()
+        logger.info("计算执行器已关闭")
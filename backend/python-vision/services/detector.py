@@ -2,16 +2,37 @@
 # -*- coding: utf-8 -*-
 """
 疫苗检测器 - 基于YOLOv8
+
+推理后端可选：
+- ultralytics: PyTorch原生模型(.pt)
+- onnxruntime / openvino: 导出的ONNX模型（可为INT8量化模型），使用本模块的letterbox预处理与向量化NMS
 """
 
+import threading
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
+import cv2
 import numpy as np
 from loguru import logger
 
 from config import settings
+from services.batching import MicroBatcher
+
+# 推理后端
+BACKEND_ULTRALYTICS = "ultralytics"
+BACKEND_ONNXRUNTIME = "onnxruntime"
+BACKEND_OPENVINO = "openvino"
+
+# 候选框置信度下限（与ultralytics默认值一致，最终按 DETECTION_CONFIDENCE 过滤）
+CANDIDATE_CONFIDENCE = 0.25
+# NMS前最多保留的候选框数与每张图最多输出的检测数
+MAX_CANDIDATES = 3000
+MAX_DETECTIONS = 300
+# letterbox填充灰度值
+LETTERBOX_COLOR = 114
 
 
 @dataclass
@@ -35,28 +56,382 @@ class BoundingBox:
     class_name: str
 
 
+@dataclass(eq=False)
+class Detections:
+    """
+    数组存储的检测结果
+
+    坐标、置信度、类别各为一个连续数组；筛选为一次向量化操作，
+    只有按下标或迭代访问时才生成 BoundingBox。
+    """
+    boxes: np.ndarray  # (N, 4) int32: x1, y1, x2, y2
+    confidence: np.ndarray  # (N,) float32
+    class_id: np.ndarray  # (N,) int32
+    class_names: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, class_names: Sequence[str] = ()) -> "Detections":
+        """由后端输出的 (N, 6) 数组构造: x1, y1, x2, y2, conf, cls"""
+        return cls(
+            boxes=data[:, :4].astype(np.int32),
+            confidence=np.ascontiguousarray(data[:, 4], dtype=np.float32),
+            class_id=data[:, 5].astype(np.int32),
+            class_names=tuple(class_names),
+        )
+
+    @classmethod
+    def empty(cls, class_names: Sequence[str] = ()) -> "Detections":
+        return cls.from_array(np.empty((0, 6), dtype=np.float32), class_names)
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[BoundingBox, "Detections"]:
+        """整数下标返回 BoundingBox，切片或掩码返回子集"""
+        if isinstance(index, (int, np.integer)):
+            x1, y1, x2, y2 = self.boxes[index].tolist()
+            class_id = int(self.class_id[index])
+            return BoundingBox(
+                x1=x1, y1=y1, x2=x2, y2=y2,
+                confidence=float(self.confidence[index]),
+                class_id=class_id,
+                class_name=self.class_name(class_id),
+            )
+        return Detections(self.boxes[index], self.confidence[index], self.class_id[index], self.class_names)
+
+    def __iter__(self) -> Iterator[BoundingBox]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def class_name(self, class_id: int) -> str:
+        return self.class_names[class_id] if 0 <= class_id < len(self.class_names) else "unknown"
+
+    def filter(self, min_confidence: float) -> "Detections":
+        """按置信度筛选"""
+        return self[self.confidence >= min_confidence]
+
+    def best(self) -> Optional[int]:
+        """最高置信度的下标，无结果返回None"""
+        return int(self.confidence.argmax()) if len(self) else None
+
+    def rois(self) -> List[Tuple[int, int, int, int]]:
+        """检测框坐标列表（供条码ROI使用）"""
+        return [tuple(box) for box in self.boxes.tolist()]
+
+
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    等比缩放并居中填充为 size x size
+
+    Returns:
+        (填充后图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    left, top = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(
+        image, (new_w, new_h), interpolation=cv2.INTER_LINEAR
+    )
+    return canvas, scale, (left, top)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    贪心非极大值抑制，每轮与剩余全部候选框一次性计算IoU
+
+    Args:
+        boxes: (N, 4) x1, y1, x2, y2
+        scores: (N,)
+
+    Returns:
+        保留框的下标（按分数降序）
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0 and len(keep) < MAX_DETECTIONS:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(output: np.ndarray, scale: float, pad: Tuple[int, int],
+                shape: Tuple[int, ...], iou_threshold: float) -> np.ndarray:
+    """
+    解析YOLOv8导出模型的单张输出
+
+    Args:
+        output: (4 + 类别数, 锚点数)，前4行为中心点xywh（letterbox坐标）
+        scale, pad: letterbox参数
+        shape: 原图尺寸
+
+    Returns:
+        (N, 6) float32: x1, y1, x2, y2, conf, cls（原图坐标）
+    """
+    if output.shape[0] > output.shape[1]:
+        output = output.T
+    scores = output[4:]
+    cls = scores.argmax(axis=0)
+    conf = scores[cls, np.arange(scores.shape[1])]
+
+    candidates = np.flatnonzero(conf >= CANDIDATE_CONFIDENCE)
+    if candidates.size == 0:
+        return np.empty((0, 6), dtype=np.float32)
+    if candidates.size > MAX_CANDIDATES:
+        candidates = candidates[np.argsort(conf[candidates])[::-1][:MAX_CANDIDATES]]
+
+    cx, cy, w, h = output[:4, candidates]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+    conf, cls = conf[candidates], cls[candidates]
+
+    # 按类别偏移坐标，一次NMS即实现分类别抑制
+    offsets = cls[:, None].astype(np.float32) * 7680.0
+    keep = nms(boxes + offsets, conf, iou_threshold)
+
+    boxes = boxes[keep]
+    boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+    boxes /= scale
+    h_img, w_img = shape[:2]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w_img)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h_img)
+    return np.column_stack((boxes, conf[keep], cls[keep])).astype(np.float32)
+
+
+class DetectorBackend(ABC):
+    """检测推理后端"""
+
+    name = ""
+
+    @abstractmethod
+    def infer_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """批量推理，每张图像返回 (N, 6) 数组: x1, y1, x2, y2, conf, cls（原图坐标）"""
+        pass
+
+    def close(self):
+        pass
+
+
+class UltralyticsBackend(DetectorBackend):
+    """ultralytics PyTorch后端"""
+
+    name = BACKEND_ULTRALYTICS
+
+    def __init__(self, model_path: Path):
+        from ultralytics import YOLO
+        self.model = YOLO(str(model_path))
+
+    def infer_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        outputs = []
+        for result in self.model(images, verbose=False, conf=CANDIDATE_CONFIDENCE,
+                                 iou=settings.DETECTOR_NMS_IOU):
+            boxes = result.boxes
+            outputs.append(np.column_stack((
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy(),
+                boxes.cls.cpu().numpy(),
+            )).astype(np.float32))
+        return outputs
+
+
+class ExportedModelBackend(DetectorBackend):
+    """导出模型后端的公共前后处理"""
+
+    def __init__(self, input_size: int, batch_size: Optional[int]):
+        self.input_size = input_size
+        # 静态batch的模型逐张（或按固定batch）执行
+        self.batch_size = batch_size
+
+    def infer_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        prepared = [letterbox(image, self.input_size) for image in images]
+        blob = cv2.dnn.blobFromImages([p[0] for p in prepared], 1.0 / 255, swapRB=True)
+
+        if self.batch_size and blob.shape[0] != self.batch_size:
+            step = self.batch_size
+            outputs = np.concatenate([
+                self._forward(self._pad_batch(blob[i:i + step], step))[:len(blob[i:i + step])]
+                for i in range(0, blob.shape[0], step)
+            ])
+        else:
+            outputs = self._forward(blob)
+
+        return [
+            postprocess(output, scale, pad, image.shape, settings.DETECTOR_NMS_IOU)
+            for output, (_, scale, pad), image in zip(outputs, prepared, images)
+        ]
+
+    @staticmethod
+    def _pad_batch(blob: np.ndarray, size: int) -> np.ndarray:
+        if blob.shape[0] == size:
+            return blob
+        padding = np.zeros((size - blob.shape[0],) + blob.shape[1:], dtype=blob.dtype)
+        return np.concatenate([blob, padding])
+
+    @abstractmethod
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        """执行前向推理，输入 (B, 3, H, W) float32，输出 (B, 4 + 类别数, 锚点数)"""
+        pass
+
+
+def _static_dim(value) -> Optional[int]:
+    """动态维度返回None"""
+    return value if isinstance(value, int) and value > 0 else None
+
+
+class OnnxRuntimeBackend(ExportedModelBackend):
+    """ONNX Runtime CPU后端"""
+
+    name = BACKEND_ONNXRUNTIME
+
+    def __init__(self, model_path: Path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.DETECTOR_THREADS > 0:
+            options.intra_op_num_threads = settings.DETECTOR_THREADS
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        super().__init__(
+            input_size=_static_dim(shape[2]) or settings.DETECTOR_INPUT_SIZE,
+            batch_size=_static_dim(shape[0]),
+        )
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOBackend(ExportedModelBackend):
+    """OpenVINO CPU后端（可直接读取ONNX或IR模型）"""
+
+    name = BACKEND_OPENVINO
+
+    def __init__(self, model_path: Path):
+        import openvino as ov
+
+        core = ov.Core()
+        model = core.read_model(str(model_path))
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if settings.DETECTOR_THREADS > 0:
+            config["INFERENCE_NUM_THREADS"] = settings.DETECTOR_THREADS
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        shape = model.input(0).get_partial_shape()
+        dims = [d.get_length() if d.is_static else None for d in shape]
+        super().__init__(
+            input_size=dims[2] or settings.DETECTOR_INPUT_SIZE,
+            batch_size=dims[0],
+        )
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        return self.compiled(blob)[self.output]
+
+
+BACKENDS = {
+    BACKEND_ULTRALYTICS: UltralyticsBackend,
+    BACKEND_ONNXRUNTIME: OnnxRuntimeBackend,
+    BACKEND_OPENVINO: OpenVINOBackend,
+}
+
+
+def model_path_for(backend: str, int8: bool = False) -> Path:
+    """按后端选择模型文件，INT8模型为同名加 _int8 后缀"""
+    if backend == BACKEND_ULTRALYTICS:
+        return settings.MODEL_PATH / settings.YOLO_MODEL
+    name = settings.DETECTOR_ONNX_MODEL
+    if backend == BACKEND_OPENVINO and settings.DETECTOR_OPENVINO_MODEL:
+        name = settings.DETECTOR_OPENVINO_MODEL
+    path = settings.MODEL_PATH / name
+    if int8:
+        path = path.with_name(f"{path.stem}_int8{path.suffix}")
+    return path
+
+
+def create_backend(backend: str, model_path: Optional[Path] = None, int8: bool = False) -> DetectorBackend:
+    """创建推理后端"""
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的检测后端: {backend}")
+    if int8 and backend == BACKEND_ULTRALYTICS:
+        logger.warning("ultralytics后端不支持INT8，使用原始模型")
+        int8 = False
+    model_path = model_path or model_path_for(backend, int8)
+    if not model_path.exists():
+        raise FileNotFoundError(f"模型文件不存在: {model_path}")
+    instance = BACKENDS[backend](model_path)
+    logger.info(f"检测后端已加载: {backend}, 模型={model_path}")
+    return instance
+
+
 class VaccineDetector:
     """疫苗检测器"""
     
     def __init__(self):
-        self.model = None
+        self.backend: Optional[DetectorBackend] = None
         self.class_names = ["vaccine", "syringe", "vial"]
+        # 模型推理非线程安全，计算线程池并发调用时串行化
+        self._infer_lock = threading.Lock()
+        self._batcher: Optional[MicroBatcher] = None
         self._load_model()
+        
+        if self.backend is not None and settings.DETECTOR_BATCH_ENABLED:
+            # 并发请求合并为一次批量前向推理
+            self._batcher = MicroBatcher(
+                self._infer_batch,
+                max_batch_size=settings.DETECTOR_MAX_BATCH,
+                max_wait_ms=settings.DETECTOR_MAX_WAIT_MS,
+                name="detector-batcher",
+            )
     
     def _load_model(self):
-        """加载YOLO模型"""
-        model_path = settings.MODEL_PATH / settings.YOLO_MODEL
+        """按配置加载推理后端"""
+        model_path = model_path_for(settings.DETECTOR_BACKEND, settings.DETECTOR_INT8)
         
         if not model_path.exists():
             logger.warning(f"模型文件不存在: {model_path}, 使用模拟模式")
             return
         
         try:
-            from ultralytics import YOLO
-            self.model = YOLO(str(model_path))
-            logger.info(f"YOLO模型加载成功: {model_path}")
+            self.backend = create_backend(settings.DETECTOR_BACKEND, model_path)
         except Exception as e:
-            logger.error(f"加载YOLO模型失败: {e}")
+            logger.error(f"加载检测模型失败: {settings.DETECTOR_BACKEND}, {e}")
+    
+    def _infer(self, image: np.ndarray) -> np.ndarray:
+        """单张推理，启用批处理时经批处理器合并执行"""
+        if self._batcher is not None:
+            return self._batcher(image)
+        return self._infer_batch([image])[0]
+    
+    def _infer_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """批量推理"""
+        with self._infer_lock:
+            return self.backend.infer_batch(images)
+    
+    def batch_stats(self) -> Dict[str, float]:
+        """批处理统计（批填充率、排队延迟）"""
+        if self._batcher is None:
+            return {}
+        return self._batcher.stats()
+    
+    def close(self):
+        """释放资源"""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        if self.backend is not None:
+            self.backend.close()
     
     def detect(self, image: np.ndarray) -> DetectionResult:
         """
@@ -68,39 +443,36 @@ class VaccineDetector:
         Returns:
             DetectionResult: 检测结果
         """
-        if self.model is None:
+        if self.backend is None:
             # 模拟模式
             return self._simulate_detection(image)
         
         try:
             # 执行检测
-            results = self.model(image, verbose=False)
+            detections = Detections.from_array(self._infer(image), self.class_names)
             
-            if len(results) == 0 or len(results[0].boxes) == 0:
+            best = detections.best()
+            if best is None:
                 return DetectionResult(detected=False, confidence=0.0)
             
             # 获取最高置信度的检测结果
-            boxes = results[0].boxes
-            best_idx = boxes.conf.argmax().item()
-            best_conf = boxes.conf[best_idx].item()
-            best_class = int(boxes.cls[best_idx].item())
-            best_box = boxes.xyxy[best_idx].cpu().numpy().astype(int)
+            box = detections[best]
             
-            if best_conf < settings.DETECTION_CONFIDENCE:
-                return DetectionResult(detected=False, confidence=best_conf)
+            if box.confidence < settings.DETECTION_CONFIDENCE:
+                return DetectionResult(detected=False, confidence=box.confidence)
             
             return DetectionResult(
                 detected=True,
-                confidence=best_conf,
-                bbox=tuple(best_box),
-                class_name=self.class_names[best_class] if best_class < len(self.class_names) else "unknown"
+                confidence=box.confidence,
+                bbox=(box.x1, box.y1, box.x2, box.y2),
+                class_name=box.class_name
             )
             
         except Exception as e:
             logger.error(f"检测失败: {e}")
             return DetectionResult(detected=False, confidence=0.0)
     
-    def detect_all(self, image: np.ndarray) -> List[BoundingBox]:
+    def detect_all(self, image: np.ndarray) -> Detections:
         """
         检测图像中所有目标
         
@@ -108,39 +480,18 @@ class VaccineDetector:
             image: BGR格式的图像
             
         Returns:
-            List[BoundingBox]: 所有检测结果
+            Detections: 置信度达到阈值的检测结果
         """
-        if self.model is None:
-            return []
+        if self.backend is None:
+            return Detections.empty(self.class_names)
         
         try:
-            results = self.model(image, verbose=False)
-            
-            if len(results) == 0:
-                return []
-            
-            detections = []
-            for box in results[0].boxes:
-                conf = box.conf.item()
-                if conf >= settings.DETECTION_CONFIDENCE:
-                    xyxy = box.xyxy[0].cpu().numpy().astype(int)
-                    class_id = int(box.cls.item())
-                    
-                    detections.append(BoundingBox(
-                        x1=xyxy[0],
-                        y1=xyxy[1],
-                        x2=xyxy[2],
-                        y2=xyxy[3],
-                        confidence=conf,
-                        class_id=class_id,
-                        class_name=self.class_names[class_id] if class_id < len(self.class_names) else "unknown"
-                    ))
-            
-            return detections
+            detections = Detections.from_array(self._infer(image), self.class_names)
+            return detections.filter(settings.DETECTION_CONFIDENCE)
             
         except Exception as e:
             logger.error(f"检测失败: {e}")
-            return []
+            return Detections.empty(self.class_names)
     
     def _simulate_detection(self, image: np.ndarray) -> DetectionResult:
         """模拟检测（用于没有模型时的测试）"""
@@ -157,32 +508,32 @@ class VaccineDetector:
             class_name="vaccine"
         )
     
-    def draw_detections(self, image: np.ndarray, detections: List[BoundingBox]) -> np.ndarray:
+    def draw_detections(self, image: np.ndarray, detections: Detections) -> np.ndarray:
         """
         在图像上绘制检测结果
         
         Args:
             image: 原始图像
-            detections: 检测结果列表
+            detections: 检测结果
             
         Returns:
             绘制后的图像
         """
-        import cv2
-        
         result = image.copy()
+        color = (0, 255, 0)  # 绿色
         
-        for det in detections:
+        # 一次性转为Python数值，避免逐框访问数组元素
+        for (x1, y1, x2, y2), conf, class_id in zip(
+            detections.boxes.tolist(), detections.confidence.tolist(), detections.class_id.tolist()
+        ):
             # 绘制边界框
-            color = (0, 255, 0)  # 绿色
-            cv2.rectangle(result, (det.x1, det.y1), (det.x2, det.y2), color, 2)
+            cv2.rectangle(result, (x1, y1), (x2, y2), color, 2)
             
             # 绘制标签
-            label = f"{det.class_name}: {det.confidence:.2f}"
+            label = f"{detections.class_name(class_id)}: {conf:.2f}"
             (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(result, (det.x1, det.y1 - 20), (det.x1 + w, det.y1), color, -1)
-            cv2.putText(result, label, (det.x1, det.y1 - 5), 
+            cv2.rectangle(result, (x1, y1 - 20), (x1 + w, y1), color, -1)
+            cv2.putText(result, label, (x1, y1 - 5), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
         
         return result
-
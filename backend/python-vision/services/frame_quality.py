@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧质量评估 - 在缩小的灰度图上估算对焦与曝光
+"""
+
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from config import settings
+from services.buffer_pool import buffer_pool
+
+
+@dataclass
+class FrameScore:
+    """帧质量评分"""
+    sharpness: float  # 拉普拉斯方差，越大越清晰
+    exposure: float  # 0~1，1表示亮度适中且无过曝/欠曝
+    score: float  # 综合评分
+
+
+def score_frame(image: np.ndarray) -> FrameScore:
+    """
+    评估单帧质量
+
+    Args:
+        image: BGR或灰度图像
+
+    Returns:
+        FrameScore: 质量评分
+    """
+    factor = max(1, settings.FRAME_SCORE_DOWNSAMPLE)
+    h, w = image.shape[:2]
+    size = (max(1, w // factor), max(1, h // factor))
+    with ExitStack() as stack:
+        # 先缩小再转灰度，开销与缩小后的像素数成正比；中间结果写入借出的缓冲区
+        small = stack.enter_context(buffer_pool.borrow((size[1], size[0]) + image.shape[2:]))
+        cv2.resize(image, size, dst=small, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            gray = stack.enter_context(buffer_pool.borrow((size[1], size[0])))
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=gray)
+
+        laplacian = stack.enter_context(buffer_pool.borrow(small.shape, np.float32))
+        sharpness = float(cv2.Laplacian(small, cv2.CV_32F, dst=laplacian).var())
+
+        mean = float(small.mean())
+        clipped = float(np.count_nonzero((small <= 5) | (small >= 250))) / small.size
+    exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0 - clipped)
+
+    return FrameScore(
+        sharpness=sharpness,
+        exposure=exposure,
+        score=sharpness * max(exposure, 0.05),
+    )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求图像接入 - 编码图像按需解码为彩色/灰度/缩小图，原始像素缓冲区零拷贝包装
+"""
+
+from typing import Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from protos import vision_pb2
+
+# 解码模式
+DECODE_COLOR = "color"  # BGR三通道（检测、OCR、存图）
+DECODE_GRAY = "gray"  # 单通道（仅条码）
+
+_IMREAD_FLAGS = {
+    (DECODE_COLOR, 1): cv2.IMREAD_COLOR,
+    (DECODE_COLOR, 2): cv2.IMREAD_REDUCED_COLOR_2,
+    (DECODE_COLOR, 4): cv2.IMREAD_REDUCED_COLOR_4,
+    (DECODE_COLOR, 8): cv2.IMREAD_REDUCED_COLOR_8,
+    (DECODE_GRAY, 1): cv2.IMREAD_GRAYSCALE,
+    (DECODE_GRAY, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (DECODE_GRAY, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (DECODE_GRAY, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# 像素格式 -> 通道数
+_CHANNELS = {
+    vision_pb2.GRAY8: 1,
+    vision_pb2.BGR8: 3,
+    vision_pb2.RGB8: 3,
+    vision_pb2.BGRA8: 4,
+}
+
+# (像素格式, 解码模式) -> 颜色转换，None 表示直接使用
+_CONVERSIONS = {
+    (vision_pb2.GRAY8, DECODE_GRAY): None,
+    (vision_pb2.GRAY8, DECODE_COLOR): cv2.COLOR_GRAY2BGR,
+    (vision_pb2.BGR8, DECODE_GRAY): cv2.COLOR_BGR2GRAY,
+    (vision_pb2.BGR8, DECODE_COLOR): None,
+    (vision_pb2.RGB8, DECODE_GRAY): cv2.COLOR_RGB2GRAY,
+    (vision_pb2.RGB8, DECODE_COLOR): cv2.COLOR_RGB2BGR,
+    (vision_pb2.BGRA8, DECODE_GRAY): cv2.COLOR_BGRA2GRAY,
+    (vision_pb2.BGRA8, DECODE_COLOR): cv2.COLOR_BGRA2BGR,
+}
+
+
+def _normalize_reduction(reduction: int) -> int:
+    """缩小倍数只支持 1/2/4/8"""
+    for factor in (8, 4, 2):
+        if reduction >= factor:
+            return factor
+    return 1
+
+
+def decode_image(image_bytes: bytes, mode: str = DECODE_COLOR, reduction: int = 1) -> Optional[np.ndarray]:
+    """
+    解码JPEG/PNG等编码图像
+
+    Args:
+        mode: DECODE_COLOR / DECODE_GRAY，灰度直接由解码器输出，省去颜色转换
+        reduction: 缩小倍数 (1/2/4/8)，JPEG在DCT阶段缩小，解码开销随之下降
+    """
+    try:
+        flag = _IMREAD_FLAGS[(mode, _normalize_reduction(reduction))]
+        return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    except Exception as e:
+        logger.error(f"图像解码失败: {e}")
+        return None
+
+
+def wrap_raw(raw: "vision_pb2.RawImage", mode: str = DECODE_COLOR, reduction: int = 1,
+             data: Optional[bytes] = None) -> Optional[np.ndarray]:
+    """
+    包装原始像素缓冲区
+
+    格式与模式一致且不缩小时直接以请求字节为底层缓冲区（只读视图，不复制），
+    行跨距(stride)大于行宽时同样零拷贝。
+
+    Args:
+        data: 已取出的 raw.data（protobuf每次访问bytes字段都会复制，调用方应只取一次）
+    """
+    if data is None:
+        data = raw.data
+    channels = _CHANNELS.get(raw.format)
+    if channels is None or raw.width <= 0 or raw.height <= 0:
+        logger.error(f"不支持的原始图像: 格式={raw.format}, 尺寸={raw.width}x{raw.height}")
+        return None
+
+    row_bytes = raw.width * channels
+    stride = raw.stride or row_bytes
+    if stride < row_bytes or len(data) < stride * (raw.height - 1) + row_bytes:
+        logger.error(f"原始图像数据长度不足: {len(data)}字节, 尺寸={raw.width}x{raw.height}, 跨距={stride}")
+        return None
+
+    shape = (raw.height, raw.width) if channels == 1 else (raw.height, raw.width, channels)
+    strides = (stride, 1) if channels == 1 else (stride, channels, 1)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=data, strides=strides)
+
+    conversion = _CONVERSIONS[(raw.format, mode)]
+    if conversion is not None:
+        image = cv2.cvtColor(image, conversion)
+
+    factor = _normalize_reduction(reduction)
+    if factor > 1:
+        image = cv2.resize(image, (raw.width // factor, raw.height // factor), interpolation=cv2.INTER_AREA)
+    return image
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像存储 - 后台有界队列写盘与过期清理
+"""
+
+import asyncio
+import shutil
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from config import settings
+from services.buffer_pool import buffer_pool
+
+# 背压策略
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DOWNSCALE = "downscale"
+
+
+@dataclass
+class _WriteJob:
+    image: np.ndarray
+    path: Path
+
+
+class ImageWriter:
+    """
+    后台图像写入器
+
+    submit/save 立即返回最终保存路径，JPEG编码和写盘在独立工作线程执行。
+    队列满时按背压策略处理：
+    - block: 等待队列空位（超时后丢弃）
+    - drop_oldest: 丢弃最早排队的图像
+    - downscale: 缩小图像以降低编码与写盘开销，仍满则丢弃最早的图像
+    """
+
+    def __init__(self, root: Optional[Path] = None, workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, policy: Optional[str] = None):
+        self.root = Path(root or settings.IMAGE_SAVE_PATH)
+        self.workers = workers or settings.IMAGE_WRITER_WORKERS
+        self.queue_size = max(1, queue_size or settings.IMAGE_WRITER_QUEUE_SIZE)
+        self.policy = (policy or settings.IMAGE_WRITER_POLICY).lower()
+        if self.policy not in (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DOWNSCALE):
+            logger.warning(f"未知的图像写入背压策略: {self.policy}, 使用 {POLICY_DROP_OLDEST}")
+            self.policy = POLICY_DROP_OLDEST
+
+        self._queue: Deque[_WriteJob] = deque()
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._encode_params = [cv2.IMWRITE_JPEG_QUALITY, settings.IMAGE_JPEG_QUALITY]
+
+        # 日期目录缓存，跨天时才创建目录
+        self._date_folder = ""
+        self._save_dir: Optional[Path] = None
+        self._dir_lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.downscaled = 0
+        self.errors = 0
+        self.swept = 0
+
+    def start(self):
+        """启动写入线程和过期清理线程"""
+        self._stop_event.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._write_loop, name=f"image-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        sweeper = threading.Thread(target=self._sweep_loop, name="image-sweeper", daemon=True)
+        sweeper.start()
+        self._threads.append(sweeper)
+        logger.info(f"图像写入器已启动: 线程={self.workers}, 队列={self.queue_size}, 策略={self.policy}")
+
+    def close(self, timeout: float = 5.0):
+        """停止写入器，尽量写完已排队的图像"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue and time.monotonic() < deadline:
+                self._cond.wait(0.1)
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+        logger.info(f"图像写入器已关闭: {self.stats()}")
+
+    def stats(self) -> Dict[str, int]:
+        """写入统计"""
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "queued": queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "downscaled": self.downscaled,
+            "errors": self.errors,
+            "swept": self.swept,
+        }
+
+    def submit(self, image: np.ndarray, identifier: str) -> Path:
+        """
+        提交图像（非阻塞），立即返回保存路径
+
+        block 策略在此方法中不等待，队列满时丢弃最早的图像；
+        需要阻塞背压时请在协程中使用 save。
+        """
+        path = self._next_path(identifier)
+        self._enqueue(image, path, wait=0.0)
+        return path
+
+    async def save(self, image: np.ndarray, identifier: str) -> Path:
+        """提交图像，block 策略下队列满时异步等待空位"""
+        path = self._next_path(identifier)
+        if self.policy == POLICY_BLOCK and self._is_full():
+            await asyncio.to_thread(self._enqueue, image, path, settings.IMAGE_WRITER_BLOCK_TIMEOUT)
+        else:
+            self._enqueue(image, path, wait=0.0)
+        return path
+
+    def _next_path(self, identifier: str) -> Path:
+        now = datetime.now()
+        date_folder = now.strftime("%Y%m%d")
+        if date_folder != self._date_folder:
+            with self._dir_lock:
+                if date_folder != self._date_folder:
+                    save_dir = self.root / date_folder
+                    save_dir.mkdir(parents=True, exist_ok=True)
+                    self._save_dir = save_dir
+                    self._date_folder = date_folder
+        return self._save_dir / f"{identifier}_{now.strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+
+    def _is_full(self) -> bool:
+        with self._cond:
+            return len(self._queue) >= self.queue_size
+
+    def _enqueue(self, image: np.ndarray, path: Path, wait: float):
+        # 相机帧缓冲区会被复用，排队前复制到借出的缓冲区，写盘或丢弃后归还
+        if self.policy == POLICY_DOWNSCALE and self._is_full():
+            h, w = image.shape[:2]
+            size = (max(1, w // 2), max(1, h // 2))
+            copy = buffer_pool.acquire((size[1], size[0]) + image.shape[2:], image.dtype)
+            cv2.resize(image, size, dst=copy, interpolation=cv2.INTER_AREA)
+            self.downscaled += 1
+        else:
+            copy = buffer_pool.acquire(image.shape, image.dtype)
+            np.copyto(copy, image)
+        image = copy
+
+        job = _WriteJob(image, path)
+        with self._cond:
+            if wait > 0:
+                deadline = time.monotonic() + wait
+                while len(self._queue) >= self.queue_size and not self._stop_event.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            if len(self._queue) >= self.queue_size:
+                dropped = self._queue.popleft()
+                buffer_pool.release(dropped.image)
+                self.dropped += 1
+                logger.warning("图像写入队列已满，丢弃", path=dropped.path)
+
+            self._queue.append(job)
+            self._cond.notify_all()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop_event.is_set():
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                self._cond.notify_all()
+
+            try:
+                self.write(job.image, job.path)
+                self.written += 1
+                logger.debug("图像已保存", path=job.path)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"保存图像失败: {job.path}, {e}")
+            finally:
+                buffer_pool.release(job.image)
+
+    def write(self, image: np.ndarray, path: Path):
+        """同步编码并写盘（写入线程调用）"""
+        ok, encoded = cv2.imencode(".jpg", image, self._encode_params)
+        if not ok:
+            raise RuntimeError("JPEG编码失败")
+        encoded.tofile(str(path))
+
+    def _sweep_loop(self):
+        interval = max(60.0, settings.IMAGE_RETENTION_SWEEP_HOURS * 3600)
+        while not self._stop_event.is_set():
+            self.sweep()
+            self._stop_event.wait(interval)
+
+    def sweep(self) -> int:
+        """删除超过保留天数的日期目录，返回删除数量"""
+        if settings.IMAGE_RETENTION_DAYS <= 0 or not self.root.exists():
+            return 0
+
+        cutoff = (datetime.now() - timedelta(days=settings.IMAGE_RETENTION_DAYS)).strftime("%Y%m%d")
+        removed = 0
+        for folder in self.root.iterdir():
+            name = folder.name
+            # 只处理 YYYYMMDD 格式的日期目录
+            if not folder.is_dir() or len(name) != 8 or not name.isdigit():
+                continue
+            if name < cutoff and name != self._date_folder:
+                try:
+                    shutil.rmtree(folder)
+                    removed += 1
+                except Exception as e:
+                    logger.error(f"清理过期图像失败: {folder}, {e}")
+
+        if removed:
+            self.swept += removed
+            logger.info(f"已清理过期图像目录: {removed}个 (保留{settings.IMAGE_RETENTION_DAYS}天)")
+        return removed
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志输出 - 非阻塞写入、结构化字段、请求关联ID与高频调试日志限流
+
+- 日志调用以关键字参数附带字段，如 logger.info("检测到条码", type=..., data=...)，
+  输出为 key=value（LOG_FORMAT=json 时每条记录为一行JSON）
+- 请求处理期间以 logger.contextualize(cid=...) 设置关联ID，随asyncio任务与计算线程传递
+- LOG_ASYNC 开启时sink只把记录放入内存队列，格式化与写盘在后台线程中批量完成；
+  队列满时丢弃 WARNING 以下的记录并计数
+- DEBUG 日志按调用位置限流，可再按比例采样；被抑制的条数附在该位置下一条输出的记录上
+"""
+
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+import zipfile
+from collections import deque
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, TextIO, Tuple
+
+from loguru import logger
+
+from config import settings
+
+# 限流只作用于低于 INFO 的记录，队列满时只丢弃低于 WARNING 的记录
+INFO_LEVEL = 20
+WARNING_LEVEL = 30
+
+_LEVEL_COLORS = {
+    "TRACE": "\x1b[36m", "DEBUG": "\x1b[34m", "INFO": "\x1b[1m", "SUCCESS": "\x1b[32m",
+    "WARNING": "\x1b[33m", "ERROR": "\x1b[31m", "CRITICAL": "\x1b[41m",
+}
+_RESET = "\x1b[0m"
+
+
+def _report_failure(message: str):
+    """日志系统自身的错误直接写入原始标准错误（不经loguru，避免递归）"""
+    try:
+        sys.__stderr__.write(f"[logging] {message}\n")
+        sys.__stderr__.flush()
+    except (AttributeError, OSError, ValueError):
+        # 无控制台（如 pythonw）或标准错误已关闭
+        pass
+
+
+def new_correlation_id() -> str:
+    """生成请求关联ID"""
+    return os.urandom(6).hex()
+
+
+def _exception_text(record: Dict[str, Any]) -> str:
+    exception = record["exception"]
+    if exception is None:
+        return ""
+    return "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+
+
+def format_text(record: Dict[str, Any], color: bool = False) -> str:
+    """文本格式：时间 | 级别 | 位置 | [关联ID] 消息 key=value ..."""
+    extra = record["extra"]
+    level = record["level"].name
+    if color:
+        level = f"{_LEVEL_COLORS.get(level, '')}{level: <8}{_RESET}"
+    else:
+        level = f"{level: <8}"
+    parts = [
+        record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], " | ", level, " | ",
+        f"{record['name']}:{record['function']}:{record['line']}", " | ",
+    ]
+    cid = extra.get("cid")
+    if cid:
+        parts.append(f"[{cid}] ")
+    parts.append(record["message"])
+    for key, value in extra.items():
+        if key != "cid":
+            parts.append(f" {key}={value}")
+    parts.append("\n")
+    exception = _exception_text(record)
+    if exception:
+        parts.append(exception)
+    return "".join(parts)
+
+
+def format_json(record: Dict[str, Any], color: bool = False) -> str:
+    """JSON格式：每条记录一行"""
+    data = {
+        "time": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    data.update(record["extra"])
+    exception = _exception_text(record)
+    if exception:
+        data["exception"] = exception
+    return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+
+FORMATTERS: Dict[str, Callable[..., str]] = {"text": format_text, "json": format_json}
+
+
+class DailyFile:
+    """按日期切分的日志文件：跨天时压缩前一天的文件并清理超过保留天数的文件"""
+
+    def __init__(self, directory: Path, prefix: str, suffix: str = "",
+                 retention_days: int = 30, compress: bool = True):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.suffix = suffix
+        self.retention_days = retention_days
+        self.compress = compress
+        self._day: Optional[date] = None
+        self._file: Optional[TextIO] = None
+        self.errors = 0  # 压缩、清理失败次数
+
+    @property
+    def name(self) -> str:
+        return str(self.path_for(self._day or date.today()))
+
+    def path_for(self, day: date) -> Path:
+        return self.directory / f"{self.prefix}_{day:%Y-%m-%d}{self.suffix}.log"
+
+    def write(self, text: str):
+        today = date.today()
+        if today != self._day:
+            self._rotate(today)
+        self._file.write(text)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self, today: date):
+        previous = self._day
+        self.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path_for(today), "a", encoding="utf-8")
+        self._day = today
+        if previous is not None:
+            if self.compress:
+                self._compress(self.path_for(previous))
+            self._sweep(today)
+
+    def _compress(self, path: Path):
+        if not path.exists():
+            return
+        try:
+            with zipfile.ZipFile(path.with_suffix(".log.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.write(path, path.name)
+            path.unlink()
+        except OSError as e:
+            self.errors += 1
+            _report_failure(f"日志压缩失败: {path}, {e}")
+
+    def _sweep(self, today: date):
+        cutoff = today - timedelta(days=self.retention_days)
+        for path in self.directory.glob(f"{self.prefix}_*{self.suffix}.log*"):
+            day_text = path.name[len(self.prefix) + 1:len(self.prefix) + 11]
+            try:
+                day = datetime.strptime(day_text, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if day < cutoff:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError as e:
+                    self.errors += 1
+                    _report_failure(f"过期日志删除失败: {path}, {e}")
+
+
+class LogSink:
+    """
+    loguru sink：按 LOG_FORMAT 格式化记录后写入各输出（标准错误、日志文件）
+
+    各输出共用一个loguru handler，每条记录只经过一次loguru的处理。
+    异步模式下 write 只把记录放入队列（deque追加，不加锁不阻塞），后台线程每
+    LOG_FLUSH_INTERVAL 秒、积累半个队列或出现警告及以上记录时批量格式化，每个输出一次写入并刷新。
+    """
+
+    def __init__(self, outputs: List[Tuple[Any, bool]], formatter: Callable[..., str],
+                 asynchronous: bool = True, queue_size: int = 10000,
+                 flush_interval: float = 0.2, name: str = "log-writer"):
+        self.outputs = outputs  # [(目标, 是否着色)]
+        self.formatter = formatter
+        self.asynchronous = asynchronous
+        self.queue_size = max(1, queue_size)
+        self.flush_interval = flush_interval
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0  # 写入失败的记录数（按输出计）
+        self.batches = 0
+
+        if asynchronous:
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def write(self, message):
+        record = message.record
+        if not self.asynchronous:
+            self._write([record])
+            return
+        if len(self._queue) >= self.queue_size and record["level"].no < WARNING_LEVEL:
+            self.dropped += 1
+            return
+        self._queue.append(record)
+        # 警告及以上立即写出，进程随后异常退出时也不丢失
+        if record["level"].no >= WARNING_LEVEL or len(self._queue) >= self.queue_size // 2:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        if not self._queue:
+            return
+        # 只取当前已排队的记录，持续写入时不会一直停留在本轮
+        self._write([self._queue.popleft() for _ in range(len(self._queue))])
+
+    def _write(self, records: List[Dict[str, Any]]):
+        texts: Dict[bool, str] = {}
+        for target, color in self.outputs:
+            text = texts.get(color)
+            if text is None:
+                text = texts[color] = "".join(self._format(record, color) for record in records)
+            try:
+                target.write(text)
+                target.flush()
+            except Exception as e:
+                self.failed += len(records)
+                _report_failure(f"日志写入失败: {getattr(target, 'name', target)}, {len(records)}条, {e}")
+        self.written += len(records)
+        self.batches += 1
+
+    def _format(self, record: Dict[str, Any], color: bool) -> str:
+        try:
+            return self.formatter(record, color)
+        except Exception as e:
+            return f"日志格式化失败: {record['message']!r}, {e}\n"
+
+    def stop(self):
+        """写出队列中剩余的记录（logger.remove 时由loguru调用）"""
+        if self._stopped:
+            return
+        self._stopped = True
+        if os.getpid() != self._pid:
+            # 派生的工作进程重新配置日志时，继承的sink没有写入线程，队列内容由父进程写出
+            return
+        if self._thread is not None:
+            self._wakeup.set()
+            self._thread.join(timeout=5)
+        for target, _ in self.outputs:
+            if isinstance(target, DailyFile):
+                target.close()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "file_errors": sum(target.errors for target, _ in self.outputs if isinstance(target, DailyFile)),
+            "queued": len(self._queue),
+            "avg_batch": self.written / self.batches if self.batches else 0.0,
+        }
+
+
+class DebugThrottle:
+    """loguru filter：DEBUG及以下的记录按调用位置限流（令牌桶）与采样"""
+
+    def __init__(self, rate: float, sample: float = 1.0):
+        self.rate = rate
+        self.sample = sample
+        # 调用位置 -> [令牌数, 上次补充时间, 被抑制条数]
+        self._buckets: Dict[Tuple[str, int], List[float]] = {}
+        # 事件循环、计算线程池与采集线程都会记录日志，令牌的读改写需互斥
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        if record["level"].no >= INFO_LEVEL:
+            return True
+        key = (record["name"], record["line"])
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.rate, now, 0]
+
+            if self.sample < 1.0 and random.random() >= self.sample:
+                return self._suppress(bucket)
+            if self.rate > 0:
+                bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                if bucket[0] < 1.0:
+                    return self._suppress(bucket)
+                bucket[0] -= 1.0
+
+            if bucket[2]:
+                record["extra"]["suppressed"] = int(bucket[2])
+                bucket[2] = 0
+        return True
+
+    def _suppress(self, bucket: List[float]) -> bool:
+        bucket[2] += 1
+        self.suppressed += 1
+        return False
+
+
+# 当前进程的sink，供指标导出
+_sink: Optional[LogSink] = None
+_throttle: Optional[DebugThrottle] = None
+
+
+def configure_logging(worker: Optional[int] = None):
+    """配置日志：标准错误与按日文件（多进程时每个工作进程写独立文件）"""
+    global _sink, _throttle
+    logger.remove()
+
+    formatter = FORMATTERS.get(settings.LOG_FORMAT.lower(), format_text)
+    suffix = "" if worker is None else f"_w{worker}"
+    _throttle = DebugThrottle(settings.LOG_DEBUG_RATE, settings.LOG_DEBUG_SAMPLE)
+    _sink = LogSink(
+        [
+            (sys.stderr, formatter is format_text and sys.stderr.isatty()),
+            (DailyFile(settings.LOG_PATH, "vision", suffix, settings.LOG_RETENTION_DAYS), False),
+        ],
+        formatter,
+        asynchronous=settings.LOG_ASYNC,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        flush_interval=settings.LOG_FLUSH_INTERVAL,
+    )
+    # 格式化在sink中完成，loguru只生成记录
+    logger.add(_sink, level=settings.LOG_LEVEL, format="{message}", filter=_throttle,
+               colorize=False, backtrace=False, diagnose=False)
+
+
+def log_stats() -> Dict[str, float]:
+    """日志队列与限流统计"""
+    values: Dict[str, float] = {} if _sink is None else _sink.stats()
+    if _throttle is not None:
+        values["debug_suppressed"] = _throttle.suppressed
+    return values
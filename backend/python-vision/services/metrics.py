@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标 - 分阶段延迟直方图、计数器与Prometheus文本端点
+
+直方图使用固定分桶，记录一次观测只需一次二分查找和少量加法，可常驻生产环境。
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+# 延迟分桶上界（毫秒）
+LATENCY_BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """固定分桶直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def percentile(self, q: float) -> float:
+        """按分桶线性插值估算分位数"""
+        counts, _, total = self.snapshot()
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """可增减的瞬时值"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, namespace: str = "vision"):
+        self.namespace = namespace
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, Counter]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, Gauge]] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, store: Dict, factory: Callable, name: str, help: str, labels: Dict[str, str]):
+        key = _label_key(labels)
+        family = store.get(name)
+        if family is not None:
+            metric = family.get(key)
+            if metric is not None:
+                return metric
+        with self._lock:
+            family = store.setdefault(name, {})
+            if help:
+                self._help.setdefault(name, help)
+            return family.setdefault(key, factory())
+
+    def histogram(self, name: str, help: str = "", **labels) -> Histogram:
+        return self._get(self._histograms, Histogram, name, help, labels)
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get(self._counters, Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get(self._gauges, Gauge, name, help, labels)
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        """注册按需采集的指标（队列深度、缓存命中率等），导出为 <prefix>_<key>"""
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    @contextmanager
+    def track(self, name: str, **labels) -> Iterator[None]:
+        """记录代码块耗时(毫秒)并维护并发数"""
+        histogram = self.histogram(f"{name}_latency_ms", **labels)
+        inflight = self.gauge(f"{name}_inflight", **labels)
+        inflight.inc()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe((time.perf_counter() - start) * 1000)
+            inflight.dec()
+
+    def collected(self) -> Dict[str, float]:
+        """执行所有采集回调"""
+        values = {}
+        for prefix, collect in list(self._collectors.items()):
+            try:
+                for key, value in collect().items():
+                    if isinstance(value, (int, float)):
+                        values[f"{prefix}_{key}"] = float(value)
+            except Exception as e:
+                logger.debug(f"指标采集失败: {prefix}, {e}")
+        return values
+
+    def histogram_items(self) -> Iterator[Tuple[str, LabelKey, Histogram]]:
+        for name, family in list(self._histograms.items()):
+            for key, histogram in list(family.items()):
+                yield name, key, histogram
+
+    def scalar_items(self) -> Iterator[Tuple[str, LabelKey, float, str]]:
+        """计数器与瞬时值: (名称, 标签, 值, 类型)"""
+        for name, family in list(self._counters.items()):
+            for key, counter in list(family.items()):
+                yield name, key, counter.value, "counter"
+        for name, family in list(self._gauges.items()):
+            for key, gauge in list(family.items()):
+                yield name, key, gauge.value, "gauge"
+        for name, value in self.collected().items():
+            yield name, (), value, "gauge"
+
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        lines = []
+        typed = set()
+
+        def header(name: str, kind: str):
+            if name in typed:
+                return
+            typed.add(name)
+            help_text = self._help.get(name)
+            full = f"{self.namespace}_{name}"
+            if help_text:
+                lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+
+        for name, key, histogram in self.histogram_items():
+            header(name, "histogram")
+            full = f"{self.namespace}_{name}"
+            counts, total_sum, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, counts):
+                cumulative += count
+                labels = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{full}_bucket{labels} {cumulative}")
+            labels = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{full}_bucket{labels} {total}")
+            lines.append(f"{full}_sum{_format_labels(key)} {total_sum}")
+            lines.append(f"{full}_count{_format_labels(key)} {total}")
+
+        for name, key, value, kind in self.scalar_items():
+            header(name, kind)
+            lines.append(f"{self.namespace}_{name}{_format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """本地HTTP指标端点 (/metrics)"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        logger.info(f"指标端点启动于 http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
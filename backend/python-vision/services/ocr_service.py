@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR服务 - 基于PaddleOCR识别疫苗标签文字
+
+- 模型在首次识别（或启动阶段显式调用 load）时加载，构造实例不加载模型；
+  SERVER_PRELOAD_MODELS 开启时在派生工作进程前加载，工作进程写时复制共享权重
+- 只识别检测框外扩后的标签区域，不对整帧做文字检测
+- 各区域的文本行裁剪后合并为一次识别调用；计算池中并发请求的文本行经微批处理器合并
+- 从文本行中解析疫苗编码、批号、有效期，并返回各步骤耗时
+- 模型目录不存在或 paddleocr 未安装时使用模拟模式
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from config import settings
+from services.batching import MicroBatcher
+
+BBox = Tuple[int, int, int, int]
+
+# 竖排文本行（高宽比超过该值）旋转后再识别
+VERTICAL_TEXT_RATIO = 1.5
+
+_LOT_PATTERN = re.compile(r"(?:批\s*号|LOT|BATCH)\s*(?:NO\.?)?\s*[:：]?\s*([A-Z0-9][A-Z0-9\-]{2,})", re.I)
+_EXPIRY_PATTERN = re.compile(
+    r"(?:有效期至|有效期|失效期|EXP(?:IRY)?)\s*[:：]?\s*(\d{4})\s*[.\-/年]\s*(\d{1,2})(?:\s*[.\-/月]\s*(\d{1,2}))?",
+    re.I,
+)
+# 编码数字部分中常见的误识别字符
+_DIGIT_FIXES = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8"})
+
+
+@dataclass
+class TextLine:
+    """识别出的文本行"""
+    text: str
+    confidence: float
+    bbox: BBox  # 原图坐标 x1, y1, x2, y2
+
+
+@dataclass
+class OCRResult:
+    """标签识别结果"""
+    vaccine_code: str = ""
+    lot_number: str = ""
+    expiry_date: str = ""  # YYYY-MM-DD，标签只有年月时为 YYYY-MM
+    confidence: float = 0.0  # 疫苗编码所在文本行的置信度
+    lines: List[TextLine] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)  # 各步骤耗时(毫秒)
+    simulated: bool = False
+
+
+def label_regions(shape: Tuple[int, ...], rois: Optional[Sequence[BBox]],
+                  padding: float) -> List[BBox]:
+    """检测框按比例外扩并裁剪到图像内，未给出检测框时为整幅图像"""
+    h, w = shape[:2]
+    if not rois:
+        return [(0, 0, w, h)]
+    regions = []
+    for x1, y1, x2, y2 in rois:
+        pad_x, pad_y = int((x2 - x1) * padding), int((y2 - y1) * padding)
+        region = (max(0, x1 - pad_x), max(0, y1 - pad_y), min(w, x2 + pad_x), min(h, y2 + pad_y))
+        if region[2] > region[0] and region[3] > region[1]:
+            regions.append(region)
+    return regions
+
+
+def crop_text_line(image: np.ndarray, quad: np.ndarray) -> Optional[np.ndarray]:
+    """按文本框四点透视校正为水平文本行图像"""
+    quad = quad.astype(np.float32)
+    width = int(max(np.linalg.norm(quad[0] - quad[1]), np.linalg.norm(quad[2] - quad[3])))
+    height = int(max(np.linalg.norm(quad[0] - quad[3]), np.linalg.norm(quad[1] - quad[2])))
+    if width < 2 or height < 2:
+        return None
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    line = cv2.warpPerspective(image, matrix, (width, height),
+                               flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    if height / width >= VERTICAL_TEXT_RATIO:
+        line = np.ascontiguousarray(np.rot90(line))
+    return line
+
+
+def parse_label(lines: Sequence[TextLine], code_pattern: "re.Pattern") -> OCRResult:
+    """从文本行（自上而下、从左到右）中解析疫苗编码、批号和有效期"""
+    result = OCRResult(lines=list(lines))
+    for line in lines:
+        text = line.text.upper().replace(" ", "")
+        if not result.lot_number:
+            match = _LOT_PATTERN.search(text)
+            if match:
+                result.lot_number = match.group(1)
+                # 批号所在行不再匹配疫苗编码
+                continue
+        if not result.expiry_date:
+            match = _EXPIRY_PATTERN.search(text)
+            if match:
+                year, month, day = match.groups()
+                result.expiry_date = f"{year}-{int(month):02d}" + (f"-{int(day):02d}" if day else "")
+                continue
+        if not result.vaccine_code:
+            match = code_pattern.search(text)
+            if match:
+                result.vaccine_code = _normalize_code(match)
+                result.confidence = line.confidence
+    return result
+
+
+def _normalize_code(match: "re.Match") -> str:
+    """编码模式含两个分组（字母前缀、数字部分）时，修正数字部分中的易混淆字符"""
+    if match.re.groups == 2:
+        return match.group(1) + match.group(2).translate(_DIGIT_FIXES)
+    return match.group(0)
+
+
+class PaddleBackend:
+    """PaddleOCR文字检测与识别（直接调用其检测器与识别器，跳过整图流水线）"""
+
+    def __init__(self, model_dir: Path):
+        from paddleocr import PaddleOCR
+
+        self.engine = PaddleOCR(
+            lang=settings.OCR_LANG,
+            use_angle_cls=False,
+            show_log=False,
+            det_model_dir=str(model_dir / "det"),
+            rec_model_dir=str(model_dir / "rec"),
+            cls_model_dir=str(model_dir / "cls"),
+            det_limit_side_len=settings.OCR_DET_MAX_SIDE,
+            rec_batch_num=settings.OCR_MAX_BATCH,
+            cpu_threads=settings.OCR_THREADS or 10,
+        )
+
+    def detect_lines(self, image: np.ndarray) -> List[np.ndarray]:
+        """文字检测，返回各文本框四点坐标 (4, 2)"""
+        boxes, _ = self.engine.text_detector(image)
+        return [] if boxes is None else list(boxes)
+
+    def recognize_lines(self, images: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """批量识别文本行"""
+        results, _ = self.engine.text_recognizer(images)
+        return [(text, float(score)) for text, score in results]
+
+
+class OCRService:
+    """标签文字识别服务"""
+
+    def __init__(self):
+        self.backend: Optional[PaddleBackend] = None
+        self.code_pattern = re.compile(settings.OCR_VACCINE_CODE_PATTERN)
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # 模型推理非线程安全，计算线程池并发调用时串行化
+        self._infer_lock = threading.Lock()
+        self._batcher: Optional[MicroBatcher] = None
+
+        self.calls = 0
+        self.regions = 0
+        self.text_lines = 0
+
+    @property
+    def simulated(self) -> bool:
+        return self._loaded and self.backend is None
+
+    def load(self):
+        """加载模型（重复调用无副作用）"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load_model()
+            if self.backend is not None:
+                # 并发请求的文本行合并为一次识别调用
+                self._batcher = MicroBatcher(
+                    self._recognize_batch,
+                    max_batch_size=settings.OCR_MAX_BATCH,
+                    max_wait_ms=settings.OCR_MAX_WAIT_MS,
+                    name="ocr-batcher",
+                )
+            self._loaded = True
+
+    def _load_model(self):
+        model_dir = settings.MODEL_PATH / settings.OCR_MODEL
+        if not (model_dir / "det").exists() or not (model_dir / "rec").exists():
+            logger.warning(f"OCR模型目录不存在: {model_dir}, 使用模拟模式")
+            return
+
+        start = time.perf_counter()
+        try:
+            self.backend = PaddleBackend(model_dir)
+        except Exception as e:
+            logger.error(f"加载OCR模型失败: {e}, 使用模拟模式")
+            return
+        logger.info(f"OCR模型已加载: {model_dir}, 耗时={(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _recognize_batch(self, images: List[np.ndarray]) -> List[Tuple[str, float]]:
+        with self._infer_lock:
+            return self.backend.recognize_lines(images)
+
+    def recognize(self, image: np.ndarray, rois: Optional[Sequence[BBox]] = None) -> OCRResult:
+        """
+        识别标签文字
+
+        Args:
+            image: BGR格式的图像
+            rois: 检测框，只在外扩后的框内识别；为空时识别整幅图像
+
+        Returns:
+            OCRResult: 疫苗编码、批号、有效期及各步骤耗时
+        """
+        self.load()
+        start = time.perf_counter()
+        if self.backend is None:
+            return self._simulate_recognition(start)
+
+        try:
+            result = self._recognize(image, rois)
+        except Exception as e:
+            logger.error(f"OCR识别失败: {e}")
+            result = OCRResult()
+        result.timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    def _recognize(self, image: np.ndarray, rois: Optional[Sequence[BBox]]) -> OCRResult:
+        timings: Dict[str, float] = {}
+        regions = label_regions(image.shape, rois, settings.OCR_ROI_PADDING)
+
+        # 逐区域检测文本框，裁剪出全部文本行
+        start = time.perf_counter()
+        crops: List[np.ndarray] = []
+        boxes: List[BBox] = []
+        for x1, y1, x2, y2 in regions:
+            region = image[y1:y2, x1:x2]
+            with self._infer_lock:
+                quads = self.backend.detect_lines(region)
+            for quad in quads:
+                line = crop_text_line(region, quad)
+                if line is None:
+                    continue
+                crops.append(line)
+                qx1, qy1 = quad.min(axis=0)
+                qx2, qy2 = quad.max(axis=0)
+                boxes.append((x1 + int(qx1), y1 + int(qy1), x1 + int(qx2), y1 + int(qy2)))
+        timings["detect_ms"] = (time.perf_counter() - start) * 1000
+
+        # 全部文本行一次提交，由批处理器合并识别
+        start = time.perf_counter()
+        futures = [self._batcher.submit(crop) for crop in crops]
+        recognized = [future.result() for future in futures]
+        timings["recognize_ms"] = (time.perf_counter() - start) * 1000
+
+        lines = [
+            TextLine(text=text, confidence=score, bbox=bbox)
+            for (text, score), bbox in zip(recognized, boxes)
+            if text and score >= settings.OCR_MIN_CONFIDENCE
+        ]
+        lines.sort(key=lambda line: (line.bbox[1], line.bbox[0]))
+
+        start = time.perf_counter()
+        result = parse_label(lines, self.code_pattern)
+        timings["parse_ms"] = (time.perf_counter() - start) * 1000
+        result.timings = timings
+
+        self.calls += 1
+        self.regions += len(regions)
+        self.text_lines += len(crops)
+        return result
+
+    def _simulate_recognition(self, start: float) -> OCRResult:
+        """模拟识别（用于没有模型时的测试）：不识别出任何字段"""
+        return OCRResult(simulated=True, timings={"total_ms": (time.perf_counter() - start) * 1000})
+
+    def stats(self) -> Dict[str, float]:
+        """识别调用与批处理统计"""
+        values = {
+            "calls": self.calls,
+            "regions_per_call": self.regions / self.calls if self.calls else 0.0,
+            "lines_per_call": self.text_lines / self.calls if self.calls else 0.0,
+        }
+        if self._batcher is not None:
+            values.update({f"batch_{key}": value for key, value in self._batcher.stats().items()})
+        return values
+
+    def close(self):
+        """释放资源"""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求处理上下文 - 按需获取图像并执行/缓存各处理阶段
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import numpy as np
+
+from services.compute import ComputeExecutor
+from services.metrics import metrics
+from services.result_cache import ResultCache
+from services.scene_gate import SceneDecision
+
+
+# 客户端上传图像的来源名
+SOURCE_REQUEST = "request"
+
+
+class ImageUnavailableError(Exception):
+    """无法获取图像"""
+    pass
+
+
+class StageContext:
+    """
+    单次请求的阶段执行上下文
+
+    - 相机帧直接持有图像
+    - 请求携带的图像延迟解码：所需阶段全部命中缓存时不解码
+    """
+
+    def __init__(self, compute: ComputeExecutor,
+                 image: Optional[np.ndarray] = None,
+                 decoder: Optional[Callable[[], Awaitable[Optional[np.ndarray]]]] = None,
+                 cache: Optional[ResultCache] = None,
+                 cache_key: Optional[str] = None,
+                 source: str = "",
+                 scene: Optional[SceneDecision] = None,
+                 release: Optional[Callable[[], None]] = None):
+        self.compute = compute
+        self.source = source  # 图像来源：相机ID，客户端图像为 SOURCE_REQUEST
+        self.scene = scene  # 相机帧的场景判定（未启用场景判定时为None）
+        self._image = image
+        self._release = release  # 释放相机帧缓冲区
+        self._decoder = decoder
+        self._decoding: Optional[asyncio.Future] = None
+        self.cache = cache if cache_key else None
+        self.cache_key = cache_key
+        self.reused_stages = 0
+        self.computed_stages = 0
+
+    @property
+    def image_loaded(self) -> bool:
+        return self._image is not None
+
+    @property
+    def reused(self) -> bool:
+        """本次请求的阶段结果全部取自缓存"""
+        return self.reused_stages > 0 and self.computed_stages == 0
+
+    def cache_age(self) -> float:
+        """复用结果距其计算时的秒数，未复用为0"""
+        if not self.reused:
+            return 0.0
+        return self.cache.age(self.cache_key) or 0.0
+
+    def release_image(self):
+        """提前释放相机帧（后续阶段改用新帧时），之后不能再获取图像"""
+        if self._release is not None:
+            self._release()
+            self._release = None
+        self._image = None
+        self._decoder = None
+
+    async def image(self) -> np.ndarray:
+        """获取图像（必要时解码）"""
+        if self._image is None and self._decoder is not None:
+            # 并发阶段共享同一次解码
+            if self._decoding is None:
+                self._decoding = asyncio.ensure_future(self._decode())
+            self._image = await asyncio.shield(self._decoding)
+        if self._image is None:
+            raise ImageUnavailableError("无法获取图像")
+        return self._image
+
+    async def _decode(self) -> Optional[np.ndarray]:
+        with metrics.track("stage", stage="decode"):
+            return await self._decoder()
+
+    def cached(self, stage: str) -> Tuple[bool, Any]:
+        """查询阶段缓存结果"""
+        if self.cache is None:
+            return False, None
+        return self.cache.get(self.cache_key, stage)
+
+    def store(self, stage: str, value: Any):
+        """保存阶段结果"""
+        if self.cache is not None:
+            self.cache.put(self.cache_key, stage, value)
+
+    async def run(self, stage: str, fn: Callable, *args, variant: str = "") -> Any:
+        """
+        在计算池中执行 fn(image, *args)，结果按阶段名缓存
+
+        Args:
+            variant: 同一阶段的不同执行方式（如条码整帧/检测框内扫描），参与缓存键，不影响指标标签
+        """
+        name = f"{stage}:{variant}" if variant else stage
+        hit, value = self.cached(name)
+        if hit:
+            self.reused_stages += 1
+            return value
+        self.computed_stages += 1
+        image = await self.image()
+        with metrics.track("stage", stage=stage):
+            value = await self.compute.run_image(fn, image, *args)
+        self.store(name, value)
+        return value
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+识别结果缓存 - 按图像内容哈希缓存各阶段结果
+
+网关或控制端超时重试时会携带相同的图像字节，命中缓存可跳过解码、检测、
+条码和OCR。
+"""
+
+import dataclasses
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+
+def _sizeof(value: Any, depth: int = 0) -> int:
+    """粗略估算对象占用内存（字节）"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    size = sys.getsizeof(value)
+    if depth > 3:
+        return size
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        size += sum(_sizeof(v, depth + 1) for v in vars(value).values())
+    elif isinstance(value, dict):
+        size += sum(_sizeof(k, depth + 1) + _sizeof(v, depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_sizeof(v, depth + 1) for v in value)
+    return size
+
+
+@dataclass
+class _Entry:
+    stages: Dict[str, Any] = field(default_factory=dict)
+    size: int = 0
+    created_at: float = 0.0
+    expires_at: float = 0.0
+
+
+class ResultCache:
+    """
+    LRU + TTL 结果缓存
+
+    每个图像键下按阶段名保存结果，总内存超过上限或条目数超限时淘汰最久未用的条目。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        self.max_entries = max_entries or settings.RESULT_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or settings.RESULT_CACHE_MAX_BYTES
+        self.ttl = settings.RESULT_CACHE_TTL if ttl is None else ttl
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 影响结果的配置参与键计算，配置或模型变更后旧结果自然失效
+        self._settings_tag = (
+            f"{settings.DETECTION_CONFIDENCE}|{settings.YOLO_MODEL}|{settings.OCR_MODEL}"
+        ).encode()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, image_bytes: bytes, extra: str = "") -> str:
+        """按图像字节与相关配置计算缓存键，extra 用于区分像素格式、解码缩小倍数等"""
+        digest = hashlib.blake2b(image_bytes, digest_size=16)
+        digest.update(self._settings_tag)
+        if extra:
+            digest.update(extra.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str, stage: str) -> Tuple[bool, Any]:
+        """
+        查询阶段结果
+
+        Returns:
+            (是否命中, 结果)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+            if entry is None or stage not in entry.stages:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.stages[stage]
+
+    def age(self, key: str) -> Optional[float]:
+        """条目自首个阶段结果写入以来的秒数，不存在返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else time.monotonic() - entry.created_at
+
+    def put(self, key: str, stage: str, value: Any):
+        """保存阶段结果"""
+        size = _sizeof(value) + len(stage)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                now = time.monotonic()
+                entry = _Entry(created_at=now, expires_at=now + self.ttl)
+                self._entries[key] = entry
+            else:
+                self._entries.move_to_end(key)
+                if stage in entry.stages:
+                    previous = _sizeof(entry.stages[stage]) + len(stage)
+                    entry.size -= previous
+                    self._bytes -= previous
+            entry.stages[stage] = value
+            entry.size += size
+            self._bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+场景变化判定 - 相机画面静止时复用上一次处理的结果
+
+控制端轮询识别/扫码而药瓶静置不动时，连续帧几乎相同。每帧缩小为极小的灰度签名，
+与该相机当前场景的参考帧比较：差异低于阈值则沿用该场景的缓存键，检测、条码、OCR
+结果直接从结果缓存取得；超过阈值或场景持续时间超过上限时开始新场景。
+
+与参考帧（而非上一帧）比较，缓慢的累积变化最终也会触发重新处理。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+import cv2
+import numpy as np
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class SceneDecision:
+    """一帧的判定结果"""
+    key: str  # 结果缓存键（同一静止场景的帧共用）
+    static: bool  # 与参考帧相比无明显变化
+    change: float  # 与参考帧的平均灰度差 (0-255)，新相机为0
+    since: float  # 场景参考帧时间 (time.monotonic)
+
+
+@dataclass
+class _Scene:
+    signature: np.ndarray
+    key: str
+    since: float
+
+
+class SceneGate:
+    """按相机维护场景参考帧（线程安全）"""
+
+    def __init__(self):
+        self._scenes: Dict[str, _Scene] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.static_frames = 0
+        self.changed_frames = 0
+
+    @staticmethod
+    def signature(image: np.ndarray) -> np.ndarray:
+        """缩小到 SCENE_SIGNATURE_WIDTH 宽的灰度图（先缩小再转灰度，开销与原图尺寸基本无关）"""
+        h, w = image.shape[:2]
+        width = min(w, settings.SCENE_SIGNATURE_WIDTH)
+        height = max(1, round(h * width / w))
+        small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, camera_id: str, image: np.ndarray) -> SceneDecision:
+        """判定该帧是否属于当前静止场景，否则以该帧为参考开始新场景"""
+        signature = self.signature(image)
+        now = time.monotonic()
+        change = 0.0
+        with self._lock:
+            scene = self._scenes.get(camera_id)
+            if scene is not None and scene.signature.shape == signature.shape:
+                diff = cv2.absdiff(signature, scene.signature)
+                change = float(diff.mean())
+                changed = np.count_nonzero(diff > settings.SCENE_PIXEL_THRESHOLD) / diff.size
+                if (change <= settings.SCENE_CHANGE_THRESHOLD
+                        and changed <= settings.SCENE_MAX_CHANGED_FRACTION
+                        and now - scene.since <= settings.SCENE_MAX_AGE):
+                    self.static_frames += 1
+                    return SceneDecision(scene.key, True, change, scene.since)
+
+            self._generation += 1
+            scene = _Scene(signature, f"scene:{camera_id}:{self._generation}", now)
+            self._scenes[camera_id] = scene
+            self.changed_frames += 1
+            return SceneDecision(scene.key, False, change, now)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.static_frames + self.changed_frames
+            return {
+                "static_frames": self.static_frames,
+                "changed_frames": self.changed_frames,
+                "static_rate": self.static_frames / total if total else 0.0,
+            }
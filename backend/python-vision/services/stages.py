@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视觉处理阶段
+
+模块级函数，供计算执行器在线程池或进程池中调用。
+检测器与OCR服务按进程懒加载为单例，进程池的每个工作进程各持有一份。
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from services import barcode
+from services.barcode import BarcodeHit, BBox
+from services.detector import DetectionResult, Detections, VaccineDetector
+
+if TYPE_CHECKING:
+    from services.ocr_service import OCRResult, OCRService
+
+# 条码扫描方式：整帧扫描与检测框内扫描的结果不同，分别缓存
+SCAN_FULL = "full"
+SCAN_ROI = "roi"
+
+_detector: Optional[VaccineDetector] = None
+_ocr_service: Optional["OCRService"] = None
+_lock = threading.Lock()
+
+
+def get_detector() -> VaccineDetector:
+    """获取本进程的检测器实例"""
+    global _detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                _detector = VaccineDetector()
+    return _detector
+
+
+def get_ocr_service() -> "OCRService":
+    """获取本进程的OCR服务实例（模型在首次识别或调用 load 时加载）"""
+    global _ocr_service
+    if _ocr_service is None:
+        with _lock:
+            if _ocr_service is None:
+                from services.ocr_service import OCRService
+                _ocr_service = OCRService()
+    return _ocr_service
+
+
+def detector_stats() -> Dict[str, float]:
+    """本进程检测器的批处理统计（未加载时为空）"""
+    if _detector is None:
+        return {}
+    return _detector.batch_stats()
+
+
+def ocr_stats() -> Dict[str, float]:
+    """本进程OCR服务的识别与合批统计（未创建时为空）"""
+    if _ocr_service is None:
+        return {}
+    return _ocr_service.stats()
+
+
+def detect(image: np.ndarray) -> DetectionResult:
+    """检测最高置信度的疫苗"""
+    return get_detector().detect(image)
+
+
+def detect_all(image: np.ndarray) -> Detections:
+    """检测所有目标"""
+    return get_detector().detect_all(image)
+
+
+def recognize_text(image: np.ndarray, rois: Optional[Sequence[BBox]] = None) -> "OCRResult":
+    """OCR识别，只识别检测框内的标签区域"""
+    return get_ocr_service().recognize(image, rois)
+
+
+def scan_barcode(image: np.ndarray, rois: Optional[Sequence[BBox]] = None,
+                 source: str = "") -> Optional[str]:
+    """扫描条码/二维码，优先在检测框ROI内解码"""
+    return barcode.scan_barcode(image, rois, source)
+
+
+def scan_all_barcodes(image: np.ndarray, rois: Optional[Sequence[BBox]] = None,
+                      source: str = "") -> List[BarcodeHit]:
+    """识别图像中的所有溯源码"""
+    return barcode.scan_all_barcodes(image, rois, source)
+
+
+def barcode_stats() -> Dict[str, float]:
+    """本进程条码预处理级联各变体的统计"""
+    return barcode.cascade.stats()
+
+
+def warmup(image: np.ndarray) -> Dict[str, float]:
+    """用合成帧执行一次各阶段，触发模型加载与推理预热，返回各阶段耗时(毫秒)"""
+    timings = {}
+    for name, fn in (("detect", detect),
+                     ("barcode", lambda frame: scan_barcode(frame, source=barcode.WARMUP_SOURCE)),
+                     ("ocr", recognize_text)):
+        start = time.perf_counter()
+        try:
+            fn(image)
+        except Exception as e:
+            logger.warning(f"预热失败: {name}, {e}")
+        timings[name] = (time.perf_counter() - start) * 1000
+    return timings
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动管理 - 后台并行加载重型依赖与模型、预热推理并维护就绪状态
+
+gRPC服务先行监听，健康检查在模型预热完成前报告 NOT_SERVING。
+"""
+
+import asyncio
+import importlib
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from grpc_health.v1 import health, health_pb2
+from loguru import logger
+
+from config import settings
+from services import stages
+from services.camera_service import CameraManager, create_test_image
+from services.compute import ComputeExecutor
+from services.trace_index import TraceCodeIndex
+
+# 健康检查服务名
+VISION_SERVICE_NAME = "vision.VisionService"
+
+
+@dataclass
+class PhaseTiming:
+    """启动阶段耗时"""
+    name: str
+    duration_ms: float = 0.0
+    status: str = "pending"  # pending / running / ok / failed
+    error: str = ""
+
+
+class StartupManager:
+    """启动管理器"""
+
+    def __init__(self, compute: ComputeExecutor, camera_manager: CameraManager,
+                 health_servicer: Optional[health.aio.HealthServicer] = None,
+                 trace_index: Optional[TraceCodeIndex] = None):
+        self.compute = compute
+        self.camera_manager = camera_manager
+        self.trace_index = trace_index
+        self.health_servicer = health_servicer or health.aio.HealthServicer()
+        self.phases: Dict[str, PhaseTiming] = {}
+        self.ready = False
+        self.started_at = time.perf_counter()
+        self.total_ms = 0.0
+
+    async def initialize(self):
+        """标记为未就绪（服务启动监听前调用）"""
+        for service in ("", VISION_SERVICE_NAME):
+            await self.health_servicer.set(service, health_pb2.HealthCheckResponse.NOT_SERVING)
+
+    async def run(self):
+        """执行启动流程：导入依赖、相机初始化与溯源码索引加载并行，随后加载模型并预热"""
+        logger.info("开始后台启动流程")
+        phases = [
+            self._phase("imports", self._import_frameworks),
+            self._phase("camera", self._init_camera),
+        ]
+        if self.trace_index is not None:
+            phases.append(self._phase("trace_index", self.trace_index.start))
+        await asyncio.gather(*phases)
+        await self._phase("models", self._load_models)
+        await self._phase("warmup", self._warmup)
+
+        self.total_ms = (time.perf_counter() - self.started_at) * 1000
+        # 阶段失败时仍对外服务（模拟模式/懒加载兜底），但记录在就绪信息中
+        self.ready = True
+        for service in ("", VISION_SERVICE_NAME):
+            await self.health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+        summary = ", ".join(f"{p.name}={p.duration_ms:.0f}ms({p.status})" for p in self.phases.values())
+        logger.info(f"服务就绪: 总耗时={self.total_ms:.0f}ms, {summary}")
+
+    async def shutdown(self):
+        """进入关闭状态"""
+        self.ready = False
+        await self.health_servicer.enter_graceful_shutdown()
+
+    def phase_list(self) -> List[PhaseTiming]:
+        return list(self.phases.values())
+
+    async def _phase(self, name: str, fn: Callable[[], Awaitable[None]]):
+        phase = PhaseTiming(name=name, status="running")
+        self.phases[name] = phase
+        start = time.perf_counter()
+        try:
+            await fn()
+            phase.status = "ok"
+        except Exception as e:
+            phase.status = "failed"
+            phase.error = str(e)
+            logger.warning(f"启动阶段失败: {name}, {e}")
+        phase.duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"启动阶段完成: {name}, 耗时={phase.duration_ms:.0f}ms")
+
+    async def _import_frameworks(self):
+        """在后台线程中并行导入重型框架（未安装的跳过）"""
+        def try_import(module: str):
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                logger.debug(f"跳过导入: {module}, {e}")
+
+        await asyncio.gather(*(
+            asyncio.to_thread(try_import, module) for module in settings.STARTUP_PRELOAD_MODULES
+        ))
+
+    async def _init_camera(self):
+        if settings.CAMERA_ENABLED:
+            if not await self.camera_manager.initialize():
+                raise RuntimeError("相机初始化失败")
+
+    async def _load_models(self):
+        """并行加载检测与OCR模型"""
+        if self.compute.is_process_pool:
+            # 进程池模式下模型在各工作进程中加载，由预热阶段触发
+            return
+        await asyncio.gather(
+            asyncio.to_thread(stages.get_detector),
+            asyncio.to_thread(lambda: stages.get_ocr_service().load()),
+        )
+
+    async def _warmup(self):
+        """用合成帧预热推理（进程池模式下尽量覆盖每个工作进程）"""
+        frame = create_test_image(settings.CAMERA_WIDTH, settings.CAMERA_HEIGHT)
+        rounds = self.compute.workers if self.compute.is_process_pool else 1
+        for _ in range(max(1, settings.STARTUP_WARMUP_RUNS)):
+            await asyncio.gather(*(
+                self.compute.run_image(stages.warmup, frame) for _ in range(rounds)
+            ))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程服务 - 监督进程派生多个工作进程，以 SO_REUSEPORT 共同监听 GRPC_PORT
+
+单个asyncio进程受GIL限制，预处理与条码解码只能用满约一个核；
+多个工作进程由内核分发连接，各自持有检测/OCR模型实例。
+
+- 相机按配置顺序轮流分配给工作进程，每台物理相机只由一个进程打开；
+  其他进程收到需要该相机的请求时，经本机内部端口转发给持有进程
+- 工作进程异常退出后按指数退避重启；收到 SIGINT/SIGTERM 时通知全部工作进程优雅关闭，
+  超时未退出的强制结束
+- SERVER_PRELOAD_MODELS 开启时在派生前加载模型，工作进程以写时复制方式共享只读权重
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from config import settings
+from services.camera_service import CameraConfig, camera_configs
+
+
+@dataclass
+class WorkerInfo:
+    """工作进程的身份与相机分配（派生时传入）"""
+    index: int
+    cameras: List[CameraConfig] = field(default_factory=list)  # 本进程持有的相机
+    camera_routes: Dict[str, str] = field(default_factory=dict)  # 其他进程持有的相机ID -> 内部地址
+    default_camera: str = ""
+
+    @property
+    def internal_address(self) -> str:
+        return internal_address(self.index)
+
+
+def internal_address(index: int) -> str:
+    """工作进程的本机内部地址（相机请求转发用）"""
+    return f"127.0.0.1:{settings.GRPC_INTERNAL_PORT_BASE + index}"
+
+
+def reuseport_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def plan_workers(workers: int) -> List[WorkerInfo]:
+    """按配置顺序将相机轮流分配给工作进程"""
+    configs = camera_configs()
+    plans = [WorkerInfo(index=i) for i in range(workers)]
+    if not settings.CAMERA_ENABLED:
+        # 相机禁用时不打开相机、各通道只返回后备图像，每个进程持有全部通道，与单进程行为一致
+        for plan in plans:
+            plan.cameras = list(configs)
+            plan.default_camera = configs[0].id
+        return plans
+
+    owners: Dict[str, int] = {}
+    for position, config in enumerate(configs):
+        owner = position % workers
+        plans[owner].cameras.append(config)
+        owners[config.id] = owner
+
+    default_camera = configs[0].id if configs else settings.CAMERA_DEFAULT_ID
+    for plan in plans:
+        plan.default_camera = default_camera
+        plan.camera_routes = {
+            camera_id: internal_address(owner)
+            for camera_id, owner in owners.items() if owner != plan.index
+        }
+    return plans
+
+
+class WorkerSupervisor:
+    """工作进程监督器（在主进程中同步运行）"""
+
+    def __init__(self, workers: int, target: Callable[[WorkerInfo], None]):
+        self.plans = plan_workers(workers)
+        self.target = target
+        self._context = multiprocessing.get_context("fork")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._stopping = False
+        self.restarts = 0
+
+    def run(self) -> int:
+        """启动全部工作进程并监督，直到收到退出信号"""
+        if settings.SERVER_PRELOAD_MODELS:
+            self._preload_models()
+
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+
+        for plan in self.plans:
+            self._spawn(plan)
+        logger.info(f"监督进程已启动 {len(self.plans)} 个工作进程，共同监听端口 {settings.GRPC_PORT}")
+
+        while not self._stopping:
+            sentinels = [process.sentinel for process in self._processes.values()]
+            wait(sentinels, timeout=0.5)
+            self._reap()
+            self._restart_due()
+
+        return self._shutdown()
+
+    def _on_signal(self, signum, frame):
+        if not self._stopping:
+            logger.info(f"监督进程收到信号 {signal.Signals(signum).name}，开始关闭")
+        self._stopping = True
+
+    def _spawn(self, plan: WorkerInfo):
+        process = self._context.Process(
+            target=_worker_entry, args=(self.target, plan), name=f"vision-worker-{plan.index}"
+        )
+        process.start()
+        self._processes[plan.index] = process
+        self._started_at[plan.index] = time.monotonic()
+        cameras = ",".join(config.id for config in plan.cameras) or "无"
+        logger.info(f"工作进程 {plan.index} 已启动: pid={process.pid}, 相机={cameras}")
+
+    def _reap(self):
+        """回收异常退出的工作进程并安排重启"""
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive() or self._stopping:
+                continue
+            process.join()
+            del self._processes[index]
+
+            # 稳定运行一段时间后退避时间复位
+            uptime = now - self._started_at[index]
+            if uptime > settings.SERVER_RESTART_BACKOFF_MAX:
+                self._backoff[index] = settings.SERVER_RESTART_BACKOFF
+            delay = self._backoff.get(index, settings.SERVER_RESTART_BACKOFF)
+            self._backoff[index] = min(delay * 2, settings.SERVER_RESTART_BACKOFF_MAX)
+            self._restart_at[index] = now + delay
+            logger.error(
+                f"工作进程 {index} 异常退出: pid={process.pid}, 退出码={process.exitcode}, "
+                f"运行{uptime:.1f}秒，{delay:.1f}秒后重启"
+            )
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for index, restart_at in list(self._restart_at.items()):
+            if now >= restart_at:
+                del self._restart_at[index]
+                self.restarts += 1
+                self._spawn(self.plans[index])
+
+    def _shutdown(self) -> int:
+        """通知工作进程优雅关闭，超时后强制结束"""
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + settings.SERVER_SHUTDOWN_TIMEOUT
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+
+        exit_code = 0
+        for index, process in self._processes.items():
+            if process.is_alive():
+                logger.warning(f"工作进程 {index} 未在{settings.SERVER_SHUTDOWN_TIMEOUT:.0f}秒内退出，强制结束")
+                process.kill()
+                process.join()
+                exit_code = 1
+        logger.info(f"全部工作进程已退出: 累计重启{self.restarts}次")
+        return exit_code
+
+    @staticmethod
+    def _preload_models():
+        """派生前加载模型；冻结现有对象，避免GC写入引用计数页破坏写时复制共享"""
+        from services import stages
+
+        if settings.COMPUTE_EXECUTOR == "process":
+            logger.warning("计算执行器为进程池模式，模型在其工作进程中加载，预加载无效")
+            return
+        logger.info("派生工作进程前预加载模型")
+        stages.get_detector()
+        try:
+            stages.get_ocr_service().load()
+        except Exception as e:
+            logger.warning(f"OCR模型预加载失败，由工作进程各自加载: {e}")
+        gc.freeze()
+
+
+def _worker_entry(target: Callable[[WorkerInfo], None], plan: WorkerInfo):
+    # 终端 Ctrl+C 会发给整个进程组，由监督进程统一协调关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    target(plan)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+溯源码索引 - 在进程内缓存在库溯源码及其疫苗编码，请求路径上O(1)查询
+
+启动时从库存表批量加载在库(status=1)溯源码，之后按 updated_at 增量刷新：
+状态变为出库/报废的溯源码从索引移除。物理删除的记录由定期全量重载清除。
+
+溯源码前 TRACE_INDEX_PREFIX_LENGTH 位为药品标识码，同一标识码对应同一疫苗，
+不在库存中的溯源码可按前缀推断疫苗编码。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+# 库存状态：在库
+STATUS_IN_STOCK = 1
+
+_ROWS_SQL = """
+    SELECT i.trace_code, v.code, i.status, i.updated_at
+    FROM inventory i JOIN vaccines v ON v.id = i.vaccine_id
+    WHERE i.trace_code IS NOT NULL
+"""
+_WATERMARK_SQL = "SELECT MAX(updated_at) FROM inventory"
+
+
+class TraceCodeIndex:
+    """
+    在库溯源码索引
+
+    - 溯源码 -> 疫苗编号（疫苗编码去重后存为整数编号，节省内存）
+    - 药品标识码前缀 -> {疫苗编号: 溯源码数}，用于按前缀推断疫苗
+    刷新在线程中执行，字典的单次读写在GIL下是原子的，全量重载构建新字典后整体替换。
+    """
+
+    def __init__(self, engine: Optional[Engine] = None, url: Optional[str] = None):
+        self.engine = engine or create_engine(url or settings.DATABASE_URL, pool_pre_ping=True)
+        self.prefix_length = settings.TRACE_INDEX_PREFIX_LENGTH
+        self._codes: Dict[str, int] = {}
+        self._prefixes: Dict[str, Dict[int, int]] = {}
+        self._vaccines: List[str] = []
+        self._vaccine_ids: Dict[str, int] = {}
+        self._watermark: Any = None  # 已处理的最大 updated_at（保持数据库返回的原始类型）
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self.loads = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loads > 0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, trace_code: str) -> bool:
+        return trace_code in self._codes
+
+    def lookup(self, trace_code: str) -> Optional[str]:
+        """在库溯源码的疫苗编码，不在库返回None"""
+        vaccine_id = self._codes.get(trace_code)
+        return None if vaccine_id is None else self._vaccines[vaccine_id]
+
+    def product_vaccine(self, trace_code: str) -> Optional[str]:
+        """按药品标识码前缀推断疫苗编码（取该前缀下在库数量最多的疫苗）"""
+        counts = self._prefixes.get(trace_code[:self.prefix_length])
+        if not counts:
+            return None
+        # 复制后再遍历，刷新线程可能同时修改计数
+        vaccine_id, _ = max(list(counts.items()), key=lambda item: item[1])
+        return self._vaccines[vaccine_id]
+
+    def vaccine_for(self, trace_code: str) -> Optional[str]:
+        """疫苗编码：优先精确匹配，其次按前缀推断"""
+        return self.lookup(trace_code) or self.product_vaccine(trace_code)
+
+    def load(self) -> int:
+        """全量加载在库溯源码"""
+        start = time.perf_counter()
+        codes: Dict[str, int] = {}
+        prefixes: Dict[str, Dict[int, int]] = {}
+        vaccines: List[str] = list(self._vaccines)
+        vaccine_ids: Dict[str, int] = dict(self._vaccine_ids)
+
+        with self.engine.connect() as conn:
+            # 先取水位再加载，加载期间的更新在下次增量刷新中补上
+            watermark = conn.execute(text(_WATERMARK_SQL)).scalar()
+            result = conn.execution_options(yield_per=10000).execute(
+                text(_ROWS_SQL + " AND i.status = :status"), {"status": STATUS_IN_STOCK}
+            )
+            for trace_code, vaccine_code, _, _ in result:
+                vaccine_id = vaccine_ids.get(vaccine_code)
+                if vaccine_id is None:
+                    vaccine_id = vaccine_ids[vaccine_code] = len(vaccines)
+                    vaccines.append(vaccine_code)
+                codes[trace_code] = vaccine_id
+                counts = prefixes.setdefault(trace_code[:self.prefix_length], {})
+                counts[vaccine_id] = counts.get(vaccine_id, 0) + 1
+
+        self._vaccines, self._vaccine_ids = vaccines, vaccine_ids
+        self._codes, self._prefixes = codes, prefixes
+        self._watermark = watermark
+        self._loaded_at = self._refreshed_at = time.monotonic()
+        self.loads += 1
+        logger.info(
+            f"溯源码索引已加载: {len(codes)}条, {len(prefixes)}个药品标识码, "
+            f"耗时={(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return len(codes)
+
+    def refresh(self) -> int:
+        """增量刷新：应用 updated_at 不早于水位的变更，返回变更条数"""
+        if not self.loaded:
+            return self.load()
+
+        with self.engine.connect() as conn:
+            if self._watermark is None:
+                rows = conn.execute(text(_ROWS_SQL)).all()
+            else:
+                # 取等于水位的记录：同一时间戳可能有加载后才提交的更新，重复应用无副作用
+                rows = conn.execute(
+                    text(_ROWS_SQL + " AND i.updated_at >= :since"), {"since": self._watermark}
+                ).all()
+
+        changed = self._apply(rows)
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+        if changed:
+            logger.debug(f"溯源码索引增量刷新: {changed}条变更, 共{len(self._codes)}条")
+        return changed
+
+    def _apply(self, rows: Iterable[Tuple[str, str, int, Any]]) -> int:
+        changed = 0
+        for trace_code, vaccine_code, status, updated_at in rows:
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+
+            previous = self._codes.get(trace_code)
+            if status == STATUS_IN_STOCK:
+                vaccine_id = self._vaccine_id(vaccine_code)
+                if previous == vaccine_id:
+                    continue
+                if previous is not None:
+                    self._count_prefix(trace_code, previous, -1)
+                self._codes[trace_code] = vaccine_id
+                self._count_prefix(trace_code, vaccine_id, 1)
+            elif previous is not None:
+                del self._codes[trace_code]
+                self._count_prefix(trace_code, previous, -1)
+            else:
+                continue
+            changed += 1
+        return changed
+
+    def _vaccine_id(self, vaccine_code: str) -> int:
+        vaccine_id = self._vaccine_ids.get(vaccine_code)
+        if vaccine_id is None:
+            vaccine_id = self._vaccine_ids[vaccine_code] = len(self._vaccines)
+            self._vaccines.append(vaccine_code)
+        return vaccine_id
+
+    def _count_prefix(self, trace_code: str, vaccine_id: int, delta: int):
+        prefix = trace_code[:self.prefix_length]
+        counts = self._prefixes.setdefault(prefix, {})
+        count = counts.get(vaccine_id, 0) + delta
+        if count > 0:
+            counts[vaccine_id] = count
+        else:
+            counts.pop(vaccine_id, None)
+            if not counts:
+                del self._prefixes[prefix]
+
+    async def start(self):
+        """启动后台刷新并加载索引（首次加载失败时由刷新任务重试）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+        await asyncio.to_thread(self.load)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.engine.dispose()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(settings.TRACE_INDEX_REFRESH_INTERVAL)
+            try:
+                if time.monotonic() - self._loaded_at >= settings.TRACE_INDEX_FULL_RELOAD_INTERVAL:
+                    await asyncio.to_thread(self.load)
+                else:
+                    await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # 数据库不可用时继续使用已有索引
+                self.errors += 1
+                logger.warning(f"溯源码索引刷新失败: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """索引规模与刷新状态"""
+        return {
+            "codes": len(self._codes),
+            "prefixes": len(self._prefixes),
+            "vaccines": len(self._vaccines),
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "staleness_s": time.monotonic() - self._refreshed_at if self.loaded else -1.0,
+        }
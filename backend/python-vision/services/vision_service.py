@@ -4,73 +4,332 @@
 视觉识别服务实现
 """
 
+import asyncio
 import time
-from datetime import datetime
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
 
-import cv2
+import grpc
 import numpy as np
 from loguru import logger
-from pyzbar import pyzbar
 
 from config import settings
-from services.camera_service import CameraManager
-from services.detector import VaccineDetector
-from services.ocr_service import OCRService
+from protos import vision_pb2, vision_pb2_grpc
+from services import stages
+from services.buffer_pool import buffer_pool
+from services.camera_service import CameraManager, UnknownCameraError
+from services.compute import ComputeExecutor
+from services.frame_quality import score_frame
+from services.image_codec import DECODE_COLOR, DECODE_GRAY, decode_image, wrap_raw
+from services.image_store import ImageWriter
+from services.logs import log_stats, new_correlation_id
+from services.metrics import metrics
+from services.pipeline import SOURCE_REQUEST, ImageUnavailableError, StageContext
+from services.result_cache import ResultCache
+from services.scene_gate import SceneGate
+from services.startup import StartupManager
+from services.trace_index import TraceCodeIndex
+
+
+@dataclass
+class StreamState:
+    """流式调用的会话状态"""
+    processed: int = 0
+    last_frame_times: Dict[str, float] = field(default_factory=dict)  # 各相机上一请求所用帧的时间戳
+    frame_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
 
 
 class VisionServicer:
     """视觉识别gRPC服务实现"""
     
-    def __init__(self, camera_manager: CameraManager):
+    def __init__(self, camera_manager: CameraManager, compute: Optional[ComputeExecutor] = None,
+                 image_writer: Optional[ImageWriter] = None,
+                 startup: Optional[StartupManager] = None,
+                 camera_routes: Optional[Dict[str, str]] = None,
+                 trace_index: Optional[TraceCodeIndex] = None):
         self.camera_manager = camera_manager
-        self.detector = VaccineDetector()
-        self.ocr_service = OCRService()
+        self.startup = startup
+        # 多进程模式下由其他工作进程持有的相机: 相机ID -> 内部地址
+        self.camera_routes = camera_routes or {}
+        self._route_channels: Dict[str, grpc.aio.Channel] = {}
+        # 在库溯源码索引（未启用时为None）
+        self.trace_index = trace_index
+        # CPU密集阶段全部经计算执行器运行，不阻塞事件循环
+        self.compute = compute or ComputeExecutor()
+        # 图像在后台线程编码写盘
+        self.image_writer = image_writer
+        if self.image_writer is None and settings.IMAGE_SAVE_ENABLED:
+            self.image_writer = ImageWriter()
+            self.image_writer.start()
+        # 客户端图像的结果缓存
+        self.result_cache = ResultCache() if settings.RESULT_CACHE_ENABLED else None
+        # 相机画面静止时复用结果（依赖结果缓存）
+        self.scene_gate = (
+            SceneGate() if settings.SCENE_GATE_ENABLED and self.result_cache is not None else None
+        )
+        self._register_collectors()
         
     async def RecognizeVaccine(self, request, context):
         """识别疫苗"""
-        logger.info("收到疫苗识别请求")
+        return await self._handle_recognize(request, context=context)
+    
+    async def ScanBarcode(self, request, context):
+        """扫描条码"""
+        cid = self._correlation_id(request, context)
+        with logger.contextualize(cid=cid):
+            logger.info("收到条码扫描请求", camera=request.camera_id or "-")
         
-        try:
-            # 获取图像
-            if request.image:
-                # 使用请求中的图像
-                image = self._decode_image(request.image)
-            else:
-                # 从相机采集
-                image = await self.camera_manager.capture()
-            
-            if image is None:
-                return self._create_recognize_response(
+            try:
+                with metrics.track("rpc", method="ScanBarcode"):
+                    owner = self._camera_owner(request)
+                    if owner is not None:
+                        return await owner.ScanBarcode(request, metadata=self._forward_metadata(cid))
+                    # 只执行条码阶段：灰度（可缩小）解码
+                    async with self._open_context(
+                        request, mode=DECODE_GRAY, reduction=settings.BARCODE_DECODE_REDUCTION,
+                        reuse_scene=True
+                    ) as ctx:
+                        return self._with_cache_info(await self._scan(request, ctx), ctx)
+                
+            except UnknownCameraError as e:
+                logger.warning("请求的相机未配置", camera=request.camera_id)
+                return self._create_scan_response(success=False, message=str(e))
+            except Exception as e:
+                logger.exception("条码扫描失败", error=e)
+                return self._create_scan_response(
                     success=False,
-                    message="无法获取图像"
+                    message=f"扫描异常: {str(e)}"
                 )
+    
+    async def VerifyVaccine(self, request, context):
+        """验证疫苗"""
+        return await self._handle_verify(request, context=context)
+    
+    async def VerifyTray(self, request, context):
+        """托盘多瓶验证"""
+        cid = self._correlation_id(request, context)
+        with logger.contextualize(cid=cid):
+            logger.info("收到托盘验证请求", expected=len(request.expected_trace_codes))
+        
+            try:
+                with metrics.track("rpc", method="VerifyTray"):
+                    owner = self._camera_owner(request)
+                    if owner is not None:
+                        return await owner.VerifyTray(request, metadata=self._forward_metadata(cid))
+                    async with self._open_context(request) as ctx:
+                        return self._with_cache_info(await self._verify_tray(request, ctx), ctx)
+                
+            except UnknownCameraError as e:
+                logger.warning("请求的相机未配置", camera=request.camera_id)
+                return self._create_tray_response(all_matched=False, message=str(e))
+            except Exception as e:
+                logger.exception("托盘验证失败", error=e)
+                return self._create_tray_response(
+                    all_matched=False,
+                    message=f"验证异常: {str(e)}"
+                )
+    
+    async def GetReadiness(self, request, context):
+        """就绪状态与启动各阶段耗时"""
+        if self.startup is None:
+            return vision_pb2.ReadinessResponse(ready=True)
+        return vision_pb2.ReadinessResponse(
+            ready=self.startup.ready,
+            total_ms=self.startup.total_ms,
+            phases=[
+                vision_pb2.StartupPhase(
+                    name=phase.name,
+                    duration_ms=phase.duration_ms,
+                    status=phase.status,
+                    error=phase.error
+                )
+                for phase in self.startup.phase_list()
+            ]
+        )
+    
+    async def GetStats(self, request, context):
+        """运行指标"""
+        latencies = []
+        for name, labels, histogram in metrics.histogram_items():
+            _, total_sum, count = histogram.snapshot()
+            latencies.append(vision_pb2.LatencyStats(
+                name=name,
+                labels=",".join(f"{k}={v}" for k, v in labels),
+                count=count,
+                sum_ms=total_sum,
+                p50_ms=histogram.percentile(0.50),
+                p95_ms=histogram.percentile(0.95),
+                p99_ms=histogram.percentile(0.99)
+            ))
+        values = {}
+        for name, labels, value, _ in metrics.scalar_items():
+            if labels:
+                name += "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+            values[name] = value
+        return vision_pb2.StatsResponse(latencies=latencies, values=values)
+    
+    async def RecognizeStream(self, request_iterator, context):
+        """连续识别：按请求顺序流式返回结果"""
+        logger.info("识别流已建立")
+        stream = StreamState()
+        with metrics.track("stream", method="RecognizeStream"):
+            async for response in self._pipelined(
+                request_iterator, lambda request: self._handle_recognize(request, stream)
+            ):
+                yield response
+        logger.info(f"识别流已结束: 处理{stream.processed}条")
+    
+    async def VerifyStream(self, request_iterator, context):
+        """连续验证：按请求顺序流式返回结果"""
+        logger.info("验证流已建立")
+        stream = StreamState()
+        with metrics.track("stream", method="VerifyStream"):
+            async for response in self._pipelined(
+                request_iterator, lambda request: self._handle_verify(request, stream)
+            ):
+                yield response
+        logger.info(f"验证流已结束: 处理{stream.processed}条")
+    
+    async def _handle_recognize(self, request, stream: Optional["StreamState"] = None, context=None):
+        """处理单个识别请求"""
+        cid = self._correlation_id(request, context)
+        with logger.contextualize(cid=cid):
+            logger.info("收到疫苗识别请求", expected=request.expected_vaccine_code or "-")
+        
+            method = "RecognizeVaccine" if stream is None else "RecognizeStream"
+            try:
+                with metrics.track("rpc", method=method):
+                    owner = self._camera_owner(request)
+                    if owner is not None:
+                        response = await owner.RecognizeVaccine(request, metadata=self._forward_metadata(cid))
+                    else:
+                        async with self._open_context(request, stream, reuse_scene=True) as ctx:
+                            response = self._with_cache_info(await self._recognize(request, ctx), ctx)
             
-            # 检测疫苗
-            detection_result = self.detector.detect(image)
-            if not detection_result.detected:
-                return self._create_recognize_response(
+            except UnknownCameraError as e:
+                logger.warning("请求的相机未配置", camera=request.camera_id)
+                response = self._create_recognize_response(success=False, message=str(e))
+            except Exception as e:
+                logger.exception("疫苗识别失败", error=e)
+                response = self._create_recognize_response(
                     success=False,
-                    message="未检测到疫苗"
+                    message=f"识别异常: {str(e)}"
                 )
-            
-            # 扫描条码
-            trace_code = self._scan_barcode(image)
-            
-            # OCR识别
-            ocr_result = self.ocr_service.recognize(image)
-            
-            # 保存图像
-            image_path = self._save_image(image, trace_code or "unknown")
-            
-            # 与预期对比
+        
+            if stream is not None:
+                stream.processed += 1
+                response.request_id = request.request_id
+            return response
+    
+    async def _handle_verify(self, request, stream: Optional["StreamState"] = None, context=None):
+        """处理单个验证请求"""
+        cid = self._correlation_id(request, context)
+        with logger.contextualize(cid=cid):
+            logger.info("收到疫苗验证请求", expected=request.expected_trace_code)
+        
+            method = "VerifyVaccine" if stream is None else "VerifyStream"
+            try:
+                with metrics.track("rpc", method=method):
+                    owner = self._camera_owner(request)
+                    if owner is not None:
+                        response = await owner.VerifyVaccine(request, metadata=self._forward_metadata(cid))
+                    else:
+                        async with self._open_context(request, stream) as ctx:
+                            response = self._with_cache_info(await self._verify(request, ctx), ctx)
+                
+            except UnknownCameraError as e:
+                logger.warning("请求的相机未配置", camera=request.camera_id)
+                response = self._create_verify_response(matched=False, message=str(e))
+            except Exception as e:
+                logger.exception("疫苗验证失败", error=e)
+                response = self._create_verify_response(
+                    matched=False,
+                    message=f"验证异常: {str(e)}"
+                )
+        
+            if stream is not None:
+                stream.processed += 1
+                response.request_id = request.request_id
+            return response
+    
+    async def _pipelined(self, request_iterator, handler: Callable[[Any], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """
+        流水线处理请求流：边读边处理，按请求顺序返回
+        
+        同时处理的请求数不超过 STREAM_MAX_INFLIGHT
+        """
+        pending: "asyncio.Queue[Optional[asyncio.Task]]" = asyncio.Queue()
+        inflight = asyncio.Semaphore(max(1, settings.STREAM_MAX_INFLIGHT))
+        
+        async def feed():
+            try:
+                async for request in request_iterator:
+                    await inflight.acquire()
+                    pending.put_nowait(asyncio.create_task(handler(request)))
+            finally:
+                pending.put_nowait(None)
+        
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                try:
+                    response = await task
+                finally:
+                    inflight.release()
+                yield response
+            # 读取请求流出错时向调用方抛出
+            await feeder
+        finally:
+            feeder.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task is not None:
+                    task.cancel()
+    
+    async def _recognize(self, request, ctx: StageContext):
+        """识别流程"""
+        # 检测疫苗
+        try:
+            detection_result = await ctx.run("detect", stages.detect)
+        except ImageUnavailableError:
+            return self._create_recognize_response(
+                success=False,
+                message="无法获取图像"
+            )
+        
+        if not detection_result.detected:
+            return self._create_recognize_response(
+                success=False,
+                message="未检测到疫苗"
+            )
+        
+        # 条码与OCR相互独立，在计算池中并发执行
+        rois = [detection_result.bbox] if detection_result.bbox else None
+        barcode_task = asyncio.create_task(
+            ctx.run("barcode", stages.scan_barcode, rois, ctx.source,
+                    variant=stages.SCAN_ROI if rois else stages.SCAN_FULL)
+        )
+        ocr_task = asyncio.create_task(
+            ctx.run("ocr", stages.recognize_text, rois)
+        )
+        
+        try:
+            # 与预期对比：类型不匹配时无需等待条码结果
             if request.expected_vaccine_code:
+                ocr_result = await ocr_task
                 matched = self._match_vaccine_code(
                     ocr_result.vaccine_code,
                     request.expected_vaccine_code
                 )
                 if not matched:
+                    trace_code = self._task_result(barcode_task)
+                    barcode_task.cancel()
+                    image_path = await self._persist(ctx, trace_code or "unknown")
                     return self._create_recognize_response(
                         success=False,
                         message="疫苗类型不匹配",
@@ -78,174 +337,295 @@ class VisionServicer:
                         image_path=str(image_path)
                     )
             
-            return self._create_recognize_response(
-                success=True,
-                message="识别成功",
-                vaccine_code=ocr_result.vaccine_code,
-                trace_code=trace_code,
-                confidence=detection_result.confidence,
-                image_path=str(image_path)
-            )
-            
-        except Exception as e:
-            logger.exception(f"疫苗识别失败: {e}")
-            return self._create_recognize_response(
+            trace_code, ocr_result = await asyncio.gather(barcode_task, ocr_task)
+        finally:
+            for task in (barcode_task, ocr_task):
+                if not task.done():
+                    task.cancel()
+        
+        # 保存图像（后台执行，不阻塞响应）
+        image_path = await self._persist(ctx, trace_code or "unknown")
+        
+        # OCR未识别出疫苗编码时由溯源码索引补全
+        vaccine_code = ocr_result.vaccine_code
+        if not vaccine_code and trace_code and self.trace_index is not None:
+            vaccine_code = self.trace_index.vaccine_for(trace_code) or ""
+        
+        return self._create_recognize_response(
+            success=True,
+            message="识别成功",
+            vaccine_code=vaccine_code,
+            trace_code=trace_code,
+            confidence=detection_result.confidence,
+            image_path=str(image_path),
+            in_stock=self._in_stock(trace_code)
+        )
+    
+    async def _scan(self, request, ctx: StageContext):
+        """扫描流程"""
+        # 扫描条码
+        try:
+            barcode = await ctx.run("barcode", stages.scan_barcode, None, ctx.source,
+                                    variant=stages.SCAN_FULL)
+        except ImageUnavailableError:
+            return self._create_scan_response(
                 success=False,
-                message=f"识别异常: {str(e)}"
+                message="无法获取图像"
             )
-    
-    async def ScanBarcode(self, request, context):
-        """扫描条码"""
-        logger.info("收到条码扫描请求")
         
-        try:
-            # 获取图像
-            if request.image:
-                image = self._decode_image(request.image)
-            else:
-                image = await self.camera_manager.capture()
-            
-            if image is None:
-                return self._create_scan_response(
-                    success=False,
-                    message="无法获取图像"
-                )
-            
-            # 扫描条码
-            barcode = self._scan_barcode(image)
-            
-            if barcode:
-                return self._create_scan_response(
-                    success=True,
-                    message="扫描成功",
-                    barcode=barcode
-                )
-            else:
-                return self._create_scan_response(
-                    success=False,
-                    message="未检测到条码"
-                )
-                
-        except Exception as e:
-            logger.exception(f"条码扫描失败: {e}")
+        if barcode:
+            return self._create_scan_response(
+                success=True,
+                message="扫描成功",
+                barcode=barcode
+            )
+        else:
             return self._create_scan_response(
                 success=False,
-                message=f"扫描异常: {str(e)}"
+                message="未检测到条码"
             )
     
-    async def VerifyVaccine(self, request, context):
-        """验证疫苗"""
-        logger.info(f"收到疫苗验证请求: 预期溯源码={request.expected_trace_code}")
-        
+    async def _verify(self, request, ctx: StageContext):
+        """验证流程"""
         try:
-            # 获取图像
-            if request.image:
-                image = self._decode_image(request.image)
-            else:
-                image = await self.camera_manager.capture()
-            
-            if image is None:
-                return self._create_verify_response(
-                    matched=False,
-                    message="无法获取图像"
-                )
-            
-            # 多次尝试扫描条码
-            trace_code = None
-            for i in range(settings.BARCODE_RETRY):
-                trace_code = self._scan_barcode(image)
-                if trace_code:
-                    break
-                if i < settings.BARCODE_RETRY - 1:
-                    # 重新采集图像
-                    await self._wait(0.3)
-                    image = await self.camera_manager.capture()
-            
-            if not trace_code:
-                return self._create_verify_response(
-                    matched=False,
-                    message="无法识别溯源码"
-                )
-            
-            # 比对溯源码
-            matched = trace_code == request.expected_trace_code
-            
-            # 保存图像
-            image_path = self._save_image(image, trace_code)
-            
-            if matched:
-                logger.info(f"疫苗验证通过: {trace_code}")
-                return self._create_verify_response(
-                    matched=True,
-                    message="验证通过",
-                    actual_trace_code=trace_code,
-                    confidence=1.0,
-                    image_path=str(image_path)
-                )
-            else:
-                logger.warning(f"疫苗验证失败: 预期={request.expected_trace_code}, 实际={trace_code}")
-                return self._create_verify_response(
-                    matched=False,
-                    message="溯源码不匹配",
-                    actual_trace_code=trace_code,
-                    image_path=str(image_path)
-                )
-                
-        except Exception as e:
-            logger.exception(f"疫苗验证失败: {e}")
+            trace_code = await ctx.run("barcode", stages.scan_barcode, None, ctx.source,
+                                       variant=stages.SCAN_FULL)
+        except ImageUnavailableError:
             return self._create_verify_response(
                 matched=False,
-                message=f"验证异常: {str(e)}"
+                message="无法获取图像"
+            )
+        
+        # 首次失败后按帧到达连拍，优先解码质量最好的帧；
+        # 请求自带图像时不重试，相机画面与客户端图像不是同一药瓶
+        image_path = None
+        retries = settings.BARCODE_RETRY - 1 if ctx.source != SOURCE_REQUEST else 0
+        for _ in range(retries):
+            if trace_code:
+                break
+            # 连拍只用新帧，先释放上下文帧，把环形缓冲区槽位留给采集线程
+            ctx.release_image()
+            trace_code, image_path = await self._scan_burst(request.camera_id)
+            ctx.computed_stages += 1  # 连拍使用新帧，结果不再是复用的
+        
+        if not trace_code:
+            return self._create_verify_response(
+                matched=False,
+                message="无法识别溯源码"
+            )
+        
+        # 比对溯源码
+        matched = trace_code == request.expected_trace_code
+        
+        # 保存图像
+        if image_path is None:
+            image_path = await self._persist(ctx, trace_code)
+        
+        if matched:
+            logger.info("疫苗验证通过", trace_code=trace_code)
+            return self._create_verify_response(
+                matched=True,
+                message="验证通过",
+                actual_trace_code=trace_code,
+                confidence=1.0,
+                image_path=str(image_path),
+                in_stock=self._in_stock(trace_code)
+            )
+        else:
+            logger.warning("疫苗验证失败", expected=request.expected_trace_code, actual=trace_code)
+            return self._create_verify_response(
+                matched=False,
+                message="溯源码不匹配",
+                actual_trace_code=trace_code,
+                image_path=str(image_path),
+                in_stock=self._in_stock(trace_code)
             )
     
-    def _decode_image(self, image_bytes: bytes) -> Optional[np.ndarray]:
-        """解码图像"""
+    async def _verify_tray(self, request, ctx: StageContext):
+        """托盘验证流程：一次检测、逐ROI解码全部条码后与预期列表核对"""
+        
         try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            return image
-        except Exception as e:
-            logger.error(f"图像解码失败: {e}")
-            return None
+            boxes = await ctx.run("detect_all", stages.detect_all)
+        except ImageUnavailableError:
+            return self._create_tray_response(
+                all_matched=False,
+                message="无法获取图像"
+            )
+        
+        rois = boxes.rois()
+        hits = await ctx.run("barcodes", stages.scan_all_barcodes, rois, ctx.source)
+        found = {hit.code: hit for hit in hits}
+        expected = list(dict.fromkeys(request.expected_trace_codes))
+        
+        items = []
+        for code in expected:
+            hit = found.get(code)
+            if hit is None:
+                items.append(vision_pb2.TrayItem(trace_code=code, status=vision_pb2.MISSING))
+            else:
+                x1, y1, x2, y2 = hit.bbox
+                items.append(vision_pb2.TrayItem(
+                    trace_code=code, status=vision_pb2.MATCHED, x1=x1, y1=y1, x2=x2, y2=y2
+                ))
+        expected_set = set(expected)
+        for hit in hits:
+            if hit.code not in expected_set:
+                x1, y1, x2, y2 = hit.bbox
+                items.append(vision_pb2.TrayItem(
+                    trace_code=hit.code, status=vision_pb2.UNEXPECTED, x1=x1, y1=y1, x2=x2, y2=y2
+                ))
+        
+        matched_count = sum(1 for item in items if item.status == vision_pb2.MATCHED)
+        missing_count = len(expected) - matched_count
+        unexpected_count = len(items) - len(expected)
+        all_matched = missing_count == 0 and unexpected_count == 0
+        
+        image_path = await self._persist(ctx, "tray")
+        
+        if all_matched:
+            logger.info("托盘验证通过", matched=matched_count)
+            message = "验证通过"
+        else:
+            logger.warning("托盘验证失败", matched=matched_count, missing=missing_count, unexpected=unexpected_count)
+            message = "溯源码不一致"
+        
+        return self._create_tray_response(
+            all_matched=all_matched,
+            message=message,
+            items=items,
+            matched_count=matched_count,
+            missing_count=missing_count,
+            unexpected_count=unexpected_count,
+            image_path=str(image_path)
+        )
     
-    def _scan_barcode(self, image: np.ndarray) -> Optional[str]:
-        """扫描条码/二维码"""
-        try:
-            # 转为灰度图
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    async def _scan_burst(self, camera_id: str = "") -> Tuple[Optional[str], Optional[Path]]:
+        """
+        连拍一组新帧，按质量评分从高到低解码，找到溯源码即停止
+        
+        Args:
+            camera_id: 连拍使用的相机，为空时使用默认相机
+        
+        Returns:
+            (溯源码, 图像保存路径)
+        """
+        async with self.camera_manager.burst(settings.BARCODE_BURST_FRAMES, camera_id=camera_id) as frames:
+            frames = [f for f in frames if f.image is not None]
+            with metrics.track("stage", stage="frame_score"):
+                scores = await asyncio.gather(*(
+                    self.compute.run_local(score_frame, f.image) for f in frames
+                ))
+            ranked = sorted(zip(scores, frames), key=lambda item: item[0].score, reverse=True)
             
-            # 图像增强
-            gray = cv2.GaussianBlur(gray, (5, 5), 0)
-            gray = cv2.adaptiveThreshold(
-                gray, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY, 11, 2
+            for score, frame in ranked:
+                with metrics.track("stage", stage="burst_barcode"):
+                    trace_code = await self.compute.run_image(
+                        stages.scan_barcode, frame.image, None, camera_id or self.camera_manager.default_id
+                    )
+                if trace_code:
+                    logger.debug("连拍解码成功", sharpness=round(score.sharpness, 1), exposure=round(score.exposure, 2))
+                    # 帧缓冲区释放前提交保存（写入器会复制）
+                    return trace_code, await self._persist_image(frame.image, trace_code)
+        
+        return None, None
+    
+    @asynccontextmanager
+    async def _open_context(self, request, stream: Optional["StreamState"] = None,
+                            mode: str = DECODE_COLOR, reduction: int = 1,
+                            reuse_scene: bool = False) -> AsyncIterator[StageContext]:
+        """
+        创建处理上下文：优先使用请求中的图像，否则取请求指定相机(camera_id)的最新帧
+        
+        Args:
+            mode: 请求图像的解码模式，由该RPC实际执行的阶段决定
+            reduction: 请求图像的缩小倍数
+            reuse_scene: 相机画面静止时复用该场景的缓存结果；只用于识别/扫码轮询，
+                验证类请求须对当前帧重新解码（外观相同的药瓶被替换时画面几乎不变）
+        """
+        if request.HasField("raw_image"):
+            raw = request.raw_image
+            data = raw.data  # 每次访问都会复制，只取一次
+            cache_key = self.result_cache.key(
+                data, f"raw:{raw.width}x{raw.height}:{raw.stride}:{raw.format}:{reduction}"
+            ) if self.result_cache else None
+            decoder = lambda: self.compute.run_local(wrap_raw, raw, mode, reduction, data)
+        elif request.image:
+            # 客户端重试会携带相同图像，按内容哈希复用已有结果（灰度与彩色解码的阶段结果相同，可共用）
+            cache_key = self.result_cache.key(
+                request.image, f"reduce={reduction}" if reduction > 1 else ""
+            ) if self.result_cache else None
+            # OpenCV解码释放GIL，且结果需留在本进程，使用本地线程池
+            decoder = lambda: self.compute.run_local(decode_image, request.image, mode, reduction)
+        else:
+            decoder = None
+        
+        if decoder is not None:
+            yield StageContext(
+                self.compute,
+                decoder=decoder,
+                cache=self.result_cache,
+                cache_key=cache_key,
+                source=SOURCE_REQUEST,
             )
-            
-            # 解码条码
-            barcodes = pyzbar.decode(gray)
-            
-            for barcode in barcodes:
-                data = barcode.data.decode('utf-8')
-                barcode_type = barcode.type
-                logger.debug(f"检测到条码: 类型={barcode_type}, 数据={data}")
-                
-                # 验证溯源码格式 (20位数字)
-                if len(data) == 20 and data.isdigit():
-                    return data
-            
-            # 如果没找到，尝试原图
-            barcodes = pyzbar.decode(image)
-            for barcode in barcodes:
-                data = barcode.data.decode('utf-8')
-                if len(data) == 20 and data.isdigit():
-                    return data
-            
+            return
+        
+        camera_id = request.camera_id
+        async with AsyncExitStack() as stack:
+            if stream is None:
+                frame = await stack.enter_async_context(self.camera_manager.frame(camera_id=camera_id))
+            else:
+                # 同一流中发往同一相机的请求按顺序各取一帧新图像，避免流水线中重复处理同一帧
+                async with stream.frame_lock:
+                    frame = await stack.enter_async_context(self.camera_manager.frame(
+                        newer_than=stream.last_frame_times.get(camera_id), camera_id=camera_id
+                    ))
+                    stream.last_frame_times[camera_id] = frame.timestamp
+            source = camera_id or self.camera_manager.default_id
+            if self.scene_gate is None or not reuse_scene:
+                yield StageContext(self.compute, image=frame.image, source=source, release=frame.release)
+                return
+            # 画面相对场景参考帧无明显变化时沿用该场景的缓存键，各阶段直接取缓存结果
+            scene = await self.compute.run_local(self.scene_gate.check, source, frame.image)
+            yield StageContext(
+                self.compute,
+                image=frame.image,
+                cache=self.result_cache,
+                cache_key=scene.key,
+                source=source,
+                scene=scene,
+                release=frame.release,
+            )
+    
+    def _camera_owner(self, request) -> Optional[vision_pb2_grpc.VisionServiceStub]:
+        """
+        请求需从其他工作进程持有的相机取图时，返回该进程的存根（请求原样转发）
+        
+        请求自带图像或相机在本进程时返回None
+        """
+        if not self.camera_routes or request.image or request.HasField("raw_image"):
             return None
-            
-        except Exception as e:
-            logger.error(f"条码扫描失败: {e}")
+        address = self.camera_routes.get(request.camera_id or self.camera_manager.default_id)
+        if address is None:
             return None
+        channel = self._route_channels.get(address)
+        if channel is None:
+            channel = grpc.aio.insecure_channel(address, options=[
+                ('grpc.max_receive_message_length', 50 * 1024 * 1024),
+                ('grpc.max_send_message_length', 50 * 1024 * 1024),
+            ])
+            self._route_channels[address] = channel
+        metrics.counter("camera_forwarded_total", "转发到相机持有进程的请求数").inc()
+        return vision_pb2_grpc.VisionServiceStub(channel)
+    
+    async def close(self):
+        """关闭转发通道"""
+        for channel in self._route_channels.values():
+            await channel.close()
+        self._route_channels.clear()
+    
+    def _in_stock(self, trace_code: Optional[str]) -> bool:
+        """溯源码是否在库（未启用索引时为False）"""
+        return bool(trace_code) and self.trace_index is not None and trace_code in self.trace_index
     
     def _match_vaccine_code(self, detected: Optional[str], expected: str) -> bool:
         """匹配疫苗编码"""
@@ -253,46 +633,95 @@ class VisionServicer:
             return False
         return detected.strip().upper() == expected.strip().upper()
     
-    def _save_image(self, image: np.ndarray, identifier: str) -> Path:
-        """保存图像"""
-        if not settings.IMAGE_SAVE_ENABLED:
+    async def _persist_image(self, image: np.ndarray, identifier: str) -> Path:
+        """提交图像到后台写入器，立即返回保存路径"""
+        if not settings.IMAGE_SAVE_ENABLED or self.image_writer is None:
             return Path("")
         
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"{identifier}_{timestamp}.jpg"
-            date_folder = datetime.now().strftime("%Y%m%d")
-            
-            save_dir = settings.IMAGE_SAVE_PATH / date_folder
-            save_dir.mkdir(parents=True, exist_ok=True)
-            
-            save_path = save_dir / filename
-            cv2.imwrite(str(save_path), image)
-            
-            logger.debug(f"图像已保存: {save_path}")
-            return save_path
-            
+            return await self.image_writer.save(image, identifier)
         except Exception as e:
             logger.error(f"保存图像失败: {e}")
             return Path("")
     
-    async def _wait(self, seconds: float):
-        """等待"""
-        import asyncio
-        await asyncio.sleep(seconds)
+    async def _persist(self, ctx: StageContext, identifier: str) -> Path:
+        """保存上下文中的图像，同一图像只保存一次"""
+        hit, image_path = ctx.cached("image_path")
+        if hit:
+            return image_path
+        image = await ctx.image()
+        with metrics.track("stage", stage="persist"):
+            image_path = await self._persist_image(image, identifier)
+        ctx.store("image_path", image_path)
+        return image_path
+    
+    def _register_collectors(self):
+        """导出各组件自带的统计（队列深度、缓存命中率、丢帧等）"""
+        metrics.register_collector("camera", self.camera_manager.stats)
+        if self.compute.is_process_pool:
+            # 进程池模式下各阶段在子进程执行，本进程的检测器/OCR/条码单例没有统计，不导出
+            logger.info("计算执行器为进程池，不导出检测批处理、OCR、条码级联统计")
+        else:
+            metrics.register_collector("detector_batch", stages.detector_stats)
+            metrics.register_collector("ocr", stages.ocr_stats)
+            metrics.register_collector("barcode_cascade", stages.barcode_stats)
+        metrics.register_collector("buffer_pool", buffer_pool.stats)
+        metrics.register_collector("logging", log_stats)
+        if self.result_cache is not None:
+            metrics.register_collector("result_cache", self.result_cache.stats)
+        if self.scene_gate is not None:
+            metrics.register_collector("scene_gate", self.scene_gate.stats)
+        if self.image_writer is not None:
+            metrics.register_collector("image_writer", self.image_writer.stats)
+        if self.trace_index is not None:
+            metrics.register_collector("trace_index", self.trace_index.stats)
+    
+    @staticmethod
+    def _task_result(task: asyncio.Task):
+        """获取已完成任务的结果，未完成或失败返回None"""
+        if task.done() and not task.cancelled() and task.exception() is None:
+            return task.result()
+        return None
+    
+    @staticmethod
+    def _correlation_id(request, context=None) -> str:
+        """请求关联ID：请求中的 request_id，其次为调用方元数据 x-request-id，否则新生成"""
+        cid = getattr(request, "request_id", "")
+        if not cid and context is not None:
+            for key, value in context.invocation_metadata() or ():
+                if key == "x-request-id":
+                    cid = value
+                    break
+        return cid or new_correlation_id()
+    
+    @staticmethod
+    def _forward_metadata(cid: str):
+        """转发给其他工作进程时携带关联ID，两个进程的日志可以对应"""
+        return (("x-request-id", cid),)
+    
+    @staticmethod
+    def _with_cache_info(response, ctx: StageContext):
+        """在响应中注明结果是否复用自缓存"""
+        cache = response.cache
+        cache.reused = ctx.reused
+        cache.age_ms = ctx.cache_age() * 1000
+        if ctx.scene is not None:
+            cache.scene_static = ctx.scene.static
+            cache.scene_change = ctx.scene.change
+        return response
     
     def _create_recognize_response(self, **kwargs):
         """创建识别响应"""
-        from protos import vision_pb2
         return vision_pb2.RecognizeResponse(**kwargs)
     
     def _create_scan_response(self, **kwargs):
         """创建扫描响应"""
-        from protos import vision_pb2
         return vision_pb2.ScanResponse(**kwargs)
     
     def _create_verify_response(self, **kwargs):
         """创建验证响应"""
-        from protos import vision_pb2
         return vision_pb2.VerifyResponse(**kwargs)
-
+    
+    def _create_tray_response(self, **kwargs):
+        """创建托盘验证响应"""
+        return vision_pb2.TrayVerifyResponse(**kwargs)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+条码预处理级联统计测试
+"""
+
+import numpy as np
+import pytest
+
+try:
+    import pyzbar.pyzbar  # noqa: F401
+except ImportError as e:
+    # 未安装zbar动态库时pyzbar导入报ImportError（非ModuleNotFoundError）
+    pytest.skip(f"pyzbar不可用: {e}", allow_module_level=True)
+
+from services.barcode import WARMUP_SOURCE, BarcodeCascade
+
+
+def test_warmup_scans_are_not_recorded():
+    cascade = BarcodeCascade()
+    gray = np.zeros((32, 32), dtype=np.uint8)
+
+    assert cascade.run(gray, lambda image: None, WARMUP_SOURCE) is None
+    assert cascade.stats() == {"runs": 0, "decodes_per_run": 0.0, "first_hit_rate": 0.0}
+    assert cascade.order(WARMUP_SOURCE) == cascade.variants
+
+
+def test_camera_scans_are_recorded_per_source():
+    cascade = BarcodeCascade()
+    gray = np.zeros((32, 32), dtype=np.uint8)
+
+    assert cascade.run(gray, lambda image: "code", "dock1") == "code"
+    stats = cascade.stats()
+    assert stats["runs"] == 1 and stats["first_hit_rate"] == 1.0
+    assert stats[f"dock1_{cascade.variants[0]}_successes"] == 1
+    assert not any(key.startswith(WARMUP_SOURCE) for key in stats)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧环形缓冲区与相机通道取帧测试
+"""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+from services.camera_service import (
+    Camera, CameraChannel, CameraConfig, FrameGrabber, FrameRing,
+)
+
+SHAPE = (4, 6, 3)
+
+
+def write(ring: FrameRing, value: int, timestamp: float) -> int:
+    slot = ring.begin_write()
+    assert slot is not None
+    ring.buffer(slot)[:] = value
+    ring.commit(slot, timestamp)
+    return slot
+
+
+def test_latest_returns_newest_and_pins_slot():
+    ring = FrameRing(3, SHAPE)
+    assert ring.latest() is None
+
+    write(ring, 1, 10.0)
+    write(ring, 2, 11.0)
+    frame = ring.latest()
+    assert frame.seq == 2 and frame.timestamp == 11.0
+    assert int(frame.image[0, 0, 0]) == 2
+
+    # 被锁定的槽位与最新帧都不会被选为写入槽位
+    write(ring, 3, 12.0)
+    newest = ring.latest()
+    write(ring, 4, 13.0)
+    assert ring.begin_write() is None
+    assert ring.dropped == 1
+    frame.release()
+    newest.release()
+    assert ring.begin_write() is not None
+
+
+def test_wait_newer_returns_oldest_matching_frame():
+    ring = FrameRing(4, SHAPE)
+    write(ring, 1, 10.0)
+    write(ring, 2, 11.0)
+    write(ring, 3, 12.0)
+
+    with ring.wait_newer(10.5, timeout=0.1) as frame:
+        assert frame.timestamp == 11.0
+    assert ring.wait_newer(12.0, timeout=0.05) is None
+
+
+def test_wait_newer_wakes_on_commit():
+    ring = FrameRing(3, SHAPE)
+    write(ring, 1, 10.0)
+
+    timer = threading.Timer(0.05, write, args=(ring, 2, 20.0))
+    timer.start()
+    start = time.monotonic()
+    frame = ring.wait_newer(10.0, timeout=2.0)
+    timer.join()
+    assert frame is not None and frame.timestamp == 20.0
+    assert time.monotonic() - start < 1.0
+    frame.release()
+
+
+def test_reset_discards_frames():
+    ring = FrameRing(3, SHAPE)
+    write(ring, 1, 10.0)
+    pinned = ring.latest()
+    ring.reset()
+
+    assert ring.latest() is None
+    assert ring.wait_newer(0.0, timeout=0.01) is None
+    # 持有者仍可读取，释放后槽位可再写入
+    assert int(pinned.image[0, 0, 0]) == 1
+    pinned.release()
+    write(ring, 2, 11.0)
+    assert ring.latest().timestamp == 11.0
+
+
+class _IdleCamera(Camera):
+    async def open(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+    async def capture(self):
+        return np.full(SHAPE, 7, dtype=np.uint8)
+
+    @property
+    def is_opened(self) -> bool:
+        return True
+
+
+def test_default_grab_into_copies_capture():
+    out = np.zeros(SHAPE, dtype=np.uint8)
+    assert _IdleCamera().grab_into(out)
+    assert (out == 7).all()
+
+
+def test_acquire_frame_skips_stale_latest(monkeypatch):
+    monkeypatch.setattr(settings, "CAMERA_FRAME_TIMEOUT", 0.2)
+    ring = FrameRing(3, SHAPE)
+    channel = CameraChannel(CameraConfig(id="test"))
+    # 不启动采集线程，由测试写入帧
+    channel.grabber = FrameGrabber(_IdleCamera(), ring)
+
+    async def acquire():
+        return await channel.acquire_frame()
+
+    now = time.monotonic()
+    write(ring, 1, now)
+    with asyncio.run(acquire()) as frame:
+        assert frame.timestamp == now
+
+    # 最新帧已过期（采集停滞）：等待超时后返回None，而不是旧帧
+    ring.reset()
+    write(ring, 2, now - 1.0)
+    assert asyncio.run(acquire()) is None
+
+    timer = threading.Timer(0.05, lambda: write(ring, 3, time.monotonic()))
+    timer.start()
+    frame = asyncio.run(acquire())
+    timer.join()
+    assert frame is not None and int(frame.image[0, 0, 0]) == 3
+    frame.release()
+
+
+class _StreamingCamera(_IdleCamera):
+    supports_streaming = True
+
+    def grab_into(self, out: np.ndarray) -> bool:
+        time.sleep(0.005)
+        out[:] = 1
+        return True
+
+
+def test_bursts_on_one_channel_are_serialized():
+    ring = FrameRing(6, SHAPE)
+    channel = CameraChannel(CameraConfig(id="test"))
+    channel.grabber = FrameGrabber(_StreamingCamera(), ring)
+    channel.grabber.start()
+    events = []
+
+    async def burst(name: str):
+        async with channel.burst(3) as frames:
+            events.append((name, "start", len(frames)))
+            await asyncio.sleep(0.05)
+            events.append((name, "end", len(frames)))
+
+    async def main():
+        await asyncio.gather(burst("a"), burst("b"))
+
+    try:
+        asyncio.run(main())
+    finally:
+        channel.grabber.stop()
+    assert [event[:2] for event in events] == [("a", "start"), ("a", "end"), ("b", "start"), ("b", "end")]
+    assert all(count == 3 for *_, count in events)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志输出测试
+"""
+
+import io
+import threading
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from services.logs import DailyFile, DebugThrottle, LogSink
+
+
+class _BrokenOutput:
+    name = "broken"
+
+    def write(self, text):
+        raise OSError("磁盘已满")
+
+    def flush(self):
+        pass
+
+
+def _message(text: str, level: int = 20):
+    record = {"message": text, "level": SimpleNamespace(no=level, name="INFO")}
+    return SimpleNamespace(record=record)
+
+
+def test_sink_counts_failed_writes(capfd):
+    good = io.StringIO()
+    sink = LogSink([(good, False), (_BrokenOutput(), False)],
+                   lambda record, color: record["message"] + "\n", asynchronous=False)
+    sink.write(_message("a"))
+    sink.write(_message("b"))
+
+    assert good.getvalue() == "a\nb\n"
+    stats = sink.stats()
+    assert stats["written"] == 2
+    assert stats["failed"] == 2
+    assert "[logging] 日志写入失败: broken" in capfd.readouterr().err
+
+
+def test_daily_file_counts_maintenance_errors(tmp_path, monkeypatch):
+    log = DailyFile(tmp_path, "vision", retention_days=1)
+    log.write("x\n")
+    log.flush()
+    yesterday = date.today() - timedelta(days=1)
+    log.path_for(yesterday).write_text("old\n", encoding="utf-8")
+
+    def fail(*args, **kwargs):
+        raise OSError("只读文件系统")
+
+    monkeypatch.setattr("services.logs.zipfile.ZipFile", fail)
+    log._compress(log.path_for(yesterday))
+    log.close()
+    assert log.errors == 1
+    assert log.path_for(yesterday).exists()
+
+
+def _debug_record(line: int = 10):
+    return {"level": SimpleNamespace(no=10, name="DEBUG"), "name": "services.test",
+            "line": line, "extra": {}}
+
+
+def test_throttle_limits_rate_per_call_site(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.logs.time.monotonic", lambda: now[0])
+    throttle = DebugThrottle(rate=5)
+
+    passed = [throttle(_debug_record()) for _ in range(20)]
+    assert sum(passed) == 5
+    assert throttle.suppressed == 15
+    # 其他调用位置与 INFO 及以上不受影响
+    assert throttle(_debug_record(line=11))
+    assert throttle({"level": SimpleNamespace(no=20, name="INFO")})
+
+    # 1秒后补满令牌，下一条输出记录附带被抑制条数
+    now[0] += 1.0
+    record = _debug_record()
+    assert throttle(record)
+    assert record["extra"]["suppressed"] == 15
+    assert sum(throttle(_debug_record()) for _ in range(10)) == 4
+
+
+def test_throttle_samples_debug_records(monkeypatch):
+    monkeypatch.setattr("services.logs.random.random", iter([0.05, 0.5, 0.09, 0.95] * 25).__next__)
+    throttle = DebugThrottle(rate=0, sample=0.1)
+    passed = sum(throttle(_debug_record()) for _ in range(100))
+    assert passed == 50
+    assert throttle.suppressed == 50
+
+
+def test_throttle_is_consistent_across_threads(monkeypatch):
+    monkeypatch.setattr("services.logs.time.monotonic", lambda: 100.0)
+    throttle = DebugThrottle(rate=1000)
+    results = []
+
+    def worker():
+        results.append(sum(throttle(_debug_record()) for _ in range(500)))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 时间不前进时总共只有1000个令牌
+    assert sum(results) == 1000
+    assert throttle.suppressed == 3000
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果缓存测试：键区分、TTL过期、内存上限淘汰，以及阶段变体的缓存隔离
+"""
+
+import asyncio
+
+import numpy as np
+
+from services.compute import ComputeExecutor
+from services.pipeline import StageContext
+from services.result_cache import ResultCache
+
+IMAGE = b"\xff\xd8jpeg-bytes"
+
+
+def test_key_separates_image_and_extra():
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl=60)
+    assert cache.key(IMAGE) == cache.key(IMAGE)
+    assert cache.key(IMAGE) != cache.key(IMAGE + b"!")
+    # 缩小倍数、原始像素格式参与键计算
+    assert cache.key(IMAGE) != cache.key(IMAGE, "reduce=2")
+    assert cache.key(IMAGE, "reduce=2") != cache.key(IMAGE, "reduce=4")
+
+
+def test_stages_are_stored_per_key():
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl=60)
+    a, b = cache.key(IMAGE), cache.key(IMAGE, "reduce=2")
+    cache.put(a, "barcode:full", "A")
+    assert cache.get(a, "barcode:full") == (True, "A")
+    assert cache.get(a, "barcode:roi") == (False, None)
+    assert cache.get(b, "barcode:full") == (False, None)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.result_cache.time.monotonic", lambda: now[0])
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl=5)
+    key = cache.key(IMAGE)
+    cache.put(key, "detect", 1)
+
+    now[0] += 4.9
+    assert cache.get(key, "detect") == (True, 1)
+    assert abs(cache.age(key) - 4.9) < 1e-9
+    # 命中不延长TTL
+    now[0] += 0.2
+    assert cache.get(key, "detect") == (False, None)
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_byte_bound_evicts_least_recently_used():
+    value = np.zeros(4096, dtype=np.uint8)
+    cache = ResultCache(max_entries=100, max_bytes=3 * 4400, ttl=60)
+    keys = [cache.key(bytes([i])) for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, "detect", value)
+    # 访问第一个条目，使第二个成为最久未用
+    assert cache.get(keys[0], "detect")[0]
+    cache.put(keys[3], "detect", value)
+
+    stats = cache.stats()
+    assert stats["bytes"] <= cache.max_bytes
+    assert stats["evictions"] == 1
+    assert not cache.get(keys[1], "detect")[0]
+    assert cache.get(keys[0], "detect")[0] and cache.get(keys[3], "detect")[0]
+
+
+def test_replacing_stage_keeps_byte_count():
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl=60)
+    key = cache.key(IMAGE)
+    cache.put(key, "detect", np.zeros(1000, dtype=np.uint8))
+    size = cache.stats()["bytes"]
+    cache.put(key, "detect", np.zeros(1000, dtype=np.uint8))
+    assert cache.stats()["bytes"] == size
+
+
+def test_stage_variants_do_not_share_results():
+    compute = ComputeExecutor(mode="thread", workers=1)
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl=60)
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    calls = []
+
+    def scan(_image, rois):
+        calls.append(rois)
+        return "roi" if rois else "full"
+
+    async def run():
+        ctx = StageContext(compute, image=image, cache=cache, cache_key=cache.key(IMAGE))
+        full = await ctx.run("barcode", scan, None, variant="full")
+        roi = await ctx.run("barcode", scan, [(0, 0, 4, 4)], variant="roi")
+        again = await ctx.run("barcode", scan, None, variant="full")
+        return full, roi, again, ctx
+
+    try:
+        full, roi, again, ctx = asyncio.run(run())
+    finally:
+        compute.shutdown()
+    assert (full, roi, again) == ("full", "roi", "full")
+    assert len(calls) == 2
+    assert ctx.computed_stages == 2 and ctx.reused_stages == 1
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+场景变化判定测试：静止画面沿用场景键，画面变化或超过最长复用时间时开始新场景
+"""
+
+import cv2
+import numpy as np
+
+from config import settings
+from services.scene_gate import SceneGate
+
+
+def scene_frame() -> np.ndarray:
+    image = np.full((480, 640, 3), 60, dtype=np.uint8)
+    cv2.rectangle(image, (260, 140), (380, 360), (200, 200, 200), -1)
+    cv2.rectangle(image, (270, 200), (370, 300), (255, 255, 255), -1)
+    return image
+
+
+def test_static_frame_keeps_scene_key():
+    gate = SceneGate()
+    first = gate.check("dock1", scene_frame())
+    assert not first.static
+
+    # 传感器噪声级别的抖动不视为变化
+    noisy = cv2.add(scene_frame(), np.random.default_rng(0).integers(0, 3, (480, 640, 3), dtype=np.uint8))
+    second = gate.check("dock1", noisy)
+    assert second.static
+    assert second.key == first.key
+    assert second.since == first.since
+    assert second.change < settings.SCENE_CHANGE_THRESHOLD
+    assert gate.stats()["static_frames"] == 1
+
+
+def test_changed_frame_starts_new_scene():
+    gate = SceneGate()
+    first = gate.check("dock1", scene_frame())
+
+    # 药瓶被取走
+    empty = np.full((480, 640, 3), 60, dtype=np.uint8)
+    changed = gate.check("dock1", empty)
+    assert not changed.static
+    assert changed.key != first.key
+    assert changed.change > 0
+
+    # 新场景以变化后的帧为参考
+    assert gate.check("dock1", empty).key == changed.key
+
+
+def test_cameras_and_max_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.scene_gate.time.monotonic", lambda: now[0])
+    gate = SceneGate()
+    a = gate.check("dock1", scene_frame())
+    b = gate.check("dock2", scene_frame())
+    assert a.key != b.key
+
+    now[0] += settings.SCENE_MAX_AGE + 0.1
+    expired = gate.check("dock1", scene_frame())
+    assert not expired.static
+    assert expired.key != a.key
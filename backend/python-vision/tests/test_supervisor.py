@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作进程相机分配测试
+"""
+
+from config import settings
+from services.camera_service import CameraManager
+from services.supervisor import plan_workers
+
+CAMERAS = [{"id": "dock1", "ip": "10.0.0.1"}, {"id": "dock2", "ip": "10.0.0.2"}, {"id": "dock3", "ip": "10.0.0.3"}]
+
+
+def test_cameras_are_spread_across_workers(monkeypatch):
+    monkeypatch.setattr(settings, "CAMERAS", CAMERAS)
+    plans = plan_workers(2)
+
+    assert [[c.id for c in plan.cameras] for plan in plans] == [["dock1", "dock3"], ["dock2"]]
+    assert set(plans[0].camera_routes) == {"dock2"}
+    assert set(plans[1].camera_routes) == {"dock1", "dock3"}
+    assert all(plan.default_camera == "dock1" for plan in plans)
+
+
+def test_disabled_cameras_are_local_to_every_worker(monkeypatch):
+    monkeypatch.setattr(settings, "CAMERAS", CAMERAS)
+    monkeypatch.setattr(settings, "CAMERA_ENABLED", False)
+    plans = plan_workers(3)
+
+    for plan in plans:
+        assert [c.id for c in plan.cameras] == ["dock1", "dock2", "dock3"]
+        assert plan.camera_routes == {}
+        # 与单进程相同：通道存在，未打开时返回后备图像
+        manager = CameraManager(plan.cameras, default_id=plan.default_camera)
+        assert manager.channel("dock2").id == "dock2"
+        assert manager.channel().id == "dock1"
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+溯源码索引测试（SQLite数据库）：全量加载、按 updated_at 增量刷新、全量重载清除物理删除的记录
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from config import settings
+from services.trace_index import TraceCodeIndex
+
+SCHEMA = [
+    "CREATE TABLE vaccines (id INTEGER PRIMARY KEY, code TEXT NOT NULL)",
+    """CREATE TABLE inventory (
+        id INTEGER PRIMARY KEY,
+        trace_code TEXT,
+        vaccine_id INTEGER NOT NULL REFERENCES vaccines(id),
+        status INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )""",
+]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'vaccine.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO vaccines (id, code) VALUES (1, 'VAC001'), (2, 'VAC002')"))
+        conn.execute(text(
+            "INSERT INTO inventory (trace_code, vaccine_id, status, updated_at) VALUES "
+            "('81000010000000000001', 1, 1, '2026-01-01 08:00:00'),"
+            "('81000010000000000002', 1, 1, '2026-01-01 08:00:00'),"
+            "('81000020000000000001', 2, 1, '2026-01-01 08:00:00'),"
+            "('81000020000000000002', 2, 2, '2026-01-01 08:00:00'),"
+            "(NULL, 2, 1, '2026-01-01 08:00:00')"
+        ))
+    yield engine
+    engine.dispose()
+
+
+def execute(engine, sql: str):
+    with engine.begin() as conn:
+        conn.execute(text(sql))
+
+
+def test_load_indexes_in_stock_codes(database):
+    index = TraceCodeIndex()
+    assert index.load() == 3
+
+    assert index.lookup("81000010000000000001") == "VAC001"
+    assert index.lookup("81000020000000000001") == "VAC002"
+    # 已出库的溯源码不在索引中，但可按药品标识码前缀推断疫苗
+    assert "81000020000000000002" not in index
+    assert index.vaccine_for("81000020000000000002") == "VAC002"
+    assert index.vaccine_for("99999990000000000000") is None
+    assert index.stats()["prefixes"] == 2
+
+
+def test_refresh_applies_newer_rows(database):
+    index = TraceCodeIndex()
+    index.load()
+
+    execute(database, "UPDATE inventory SET status = 2, updated_at = '2026-01-01 09:00:00' "
+                      "WHERE trace_code = '81000010000000000001'")
+    execute(database, "UPDATE inventory SET status = 1, updated_at = '2026-01-01 09:00:00' "
+                      "WHERE trace_code = '81000020000000000002'")
+    execute(database, "INSERT INTO inventory (trace_code, vaccine_id, status, updated_at) "
+                      "VALUES ('81000030000000000001', 1, 1, '2026-01-01 09:30:00')")
+
+    assert index.refresh() == 3
+    assert "81000010000000000001" not in index
+    assert index.lookup("81000020000000000002") == "VAC002"
+    assert index.lookup("81000030000000000001") == "VAC001"
+    assert len(index) == 4
+
+    # 水位推进后，未变化的记录不再计为变更
+    assert index.refresh() == 0
+    # 溯源码改为另一疫苗时前缀计数随之迁移
+    execute(database, "UPDATE inventory SET vaccine_id = 2, updated_at = '2026-01-01 10:00:00' "
+                      "WHERE trace_code = '81000030000000000001'")
+    assert index.refresh() == 1
+    assert index.vaccine_for("81000039999999999999") == "VAC002"
+
+
+def test_apply_ignores_unknown_removals(database):
+    index = TraceCodeIndex()
+    index.load()
+    rows = [
+        ("81000040000000000001", "VAC003", 1, "2026-01-02 00:00:00"),
+        ("81000050000000000001", "VAC001", 3, "2026-01-02 00:00:00"),
+    ]
+    assert index._apply(rows) == 1
+    assert index.lookup("81000040000000000001") == "VAC003"
+    assert index._watermark == "2026-01-02 00:00:00"
+
+
+def test_full_reload_drops_deleted_rows(database):
+    index = TraceCodeIndex()
+    index.load()
+
+    execute(database, "DELETE FROM inventory WHERE trace_code = '81000010000000000002'")
+    # 物理删除不产生更新记录，增量刷新无法发现
+    index.refresh()
+    assert "81000010000000000002" in index
+
+    assert index.load() == 2
+    assert "81000010000000000002" not in index
+    assert index.lookup("81000010000000000001") == "VAC001"
+    assert index.stats()["loads"] == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视觉服务测试（需先生成 protos/vision_pb2.py，并安装zbar库）
+"""
+
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("protos.vision_pb2")
+try:
+    import pyzbar.pyzbar  # noqa: F401
+except ImportError as e:
+    # 未安装zbar动态库时pyzbar导入报ImportError（非ModuleNotFoundError）
+    pytest.skip(f"pyzbar不可用: {e}", allow_module_level=True)
+
+from config import settings
+from protos import vision_pb2
+from services.camera_service import CameraManager
+from services.compute import ComputeExecutor
+from services.vision_service import VisionServicer
+
+
+@pytest.fixture
+def servicer(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_SAVE_ENABLED", False)
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    compute = ComputeExecutor(mode="thread", workers=1)
+    # 与不持有相机的工作进程相同：没有任何相机通道
+    servicer = VisionServicer(CameraManager([], default_id="default"), compute)
+    yield servicer
+    compute.shutdown()
+
+
+def _blank_jpeg() -> bytes:
+    ok, data = cv2.imencode(".jpg", np.full((240, 320, 3), 128, dtype=np.uint8))
+    assert ok
+    return data.tobytes()
+
+
+def test_verify_client_image_does_not_fall_back_to_camera(servicer, monkeypatch):
+    def burst(*args, **kwargs):
+        raise AssertionError("客户端图像的验证请求不应从相机连拍")
+
+    monkeypatch.setattr(servicer.camera_manager, "burst", burst)
+    request = vision_pb2.VerifyRequest(image=_blank_jpeg(), expected_trace_code="81000010000000000001")
+    response = asyncio.run(servicer.VerifyVaccine(request, None))
+
+    assert not response.matched
+    assert response.message == "无法识别溯源码"
@@ -0,0 +1,3 @@
+"""
+模型导出与校验工具
+"""
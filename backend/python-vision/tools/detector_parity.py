@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检测后端一致性校验：以ultralytics(PyTorch)结果为参照，比较其他后端的检测框
+
+逐图按类别贪心匹配IoU最大的框，统计召回、多检、平均IoU与置信度偏差，
+未达到阈值时以非零状态退出。
+
+用法（在 backend/python-vision 目录下）:
+    python -m tools.detector_parity --backend onnxruntime --images images/20250101
+    python -m tools.detector_parity --backend openvino --int8 --min-recall 0.95
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from config import settings
+from services.detector import BACKEND_ULTRALYTICS, BACKENDS, DetectorBackend, create_backend
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 4) 与 (M, 4) 两两IoU"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match(reference: np.ndarray, candidate: np.ndarray, iou_threshold: float) -> List[Tuple[int, int, float]]:
+    """同类别按IoU从大到小贪心一对一匹配，返回 (参照下标, 候选下标, IoU)"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+    iou = box_iou(reference[:, :4], candidate[:, :4])
+    iou[reference[:, None, 5] != candidate[None, :, 5]] = 0.0
+    pairs = []
+    for flat in np.argsort(iou, axis=None)[::-1]:
+        i, j = np.unravel_index(flat, iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        if any(p[0] == i or p[1] == j for p in pairs):
+            continue
+        pairs.append((int(i), int(j), float(iou[i, j])))
+    return pairs
+
+
+def load_images(directory: Optional[Path], limit: int) -> List[Tuple[str, np.ndarray]]:
+    """读取校验图像，未指定目录时使用合成帧"""
+    images = []
+    if directory is not None:
+        for path in sorted(p for p in directory.rglob("*") if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:limit]:
+            image = cv2.imread(str(path))
+            if image is not None:
+                images.append((str(path), image))
+    if not images:
+        from benchmarks.frames import VARIANT_BARCODE, make_frame
+        for width, height in ((640, 480), (1280, 720), (1920, 1080)):
+            images.append((f"synthetic/{width}x{height}", make_frame(width, height, VARIANT_BARCODE).image))
+    return images
+
+
+def run(backend: DetectorBackend, images: List[np.ndarray]) -> Tuple[List[np.ndarray], float]:
+    """逐张推理，返回 (检测结果, 平均耗时ms)"""
+    backend.infer_batch(images[:1])  # 预热
+    outputs = []
+    start = time.perf_counter()
+    for image in images:
+        outputs.append(backend.infer_batch([image])[0])
+    return outputs, (time.perf_counter() - start) * 1000 / max(1, len(images))
+
+
+def compare(reference: List[np.ndarray], candidate: List[np.ndarray], names: List[str],
+            min_confidence: float, iou_threshold: float) -> Dict[str, Any]:
+    """汇总两组检测结果的差异"""
+    total_ref = total_cand = matched = 0
+    ious: List[float] = []
+    conf_deltas: List[float] = []
+    per_image = []
+    for name, ref, cand in zip(names, reference, candidate):
+        ref = ref[ref[:, 4] >= min_confidence]
+        cand = cand[cand[:, 4] >= min_confidence]
+        pairs = match(ref, cand, iou_threshold)
+        total_ref += len(ref)
+        total_cand += len(cand)
+        matched += len(pairs)
+        ious.extend(p[2] for p in pairs)
+        conf_deltas.extend(abs(float(ref[i, 4] - cand[j, 4])) for i, j, _ in pairs)
+        per_image.append({
+            "image": name,
+            "reference": len(ref),
+            "candidate": len(cand),
+            "matched": len(pairs),
+            "mean_iou": float(np.mean([p[2] for p in pairs])) if pairs else None,
+        })
+    return {
+        "reference_boxes": total_ref,
+        "candidate_boxes": total_cand,
+        "matched": matched,
+        "recall": matched / total_ref if total_ref else 1.0,
+        "precision": matched / total_cand if total_cand else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 1.0,
+        "max_conf_delta": float(np.max(conf_deltas)) if conf_deltas else 0.0,
+        "images": per_image,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="检测后端与PyTorch结果一致性校验")
+    parser.add_argument("--backend", choices=sorted(set(BACKENDS) - {BACKEND_ULTRALYTICS}),
+                        default=settings.DETECTOR_BACKEND if settings.DETECTOR_BACKEND != BACKEND_ULTRALYTICS
+                        else "onnxruntime")
+    parser.add_argument("--model", type=Path, help="候选后端模型路径（默认按配置选择）")
+    parser.add_argument("--int8", action="store_true", help="校验INT8量化模型")
+    parser.add_argument("--images", type=Path, help="校验图像目录（默认使用合成帧）")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--min-confidence", type=float, default=settings.DETECTION_CONFIDENCE,
+                        help="只比较置信度不低于该值的框")
+    parser.add_argument("--match-iou", type=float, default=0.5, help="视为同一目标的最小IoU")
+    parser.add_argument("--min-recall", type=float, default=0.98)
+    parser.add_argument("--min-precision", type=float, default=0.98)
+    parser.add_argument("--min-iou", type=float, default=0.9, help="匹配框的最小平均IoU")
+    parser.add_argument("--output", type=Path, help="结果JSON输出路径")
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images, args.limit)
+    names = [name for name, _ in images]
+    frames = [image for _, image in images]
+
+    reference_backend = create_backend(BACKEND_ULTRALYTICS)
+    candidate_backend = create_backend(args.backend, args.model, int8=args.int8)
+    reference, reference_ms = run(reference_backend, frames)
+    candidate, candidate_ms = run(candidate_backend, frames)
+
+    report = compare(reference, candidate, names, args.min_confidence, args.match_iou)
+    report.update({
+        "backend": args.backend,
+        "int8": args.int8,
+        "reference_ms": reference_ms,
+        "candidate_ms": candidate_ms,
+        "speedup": reference_ms / candidate_ms if candidate_ms else 0.0,
+    })
+
+    logger.info(
+        f"一致性: 召回={report['recall']:.3f}, 精确={report['precision']:.3f}, "
+        f"平均IoU={report['mean_iou']:.3f}, 最大置信度偏差={report['max_conf_delta']:.3f}, "
+        f"耗时 {reference_ms:.1f}ms -> {candidate_ms:.1f}ms ({report['speedup']:.2f}x)"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    failures = []
+    if report["recall"] < args.min_recall:
+        failures.append(f"召回 {report['recall']:.3f} < {args.min_recall}")
+    if report["precision"] < args.min_precision:
+        failures.append(f"精确率 {report['precision']:.3f} < {args.min_precision}")
+    if report["mean_iou"] < args.min_iou:
+        failures.append(f"平均IoU {report['mean_iou']:.3f} < {args.min_iou}")
+    for failure in failures:
+        logger.error(f"一致性校验未通过: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
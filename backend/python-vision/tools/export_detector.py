@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导出检测模型为ONNX，可选INT8静态量化
+
+量化后的QDQ格式ONNX模型可同时用于 onnxruntime 与 openvino 后端。
+
+用法（在 backend/python-vision 目录下）:
+    python -m tools.export_detector
+    python -m tools.export_detector --int8 --calib-dir images/20250101
+"""
+
+import argparse
+import shutil
+import sys
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from config import settings
+from services.detector import BACKEND_ONNXRUNTIME, letterbox, model_path_for
+
+
+def export_onnx(weights: Path, output: Path, input_size: int, dynamic: bool) -> Path:
+    """使用ultralytics导出ONNX"""
+    from ultralytics import YOLO
+
+    exported = Path(YOLO(str(weights)).export(format="onnx", imgsz=input_size, dynamic=dynamic, simplify=True))
+    if exported.resolve() != output.resolve():
+        shutil.move(str(exported), output)
+    logger.info(f"ONNX模型已导出: {output}")
+    return output
+
+
+def calibration_images(calib_dir: Optional[Path], count: int) -> List[np.ndarray]:
+    """读取校准图像，未指定目录时使用合成帧"""
+    images = []
+    if calib_dir is not None:
+        for path in sorted(calib_dir.rglob("*.jpg"))[:count]:
+            image = cv2.imread(str(path))
+            if image is not None:
+                images.append(image)
+    if not images:
+        logger.warning("未找到校准图像，使用合成帧（量化精度可能下降）")
+        from benchmarks.frames import VARIANT_BARCODE, VARIANT_BLANK, make_frame
+        for i in range(count):
+            width = 640 + 160 * (i % 5)
+            images.append(make_frame(width, width * 9 // 16, (VARIANT_BARCODE, VARIANT_BLANK)[i % 2]).image)
+    return images
+
+
+def quantize_int8(model: Path, output: Path, images: List[np.ndarray], input_size: int) -> Path:
+    """onnxruntime 静态量化（QDQ格式，按通道量化权重）"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+
+    input_name = ort.InferenceSession(str(model), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._iter: Iterator = iter(images)
+
+        def get_next(self):
+            image = next(self._iter, None)
+            if image is None:
+                return None
+            canvas, _, _ = letterbox(image, input_size)
+            return {input_name: cv2.dnn.blobFromImage(canvas, 1.0 / 255, swapRB=True)}
+
+    quantize_static(
+        str(model), str(output), Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    logger.info(f"INT8模型已生成: {output} (校准图像{len(images)}张)")
+    return output
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="导出检测模型为ONNX / INT8")
+    parser.add_argument("--weights", type=Path, default=settings.MODEL_PATH / settings.YOLO_MODEL)
+    parser.add_argument("--output", type=Path, default=model_path_for(BACKEND_ONNXRUNTIME))
+    parser.add_argument("--input-size", type=int, default=settings.DETECTOR_INPUT_SIZE)
+    parser.add_argument("--dynamic", action="store_true", help="导出动态batch（批处理推理时使用）")
+    parser.add_argument("--skip-export", action="store_true", help="只对已有ONNX模型量化")
+    parser.add_argument("--int8", action="store_true", help="生成INT8量化模型")
+    parser.add_argument("--calib-dir", type=Path, help="校准图像目录（建议使用现场保存的图像）")
+    parser.add_argument("--calib-count", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if not args.skip_export:
+        export_onnx(args.weights, args.output, args.input_size, args.dynamic)
+
+    if args.int8:
+        # 与 DETECTOR_INT8 的命名约定一致
+        output = args.output.with_name(f"{args.output.stem}_int8{args.output.suffix}")
+        quantize_int8(args.output, output, calibration_images(args.calib_dir, args.calib_count), args.input_size)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())